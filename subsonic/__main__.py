@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the modules import each other by bare name, as they do when run from this directory
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cli import main  # noqa: E402
+
+sys.exit(main())
@@ -1,14 +1,25 @@
+import codecs
+import collections
+import contextlib
 import hashlib
+import json
 import random
+import threading
+import time
 import typing
 import logging
-from urllib.parse import urlencode
-
-import requests
-from bs4 import BeautifulSoup
-import tortilla
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import quote, urlencode
 
 import models
+import streaming
+from cache import ResponseCache
+from instrumentation import Instrumentation, RequestEvent, count_chunks, describe_response
+from identity import IdentityMap
+from playlists import MAX_URL_LENGTH, chunk_values, playlist_diff
+from routing import PINNED_ENDPOINTS, ReplicaRouter
+from table import SongTable
+from transport import TokenPolicy, Transport
 
 logger = logging.getLogger(__name__)
 
@@ -26,19 +37,38 @@ class ListTypes(object):
     BY_GENRE = 'byGenre'
 
 
-class SubsonicClient(object):
+class StreamUrlSigner(object):
+    # Signs any number of ids against one salt/token pair: the query string is encoded once and each URL is the
+    # shared prefix plus the quoted id.
+    __slots__ = ('prefix',)
+
+    def __init__(self, url: str, params: dict):
+        self.prefix = '{0}?{1}&id='.format(url, urlencode(params))
+
+    def __call__(self, id_: str) -> str:
+        return self.prefix + quote(str(id_), safe='')
+
+    def __repr__(self):
+        return 'StreamUrlSigner<{0}>'.format(self.prefix.split('?', 1)[0])
+
+
+class BaseSubsonicClient(object):
     API_VERSION = '1.16.0'
+    # fills an unloaded Artist/Album on first access; only the blocking client can do that from a property
+    _load = None
 
-    def __init__(self, username, password, server_location, app_name='cloudplayer', debug_log=False):
+    def __init__(self, username, password, server_location, app_name='cloudplayer', token_policy: TokenPolicy = None):
         self.username = username
         self.password = password
         self.app_name = app_name
         self.server_location = server_location
-        self.api = tortilla.wrap('{0}/rest'.format(server_location))
-
-        self.validate()
-
-        logger.info("Logged in as {0}".format(self.username))
+        self.token_policy = token_policy if token_policy else TokenPolicy()
+        self._token_lock = threading.Lock()
+        self._signed_params = None
+        self._token_uses = 0
+        self._token_created = 0.0
+        self.identity_map = IdentityMap()
+        self.max_url_length = MAX_URL_LENGTH
 
     @property
     def _auth(self) -> dict:
@@ -48,14 +78,27 @@ class SubsonicClient(object):
 
     @property
     def __metadata(self) -> dict:
-        return {'v': SubsonicClient.API_VERSION, 'c': self.app_name, 'f': 'json'}
+        return {'v': self.API_VERSION, 'c': self.app_name, 'f': 'json'}
+
+    def _base_params(self) -> dict:
+        # Auth and metadata are merged once per token and shared until the token policy rotates them.
+        with self._token_lock:
+            if self._signed_params is None or self.token_policy.expired(self._token_uses, self._token_created):
+                self._signed_params = {**self._auth, **self.__metadata}
+                self._token_uses = 0
+                self._token_created = time.monotonic()
+            self._token_uses += 1
+            return self._signed_params
 
     def _merge_params(self, params: dict = None) -> dict:
-        return {**self._auth, **self.__metadata, **(params if params else {})}
-
-    def _request_get(self, route, params: dict = None) -> dict:
-        full_params = self._merge_params(params)
-        result = route.get(params=full_params)['subsonic-response']
+        full_params = self._base_params().copy()
+        if params:
+            full_params.update(params)
+        return full_params
+
+    @staticmethod
+    def _check_response(response: dict) -> dict:
+        result = response['subsonic-response']
         if result['status'] == 'failed':
             raise ValueError(result['error']['message'])
         return result
@@ -80,15 +123,36 @@ class SubsonicClient(object):
                             child.get('artistId'),
                             child.get('type'))
 
-    def validate(self) -> None:
-        self._request_get(self.api.ping)
-
-    def get_music_folders(self) -> typing.List[models.MusicFolder]:
-        all_folders = self._request_get(self.api.getMusicFolders)['musicFolders']['musicFolder']
-        return [models.MusicFolder(folder['id'], folder.get('name', '')) for folder in all_folders]
-
-    def get_music_directory(self, id_: str):
-        items = self._request_get(self.api.getMusicDirectory(), params={'id': id_})['directory']
+    def _make_song(self, child: dict) -> models.Song:
+        return models.Song(child['id'],
+                           child['isDir'],
+                           child['title'],
+                           child['album'],
+                           child['artist'],
+                           child.get('track'),
+                           child.get('genre'),
+                           child['size'],
+                           child['contentType'],
+                           child['suffix'],
+                           child['duration'],
+                           child['bitRate'],
+                           child['path'],
+                           child['playCount'],
+                           child['created'],
+                           child['albumId'],
+                           child['artistId'],
+                           child['type'])
+
+    def _make_list_album(self, album: dict) -> models.Album:
+        # getAlbumList entries are folders, their ids aren't ID3 album ids: getAlbum can't load them and they stay
+        # out of the identity map
+        return models.Album(album['id'], album['title'], album.get('coverArt'), album.get('songCount'),
+                            album['created'], album.get('duration'), album.get('artist'), album.get('artistId'), [])
+
+    def _parse_music_folders(self, music_folders: dict) -> typing.List[models.MusicFolder]:
+        return [models.MusicFolder(folder['id'], folder.get('name', '')) for folder in music_folders['musicFolder']]
+
+    def _parse_directory(self, items: dict) -> models.Directory:
         if 'child' in items:
             return models.Directory(items['id'], items['name'], [self._make_child(child) for child in items['child']])
         else:
@@ -101,14 +165,7 @@ class SubsonicClient(object):
                 artists.append(models.MusicFolder(artist['id'], artist['name']))
             indices.append(models.Index(index['name'], artists))
 
-    def get_indexes(self, music_folder_id: int = None, if_modified_since: int = None) -> typing.Optional[
-        models.IndexRoot]:
-        params = {}
-        if music_folder_id:
-            params['musicFolderId'] = music_folder_id
-        if if_modified_since:
-            params['ifModifiedSince'] = if_modified_since
-        indexes = self._request_get(self.api.getIndexes)['indexes']
+    def _parse_indexes(self, indexes: dict) -> typing.Optional[models.IndexRoot]:
         indices = []
         children = []
         if 'index' not in indexes:
@@ -121,79 +178,182 @@ class SubsonicClient(object):
                 children.append(self._make_child(child))
         return models.IndexRoot(indexes['lastModified'], indexes['ignoredArticles'], indices, children)
 
-    def get_artists(self, music_folder_id: str = None) -> typing.List[models.ArtistIndex]:
-        params = {'id': music_folder_id} if music_folder_id else {}
-        items = self._request_get(self.api.getArtists(), params=params)['artists']
+    def _parse_artists(self, items: dict) -> typing.List[models.ArtistIndex]:
         artist_indices = []
         for index in items['index']:
             artist_indices.append(models.ArtistIndex(index['name'],
-                                                     [models.Artist(index_artist['id'],
-                                                                    index_artist['name'],
-                                                                    index_artist.get('coverArt'),
-                                                                    index_artist['albumCount'],
-                                                                    []) for index_artist in
+                                                     [self._make_artist(index_artist) for index_artist in
                                                       index['artist']]))
 
         return artist_indices
 
-    def get_artist(self, id_: str) -> models.Artist:
-        items = self._request_get(self.api.getArtist(), params={'id': id_})['artist']
-        return models.Artist(items['id'], items['name'], items.get('coverArt'), items.get('albumCount'),
-                             [models.Album(album['id'],
-                                           album['name'],
-                                           album.get('coverArt'),
-                                           album['songCount'],
-                                           album['created'],
-                                           album['duration'],
-                                           album['artist'],
-                                           album['artistId'],
-                                           []) for album in items['album']])
+    def _make_artist(self, artist: dict, albums: typing.List[models.Album] = None) -> models.Artist:
+        return self.identity_map.merge(models.Artist(artist['id'], artist['name'], artist.get('coverArt'),
+                                                     artist.get('albumCount'), albums, self._load))
+
+    def _parse_artist(self, items: dict) -> models.Artist:
+        return self._make_artist(items, [self.identity_map.merge(models.Album(album['id'],
+                                                                              album['name'],
+                                                                              album.get('coverArt'),
+                                                                              album['songCount'],
+                                                                              album['created'],
+                                                                              album['duration'],
+                                                                              album['artist'],
+                                                                              album['artistId'],
+                                                                              None, self._load,
+                                                                              album.get('year'),
+                                                                              album.get('genre')))
+                                         for album in items['album']])
+
+    def _parse_album(self, items: dict) -> models.Album:
+        return self.identity_map.merge(models.Album(items['id'], items['name'], items.get('coverArt'),
+                                                    items['songCount'],
+                                                    items['created'],
+                                                    items['duration'],
+                                                    items.get('artist'),
+                                                    items.get('artistId'),
+                                                    [self.identity_map.merge(self._make_song(child))
+                                                     for child in items['song']], self._load,
+                                                    items.get('year'), items.get('genre')))
+
+    def _parse_album_list(self, albums: dict) -> typing.List[models.Album]:
+        if 'album' not in albums:
+            return []
 
-    def get_album(self, id_: str) -> models.Album:
-        items = self._request_get(self.api.getAlbum(), params={'id': id_})['album']
-        return models.Album(items['id'], items['name'], items.get('coverArt'), items['songCount'],
-                            items['created'],
-                            items['duration'],
-                            items.get('artist'),
-                            items.get('artistId'),
-                            [models.Song(child['id'],
-                                         child['isDir'],
-                                         child['title'],
-                                         child['album'],
-                                         child['artist'],
-                                         child.get('track'),
-                                         child.get('genre'),
-                                         child['size'],
-                                         child['contentType'],
-                                         child['suffix'],
-                                         child['duration'],
-                                         child['bitRate'],
-                                         child['path'],
-                                         child['playCount'],
-                                         child['created'],
-                                         child['albumId'],
-                                         child['artistId'],
-                                         child['type']) for child in items['song']])
+        return [self._make_list_album(album) for album in albums['album']]
 
-    def private_stream_url(self, id_: str) -> str:
-        qs = urlencode(self._merge_params(params={'id': id_}))
-        return '{0}/{1}/stream?{2}'.format(self.server_location, 'rest', qs)
+    def _parse_album_list2(self, albums: dict) -> typing.List[models.Album]:
+        return [self._make_id3_album(album) for album in albums.get('album', [])]
 
-    def create_share(self, id_: str, description: str = None, expires: int = None) -> typing.List[models.Share]:
+    def _parse_playlist(self, playlist: dict) -> models.Playlist:
+        return models.Playlist(playlist['id'], playlist.get('name'), playlist.get('comment'), playlist.get('owner'),
+                               playlist.get('public'), playlist.get('songCount'), playlist.get('duration'),
+                               playlist.get('created'), playlist.get('changed'), playlist.get('coverArt'),
+                               [self._make_child(child) for child in playlist.get('entry', [])])
+
+    def _parse_playlists(self, playlists: dict) -> typing.List[models.Playlist]:
+        return [self._parse_playlist(playlist) for playlist in playlists.get('playlist', [])]
+
+    def _parse_shares(self, shares: dict) -> typing.List[models.Share]:
+        return [models.Share(share['id'], share['url'], share['username'], share['created'], share['expires'],
+                             share['visitCount'],
+                             [self._make_child(child) for child in share['entry']]) for share in shares['share']]
+
+    def _parse_scan_status(self, scan_status: dict) -> models.ScanStatus:
+        return models.ScanStatus(scan_status['scanning'], scan_status['count'])
+
+    def _make_id3_album(self, album: dict) -> models.Album:
+        return self.identity_map.merge(models.Album(album['id'], album.get('name'), album.get('coverArt'),
+                                                    album.get('songCount'),
+                                                    album.get('created'),
+                                                    album.get('duration'),
+                                                    album.get('artist'),
+                                                    album.get('artistId'),
+                                                    None, self._load, album.get('year'), album.get('genre')))
+
+    def _parse_search2(self, result: dict) -> models.SearchResult:
+        return models.SearchResult([models.Artist(artist['id'], artist['name'], None, None, [])
+                                    for artist in result.get('artist', [])],
+                                   [self._make_child(album) for album in result.get('album', [])],
+                                   [self._make_child(song) for song in result.get('song', [])])
+
+    def _parse_search3(self, result: dict) -> models.SearchResult:
+        return models.SearchResult([self._make_artist(artist) for artist in result.get('artist', [])],
+                                   [self._make_id3_album(album) for album in result.get('album', [])],
+                                   [self._make_child(song) for song in result.get('song', [])])
+
+    def _search_params(self, query: str, artist_count: int, artist_offset: int, album_count: int, album_offset: int,
+                       song_count: int, song_offset: int, music_folder_id: str = None) -> dict:
+        params = {'query': query, 'artistCount': artist_count, 'artistOffset': artist_offset,
+                  'albumCount': album_count, 'albumOffset': album_offset, 'songCount': song_count,
+                  'songOffset': song_offset}
+        if music_folder_id:
+            params['musicFolderId'] = music_folder_id
+        return params
+
+    def _indexes_params(self, music_folder_id: int = None, if_modified_since: int = None) -> dict:
+        params = {}
+        if music_folder_id:
+            params['musicFolderId'] = music_folder_id
+        if if_modified_since:
+            params['ifModifiedSince'] = if_modified_since
+        return params
+
+    def _share_params(self, id_: str, description: str = None, expires: int = None) -> dict:
         params = {'id': id_}
         if description:
             params['description'] = description
         if expires:
             params['expires'] = expires
-
-        shares = self._request_get(self.api.createShare(), params=params)['shares']['share']
-        return [models.Share(share['id'], share['url'], share['username'], share['created'], share['expires'],
-                             share['visitCount'],
-                             [self._make_child(child) for child in share['entry']]) for share in shares]
-
-    def get_album_list(self, type_: str, size: int = 10, offset: int = 0, from_year: int = None,
-                       to_year: int = None, genre: int = None, music_folder_id: int = None) -> typing.List[
-        models.Album]:
+        return params
+
+    @staticmethod
+    def _scrobble_params(ids: typing.Sequence[str], times: typing.Sequence[int] = None,
+                         submission: bool = True) -> dict:
+        # one request can carry several plays since API 1.8.0, ids and times pair up by position
+        if times is not None and len(times) != len(ids):
+            raise ValueError('times must pair up with ids')
+        params = {'id': list(ids), 'submission': str(bool(submission)).lower()}
+        if times is not None:
+            params['time'] = list(times)
+        return params
+
+    @staticmethod
+    def _star_params(ids: typing.Sequence[str] = (), album_ids: typing.Sequence[str] = (),
+                     artist_ids: typing.Sequence[str] = ()) -> dict:
+        params = {}
+        for key, values in (('id', ids), ('albumId', album_ids), ('artistId', artist_ids)):
+            if values:
+                params[key] = list(values)
+        if not params:
+            raise ValueError('Nothing to star')
+        return params
+
+    @staticmethod
+    def _rating_params(id_: str, rating: int) -> dict:
+        if not 0 <= rating <= 5:
+            raise ValueError('rating must be between 0 and 5')
+        return {'id': id_, 'rating': rating}
+
+    def _query_budget(self, endpoint: str, params: dict) -> int:
+        # characters left for repeated params once the route, the fixed params and a worst case salt/token are in
+        signed = {'u': self.username, 't': '0' * 32, 's': '0' * 20, **self.__metadata, **params}
+        used = len('{0}/rest/{1}?'.format(self.server_location, endpoint)) + len(urlencode(signed, doseq=True))
+        return self.max_url_length - used
+
+    def _create_playlist_requests(self, name: str, song_ids: typing.Sequence[str]) -> typing.Tuple[
+            dict, typing.List[typing.List[str]]]:
+        # createPlaylist takes the first chunk, the rest is appended in order with updatePlaylist
+        params = {'name': name}
+        chunks = chunk_values('songId', song_ids, self._query_budget('createPlaylist', params)) or [[]]
+        first = dict(params, songId=chunks[0]) if chunks[0] else params
+        rest = [song_id for chunk in chunks[1:] for song_id in chunk]
+        return first, rest
+
+    def _update_playlist_requests(self, id_: str, name: str = None, comment: str = None, public: bool = None,
+                                  song_ids_to_add: typing.Sequence[str] = (),
+                                  song_indexes_to_remove: typing.Iterable[int] = ()) -> typing.List[dict]:
+        # Removal indexes refer to the playlist as it was before the request, so removals go out highest first:
+        # a later request's indexes all sit below anything already removed. Adds append, so they keep their order.
+        base = {'playlistId': id_}
+        first = dict(base)
+        if name is not None:
+            first['name'] = name
+        if comment is not None:
+            first['comment'] = comment
+        if public is not None:
+            first['public'] = str(bool(public)).lower()
+        requests = [first] if len(first) > 1 else []
+        indexes = sorted(set(song_indexes_to_remove), reverse=True)
+        budget = self._query_budget('updatePlaylist', base)
+        requests.extend(dict(base, songIndexToRemove=chunk) for chunk in chunk_values('songIndexToRemove', indexes,
+                                                                                        budget))
+        requests.extend(dict(base, songIdToAdd=chunk) for chunk in chunk_values('songIdToAdd', song_ids_to_add,
+                                                                                budget))
+        return requests
+
+    def _album_list_params(self, type_: str, size: int = 10, offset: int = 0, from_year: int = None,
+                           to_year: int = None, genre: int = None, music_folder_id: int = None) -> dict:
         params = {'type': type_, 'size': size, 'offset': offset}
 
         if type_ == ListTypes.BY_YEAR and (from_year is None or to_year is None):
@@ -208,132 +368,459 @@ class SubsonicClient(object):
 
         if music_folder_id:
             params['musicFolderId'] = music_folder_id
+        return params
 
-        albums = self._request_get(self.api.getAlbumList(), params=params)['albumList']
+    def private_stream_url(self, id_: str) -> str:
+        qs = urlencode(self._merge_params(params={'id': id_}))
+        return '{0}/{1}/stream?{2}'.format(self.server_location, 'rest', qs)
 
-        if 'album' not in albums:
-            return []
+    def stream_url_signer(self, max_bit_rate: int = None, format_: str = None,
+                          estimate_content_length: bool = None, endpoint: str = 'stream') -> 'StreamUrlSigner':
+        params = {}
+        if max_bit_rate is not None:
+            params['maxBitRate'] = max_bit_rate
+        if format_ is not None:
+            params['format'] = format_
+        if estimate_content_length is not None:
+            params['estimateContentLength'] = str(bool(estimate_content_length)).lower()
+        return StreamUrlSigner('{0}/rest/{1}'.format(self.server_location, endpoint), self._merge_params(params))
+
+    def private_stream_urls(self, ids: typing.Iterable[str], max_bit_rate: int = None, format_: str = None,
+                            estimate_content_length: bool = None) -> typing.List[str]:
+        signer = self.stream_url_signer(max_bit_rate, format_, estimate_content_length)
+        return [signer(id_) for id_ in ids]
+
+
+class SubsonicClient(BaseSubsonicClient):
+    STREAM_CHUNK_SIZE = 64 * 1024
+    VALIDATION_MODES = ('eager', 'lazy', 'background')
+
+    def __init__(self, username, password, server_location, app_name='cloudplayer', debug_log=False,
+                 pool_size: int = 10, timeout: typing.Union[float, typing.Tuple[float, float]] = 30,
+                 max_retries: int = 0, token_policy: TokenPolicy = None, cache: ResponseCache = None,
+                 instrumentation: Instrumentation = None, validation: str = 'eager', router: ReplicaRouter = None):
+        # validation: 'eager' pings before returning, 'background' pings on a thread and the first request waits
+        # for it, 'lazy' skips the ping and lets the first request's status check report bad credentials
+        if validation not in self.VALIDATION_MODES:
+            raise ValueError('validation must be one of {0}'.format(', '.join(self.VALIDATION_MODES)))
+        if router is not None and router.primary.location != server_location.rstrip('/'):
+            raise ValueError('Router primary {0} is not {1}'.format(router.primary.location, server_location))
+        super().__init__(username, password, server_location, app_name, token_policy)
+        self._api = None
+        self.transport = Transport(pool_size, timeout, max_retries)
+        self.cache = cache
+        self.instrumentation = instrumentation
+        self.router = router
+        self._validation = None
+
+        if validation == 'eager':
+            self.validate()
+            logger.info("Logged in as {0}".format(self.username))
+        elif validation == 'background':
+            self._validation = Future()
+            threading.Thread(target=self._validate_in_background, daemon=True).start()
+
+    @property
+    def api(self):
+        # tortilla pulls in requests, so the wrapper is built on first use rather than at import or construction
+        if self._api is None:
+            import tortilla
+            self._api = tortilla.wrap('{0}/rest'.format(self.server_location))
+        return self._api
+
+    def _validate_in_background(self) -> None:
+        validation = self._validation
+        try:
+            self.validate()
+        except IOError as e:
+            # the server may just not be up yet: the requests already waiting fail, later ones skip the wait and
+            # validate themselves through their status check, as with 'lazy'
+            self._validation = None
+            validation.set_exception(e)
+        except Exception as e:
+            validation.set_exception(e)
+        else:
+            logger.info("Logged in as {0}".format(self.username))
+            validation.set_result(None)
+
+    def wait_validated(self, timeout: float = None) -> None:
+        validation = self._validation
+        if validation is not None:
+            validation.result(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self.transport.close()
+        if self.router is not None:
+            self.router.close()
+
+    @staticmethod
+    def _endpoint(route) -> str:
+        return route.url().rsplit('/', 1)[-1]
+
+    def _request_get(self, route, params: dict = None) -> dict:
+        if self.cache is not None:
+            return self.cache.fetch(self._endpoint(route), params, lambda: self._fetch(route, params))
+        return self._fetch(route, params)
+
+    def _fetch(self, route, params: dict = None) -> dict:
+        self.wait_validated()
+        return self._send(route, params)
+
+    def _send(self, route, params: dict = None) -> dict:
+        full_params = self._merge_params(params)
+        if self.instrumentation is not None:
+            return self.instrumentation.request(self._endpoint(route), full_params,
+                                                lambda p: self._get(route, p),
+                                                lambda response: self._check_response(response.json()))
+        return self._check_response(self._get(route, full_params).json())
+
+    def _get(self, route, params: dict, **kwargs):
+        if self.router is None:
+            return self.transport.get(route.url(), params=params, **kwargs)
+        endpoint = self._endpoint(route)
+        # a streamed body can't be raced, the losing response would hold its connection until collected
+        return self.router.call(lambda location: self.transport.get('{0}/rest/{1}'.format(location, endpoint),
+                                                                    params=params, **kwargs),
+                                pinned=endpoint in PINNED_ENDPOINTS, hedge=not kwargs.get('stream'))
+
+    def _measure(self, endpoint: str, params: dict) -> typing.ContextManager[RequestEvent]:
+        # calls that can't go through Instrumentation.request (streamed or binary bodies) fill in the event themselves
+        if self.instrumentation is not None:
+            return self.instrumentation.measure(endpoint, params)
+        return contextlib.nullcontext(RequestEvent(endpoint, params))
+
+    def _request_stream(self, route, key: str, params: dict = None) -> typing.Iterator[dict]:
+        self.wait_validated()
+        with self._measure(self._endpoint(route), self._merge_params(params)) as event:
+            with self._get(route, event.params, stream=True) as response:
+                describe_response(event, response)
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+                chunks = (decoder.decode(chunk)
+                          for chunk in count_chunks(event, response.iter_content(self.STREAM_CHUNK_SIZE)))
+                try:
+                    yield from streaming.iter_array(chunks, key)
+                except streaming.ArrayNotFound as e:
+                    # either a failed status or an empty listing, both are small enough to decode whole
+                    self._check_response(json.loads(e.document))
+
+    def validate(self) -> None:
+        self._send(self.api.ping)
+
+    def get_music_folders(self) -> typing.List[models.MusicFolder]:
+        return self._parse_music_folders(self._request_get(self.api.getMusicFolders)['musicFolders'])
+
+    def get_music_directory(self, id_: str):
+        return self._parse_directory(self._request_get(self.api.getMusicDirectory(), params={'id': id_})['directory'])
+
+    def iter_music_directory(self, id_: str) -> typing.Iterator[models.Child]:
+        for child in self._request_stream(self.api.getMusicDirectory(), 'child', params={'id': id_}):
+            yield self._make_child(child)
+
+    def get_indexes(self, music_folder_id: int = None, if_modified_since: int = None) -> typing.Optional[
+        models.IndexRoot]:
+        params = self._indexes_params(music_folder_id, if_modified_since)
+        return self._parse_indexes(self._request_get(self.api.getIndexes, params=params)['indexes'])
+
+    def get_artists(self, music_folder_id: str = None) -> typing.List[models.ArtistIndex]:
+        params = {'id': music_folder_id} if music_folder_id else {}
+        return self._parse_artists(self._request_get(self.api.getArtists(), params=params)['artists'])
+
+    def get_artist(self, id_: str) -> models.Artist:
+        return self._parse_artist(self._request_get(self.api.getArtist(), params={'id': id_})['artist'])
+
+    def get_album(self, id_: str) -> models.Album:
+        return self._parse_album(self._request_get(self.api.getAlbum(), params={'id': id_})['album'])
+
+    def _load(self, obj: typing.Union[models.Artist, models.Album]) -> None:
+        # the fetched object is normally `obj` itself via the identity map; assigning also covers detached copies
+        if isinstance(obj, models.Artist):
+            obj.albums = self.get_artist(obj.id).albums
+        else:
+            obj.songs = self.get_album(obj.id).songs
+
+    def prefetch(self, objects: typing.Iterable[typing.Union[models.Artist, models.Album]], workers: int = 8) -> None:
+        pending = list({id(obj): obj for obj in objects if not obj.loaded}.values())
+        if not pending:
+            return
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            for _ in executor.map(self._load, pending):
+                pass
 
-        albums = albums['album']
+    def iter_album_songs(self, id_: str) -> typing.Iterator[models.Song]:
+        for child in self._request_stream(self.api.getAlbum(), 'song', params={'id': id_}):
+            yield self._make_song(child)
+
+    def create_share(self, id_: str, description: str = None, expires: int = None) -> typing.List[models.Share]:
+        params = self._share_params(id_, description, expires)
+        return self._parse_shares(self._request_get(self.api.createShare(), params=params)['shares'])
+
+    def scrobble(self, ids: typing.Union[str, typing.Sequence[str]], times: typing.Sequence[int] = None,
+                 submission: bool = True) -> None:
+        ids = [ids] if isinstance(ids, str) else ids
+        self._request_get(self.api.scrobble(), params=self._scrobble_params(ids, times, submission))
+
+    def star(self, ids: typing.Sequence[str] = (), album_ids: typing.Sequence[str] = (),
+             artist_ids: typing.Sequence[str] = ()) -> None:
+        self._request_get(self.api.star(), params=self._star_params(ids, album_ids, artist_ids))
+
+    def unstar(self, ids: typing.Sequence[str] = (), album_ids: typing.Sequence[str] = (),
+               artist_ids: typing.Sequence[str] = ()) -> None:
+        self._request_get(self.api.unstar(), params=self._star_params(ids, album_ids, artist_ids))
+
+    def set_rating(self, id_: str, rating: int) -> None:
+        self._request_get(self.api.setRating(), params=self._rating_params(id_, rating))
+
+    def get_playlists(self, username: str = None) -> typing.List[models.Playlist]:
+        params = {'username': username} if username else {}
+        return self._parse_playlists(self._request_get(self.api.getPlaylists(), params=params)['playlists'])
+
+    def get_playlist(self, id_: str) -> models.Playlist:
+        return self._parse_playlist(self._request_get(self.api.getPlaylist(), params={'id': id_})['playlist'])
+
+    def create_playlist(self, name: str, song_ids: typing.Sequence[str] = ()) -> models.Playlist:
+        params, rest = self._create_playlist_requests(name, song_ids)
+        playlist = self._parse_playlist(self._request_get(self.api.createPlaylist(), params=params)['playlist'])
+        if rest:
+            self.update_playlist(playlist.id, song_ids_to_add=rest)
+            playlist = self.get_playlist(playlist.id)
+        return playlist
+
+    def update_playlist(self, id_: str, name: str = None, comment: str = None, public: bool = None,
+                        song_ids_to_add: typing.Sequence[str] = (),
+                        song_indexes_to_remove: typing.Iterable[int] = ()) -> None:
+        # chunks for one playlist go out one at a time, the server rewrites the whole playlist on every update
+        for params in self._update_playlist_requests(id_, name, comment, public, song_ids_to_add,
+                                                     song_indexes_to_remove):
+            self._request_get(self.api.updatePlaylist(), params=params)
+
+    def sync_playlist(self, id_: str, song_ids: typing.Sequence[str], ordered: bool = True) -> typing.Tuple[int, int]:
+        current = [entry.id for entry in self.get_playlist(id_).entries]
+        remove, add = playlist_diff(current, list(song_ids), ordered)
+        if remove or add:
+            self.update_playlist(id_, song_ids_to_add=add, song_indexes_to_remove=remove)
+        return len(add), len(remove)
+
+    def sync_playlists(self, playlists: typing.Dict[str, typing.Sequence[str]], ordered: bool = True,
+                       workers: int = 4) -> typing.Dict[str, typing.Tuple[int, int]]:
+        # different playlists don't share state on the server, so they sync in parallel
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {id_: executor.submit(self.sync_playlist, id_, song_ids, ordered)
+                       for id_, song_ids in playlists.items()}
+            return {id_: future.result() for id_, future in futures.items()}
 
-        return [models.Album(album['id'], album['title'], album.get('coverArt'), album.get('songCount'),
-                             album['created'],
-                             album.get('duration'),
-                             album.get('artist'),
-                             album.get('artistId'),
-                             []) for album in albums]
+    def get_album_list(self, type_: str, size: int = 10, offset: int = 0, from_year: int = None,
+                       to_year: int = None, genre: int = None, music_folder_id: int = None) -> typing.List[
+        models.Album]:
+        params = self._album_list_params(type_, size, offset, from_year, to_year, genre, music_folder_id)
+        return self._parse_album_list(self._request_get(self.api.getAlbumList(), params=params)['albumList'])
+
+    def iter_album_list(self, type_: str, page_size: int = 500, read_ahead: int = 2, workers: int = 1,
+                        from_year: int = None, to_year: int = None, genre: int = None,
+                        music_folder_id: int = None) -> typing.Iterator[models.Album]:
+        # Keeps up to read_ahead pages in flight past the one being consumed, fetched by `workers` threads over
+        # disjoint offset windows, and stops at the first short page.
+        self._album_list_params(type_, page_size, 0, from_year, to_year, genre, music_folder_id)
+        return self._iter_pages(lambda offset: self.get_album_list(type_, page_size, offset, from_year, to_year, genre,
+                                                                   music_folder_id), page_size, read_ahead, workers)
+
+    def get_album_list2(self, type_: str, size: int = 10, offset: int = 0, from_year: int = None,
+                        to_year: int = None, genre: int = None, music_folder_id: int = None) -> typing.List[
+        models.Album]:
+        params = self._album_list_params(type_, size, offset, from_year, to_year, genre, music_folder_id)
+        return self._parse_album_list2(self._request_get(self.api.getAlbumList2(), params=params)['albumList2'])
+
+    def iter_album_list2(self, type_: str, page_size: int = 500, read_ahead: int = 2, workers: int = 1,
+                         from_year: int = None, to_year: int = None, genre: int = None,
+                         music_folder_id: int = None) -> typing.Iterator[models.Album]:
+        self._album_list_params(type_, page_size, 0, from_year, to_year, genre, music_folder_id)
+        return self._iter_pages(lambda offset: self.get_album_list2(type_, page_size, offset, from_year, to_year,
+                                                                    genre, music_folder_id),
+                                page_size, read_ahead, workers)
+
+    @staticmethod
+    def _iter_pages(fetch: typing.Callable[[int], list], page_size: int, read_ahead: int,
+                    workers: int) -> typing.Iterator:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pages = collections.deque()
+            next_offset = 0
+            try:
+                while True:
+                    while len(pages) <= read_ahead:
+                        pages.append(executor.submit(fetch, next_offset))
+                        next_offset += page_size
+                    albums = pages.popleft().result()
+                    yield from albums
+                    if len(albums) < page_size:
+                        return
+            finally:
+                for page in pages:
+                    page.cancel()
+
+    def iter_album_list_page(self, type_: str, size: int = 10, offset: int = 0, from_year: int = None,
+                             to_year: int = None, genre: int = None, music_folder_id: int = None) -> typing.Iterator[
+        models.Album]:
+        params = self._album_list_params(type_, size, offset, from_year, to_year, genre, music_folder_id)
+        for album in self._request_stream(self.api.getAlbumList(), 'album', params=params):
+            yield self._make_list_album(album)
 
-    def _check_children(self, children: list, explored: typing.List[str]) -> typing.List[models.Song]:
+    def _check_children(self, children: list, explored: typing.Set[str]) -> typing.List[models.Song]:
+        # directories are descended into, never returned, so this matches what iter_all_songs yields
         all_songs = []
         for child in children:
-            if isinstance(child, list):
-                for inner_child in child:
-                    if inner_child.is_dir:
-                        all_songs.extend(self.get_all_songs_for_id(inner_child.id, explored))
-                    else:
-                        all_songs.append(child)
-            else:
-                if child.is_dir:
-                    all_songs.extend(self.get_all_songs_for_id(child.id, explored))
-                all_songs.append(child)
+            for inner_child in child if isinstance(child, list) else (child,):
+                if inner_child.is_dir:
+                    all_songs.extend(self.get_all_songs_for_id(inner_child.id, explored))
+                else:
+                    all_songs.append(inner_child)
         return all_songs
 
-    def get_all_songs_for_id(self, id_: str, explored: typing.List[str]) -> typing.Set[models.Song]:
+    def get_all_songs_for_id(self, id_: str, explored: typing.Set[str]) -> typing.Set[models.Song]:
         if id_ in explored:
-            print('dup id', id_)
+            logger.debug("Skipping already explored directory {0}".format(id_))
             return set()
 
         music_dir = self.get_music_directory(id_)
-        explored.append(music_dir.id)
+        explored.add(music_dir.id)
         all_songs = self._check_children(music_dir.children, explored)
         return set(all_songs)
 
-    def get_all_songs(self) -> typing.Set[models.Song]:
+    def get_all_songs(self, workers: int = None, as_table: bool = False) -> typing.Union[
+        typing.Set[models.Song], SongTable]:
+        if workers:
+            songs = self.iter_all_songs(workers)
+            return SongTable(songs, unique=True) if as_table else set(songs)
+
         root_index = self.get_indexes()
-        explored = []
+        explored = set()
         all_songs = self._check_children(root_index.children, explored)
 
-        print(len(all_songs))
-
         for root_index in root_index.indices:
             for artist in root_index.artists:
                 all_songs.extend(self.get_all_songs_for_id(artist.id, explored))
-                print(len(all_songs))
-        logger.info("{0} tracks discovered, {1} directories explored".format(len(all_songs), explored))
-        return set(all_songs)
+                logger.debug("{0} tracks discovered".format(len(all_songs)))
+        logger.info("{0} tracks discovered, {1} directories explored".format(len(all_songs), len(explored)))
+        return SongTable(all_songs, unique=True) if as_table else set(all_songs)
+
+    def iter_all_songs(self, workers: int = 8) -> typing.Iterator[models.Child]:
+        # Breadth-first crawl keeping up to `workers` getMusicDirectory calls in flight, songs are yielded as soon as
+        # their directory comes back so the caller never waits on the whole tree.
+        root_index = self.get_indexes()
+        if root_index is None:
+            return
+
+        explored = set()
+        pending = collections.deque()
+        for child in root_index.children:
+            if child.is_dir:
+                pending.append(child.id)
+            else:
+                yield child
+        for index in root_index.indices:
+            pending.extend(artist.id for artist in index.artists)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = set()
+            while pending or in_flight:
+                while pending and len(in_flight) < workers:
+                    id_ = pending.popleft()
+                    if id_ in explored:
+                        continue
+                    explored.add(id_)
+                    in_flight.add(executor.submit(self.get_music_directory, id_))
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for child in future.result().children:
+                        if child.is_dir:
+                            if child.id not in explored:
+                                pending.append(child.id)
+                        else:
+                            yield child
+        logger.info("{0} directories explored".format(len(explored)))
+
+    def get_cover_art(self, id_: str, size: int = None) -> bytes:
+        params = {'id': id_}
+        if size:
+            params['size'] = size
+        self.wait_validated()
+        with self._measure('getCoverArt', self._merge_params(params)) as event:
+            started = time.perf_counter()
+            response = self._get(self.api.getCoverArt(), event.params)
+            event.network_seconds = time.perf_counter() - started
+            event.response_bytes = len(response.content)
+            describe_response(event, response)
+            if response.headers.get('Content-Type', '').startswith(('application/json', 'text/xml')):
+                self._check_response(response.json())
+            return response.content
 
     def start_scan(self) -> models.ScanStatus:
-        scan_status = self._request_get(self.api.startScan())['scanStatus']
-        return models.ScanStatus(scan_status['scanning'], scan_status['count'])
+        return self._parse_scan_status(self._request_get(self.api.startScan())['scanStatus'])
 
     def get_scan_status(self) -> models.ScanStatus:
-        scan_status = self._request_get(self.api.getScanStatus())['scanStatus']
-        return models.ScanStatus(scan_status['scanning'], scan_status['count'])
+        return self._parse_scan_status(self._request_get(self.api.getScanStatus())['scanStatus'])
 
     def search_query(self, query: str, artist_count: int = 20, artist_offset: int = 0, album_count: int = 20,
                      album_offset: int = 0, song_count: int = 20, song_offset: int = 0,
-                     music_folder_id: str = None) -> typing.List:
-        params = {'query': query, 'artistCount': artist_count, 'artistOffset': artist_offset,
-                  'albumCount': album_count, 'albumOffset': album_offset, 'songCount': song_count,
-                  'songOffset': song_offset}
-        if music_folder_id:
-            params['musicFolderId'] = music_folder_id
-        results = self._request_get(self.api.search2(), params=params)
-        for result in results['searchResult2']:
-            raise NotImplementedError()
-
-    def get_all_songs_fast(self) -> typing.Iterator[models.Song]:
-        with requests.Session() as session:
-            login = session.post('{0}/j_acegi_security_check'.format(self.server_location),
-                                 data={'j_username': self.username, 'j_password': self.password})
-            if '?error' in login.url:
-                raise ValueError("Username or password is wrong")
-
-            q = session.post('{0}/db.view'.format(self.server_location),
-                             data={'query': "select count(id) from media_file where type = 'MUSIC';"})
-
-            soup = BeautifulSoup(q.text, 'html.parser')
-            table = soup.find('table', attrs={'class': 'ruleTable'})
-            if not table:
-                return
-            max_length = int(table.find('td', attrs={'class': 'ruleTableCell'}).text)
-            last_id = -1
-            songs_processed = 0
-            limit_rows = 5000
-            db_columns = ['id', 'title', 'album', 'artist', 'track_number', 'genre', 'file_size',
-                          'duration_seconds', 'bit_rate', 'path', 'play_count', 'created', 'format',
-                          'album_artist', 'year', 'parent_path', 'variable_bit_rate']
-
-            def _cast_to_int(column):
-                try:
-                    return int(column)
-                except ValueError:
-                    return None
-
-            while songs_processed < max_length:
-                q = session.post('{0}/db.view'.format(self.server_location), data={
-                    'query': "select {0} from media_file where type = 'MUSIC' and id > {1} limit {2};".format(
-                        ','.join(db_columns),
-                        last_id,
-                        limit_rows)})
-                soup = BeautifulSoup(q.text, 'html.parser')
-
-                table = soup.find('table', attrs={'class': 'ruleTable'})
-                if table is None:
-                    return
-                for tr in table.find_all('tr')[1:]:
-                    columns = [col.text for col in tr.find_all('td')]
-                    song = models.Song(id_=columns[0], is_dir=False, title=columns[1], album=columns[2],
-                                       artist=columns[3], track=_cast_to_int(columns[4]), genre=columns[5],
-                                       size=_cast_to_int(columns[6]), duration=_cast_to_int(columns[7]),
-                                       content_type='MUSIC', suffix='', bit_rate=_cast_to_int(columns[8]),
-                                       path=columns[9], play_count=_cast_to_int(columns[10]), created=columns[11],
-                                       file_format=columns[12], album_artist=columns[13],
-                                       year=_cast_to_int(columns[14]), parent_path=columns[15],
-                                       variable_bit_rate=columns[16].lower() == 'true' if columns[16] else None,
-                                       stream_url=self.private_stream_url(columns[0]), album_id='', artist_id='',
-                                       type_='FILE')
-                    yield song
-                    last_id = _cast_to_int(columns[0])
-                    songs_processed += 1
-                print(last_id)
+                     music_folder_id: str = None) -> models.SearchResult:
+        params = self._search_params(query, artist_count, artist_offset, album_count, album_offset, song_count,
+                                     song_offset, music_folder_id)
+        return self._parse_search2(self._request_get(self.api.search2(), params=params).get('searchResult2', {}))
+
+    def search3(self, query: str, artist_count: int = 20, artist_offset: int = 0, album_count: int = 20,
+                album_offset: int = 0, song_count: int = 20, song_offset: int = 0,
+                music_folder_id: str = None) -> models.SearchResult:
+        params = self._search_params(query, artist_count, artist_offset, album_count, album_offset, song_count,
+                                     song_offset, music_folder_id)
+        return self._parse_search3(self._request_get(self.api.search3(), params=params).get('searchResult3', {}))
+
+    def search_all(self, query: str, page_size: int = 100, music_folder_id: str = None) -> models.SearchResult:
+        # Pages search3 with independent artist/album/song offsets; a category stops being requested (count 0)
+        # once it returns a short page.
+        result = models.SearchResult([], [], [])
+        counts = {'artists': page_size, 'albums': page_size, 'songs': page_size}
+        while any(counts.values()):
+            page = self.search3(query, counts['artists'], len(result.artists), counts['albums'], len(result.albums),
+                                counts['songs'], len(result.songs), music_folder_id)
+            for kind in counts:
+                items = getattr(page, kind)
+                getattr(result, kind).extend(items)
+                if len(items) < counts[kind]:
+                    counts[kind] = 0
+        return result
+
+    def get_all_songs_fast(self, as_table: bool = False, sessions: int = 4, page_size: int = 5000,
+                           prefetch: int = 2) -> typing.Union[typing.Iterator[models.Song], SongTable]:
+        songs = self._iter_songs_fast(sessions, page_size, prefetch)
+        return SongTable(songs) if as_table else songs
+
+    def _iter_songs_fast(self, sessions: int, page_size: int, prefetch: int) -> typing.Iterator[models.Song]:
+        # only this path needs the db.view scraper
+        from dbview import DbViewExporter
+        exporter = DbViewExporter(self.server_location, self.username, self.password, sessions=sessions,
+                                  page_size=page_size, prefetch=prefetch)
+        signer = self.stream_url_signer()
+
+        def _cast_to_int(column):
+            try:
+                return int(column)
+            except ValueError:
+                return None
+
+        for columns in exporter.iter_rows():
+            yield models.Song(id_=columns[0], is_dir=False, title=columns[1], album=columns[2],
+                              artist=columns[3], track=_cast_to_int(columns[4]), genre=columns[5],
+                              size=_cast_to_int(columns[6]), duration=_cast_to_int(columns[7]),
+                              content_type='MUSIC', suffix='', bit_rate=_cast_to_int(columns[8]),
+                              path=columns[9], play_count=_cast_to_int(columns[10]), created=columns[11],
+                              file_format=columns[12], album_artist=columns[13],
+                              year=_cast_to_int(columns[14]), parent_path=columns[15],
+                              variable_bit_rate=columns[16].lower() == 'true' if columns[16] else None,
+                              url_signer=signer, album_id='', artist_id='', type_='FILE')
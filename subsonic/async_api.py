@@ -0,0 +1,169 @@
+import asyncio
+import typing
+import logging
+
+import aiohttp
+
+import models
+from api import BaseSubsonicClient
+from playlists import playlist_diff
+from transport import TokenPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSubsonicClient(BaseSubsonicClient):
+    def __init__(self, username, password, server_location, app_name='cloudplayer', pool_size: int = 100,
+                 timeout: float = 30, session: aiohttp.ClientSession = None, token_policy: TokenPolicy = None):
+        super().__init__(username, password, server_location, app_name, token_policy)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session = session
+
+    async def __aenter__(self):
+        await self.validate()
+        logger.info("Logged in as {0}".format(self.username))
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created lazily so the connector binds to the running event loop; every call shares its keep-alive pool.
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size),
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @staticmethod
+    def _encode_params(params: dict) -> typing.List[typing.Tuple[str, str]]:
+        # aiohttp rejects None and bool values that requests silently handles, and lists need to become repeated keys
+        encoded = []
+        for key, value in params.items():
+            for item in value if isinstance(value, (list, tuple)) else (value,):
+                if item is not None:
+                    encoded.append((key, str(item).lower() if isinstance(item, bool) else str(item)))
+        return encoded
+
+    async def _request_get(self, endpoint: str, params: dict = None) -> dict:
+        full_params = self._encode_params(self._merge_params(params))
+        async with self.session.get('{0}/rest/{1}'.format(self.server_location, endpoint),
+                                    params=full_params) as response:
+            response.raise_for_status()
+            return self._check_response(await response.json(content_type=None))
+
+    async def validate(self) -> None:
+        await self._request_get('ping')
+
+    async def get_music_folders(self) -> typing.List[models.MusicFolder]:
+        return self._parse_music_folders((await self._request_get('getMusicFolders'))['musicFolders'])
+
+    async def get_music_directory(self, id_: str) -> models.Directory:
+        return self._parse_directory((await self._request_get('getMusicDirectory', params={'id': id_}))['directory'])
+
+    async def get_music_directories(self, ids: typing.Iterable[str]) -> typing.List[models.Directory]:
+        return await asyncio.gather(*[self.get_music_directory(id_) for id_ in ids])
+
+    async def get_indexes(self, music_folder_id: int = None, if_modified_since: int = None) -> typing.Optional[
+        models.IndexRoot]:
+        params = self._indexes_params(music_folder_id, if_modified_since)
+        return self._parse_indexes((await self._request_get('getIndexes', params=params))['indexes'])
+
+    async def get_artists(self, music_folder_id: str = None) -> typing.List[models.ArtistIndex]:
+        params = {'id': music_folder_id} if music_folder_id else {}
+        return self._parse_artists((await self._request_get('getArtists', params=params))['artists'])
+
+    async def get_artist(self, id_: str) -> models.Artist:
+        return self._parse_artist((await self._request_get('getArtist', params={'id': id_}))['artist'])
+
+    async def get_album(self, id_: str) -> models.Album:
+        return self._parse_album((await self._request_get('getAlbum', params={'id': id_}))['album'])
+
+    async def get_albums(self, ids: typing.Iterable[str]) -> typing.List[models.Album]:
+        return await asyncio.gather(*[self.get_album(id_) for id_ in ids])
+
+    async def _fill(self, obj: typing.Union[models.Artist, models.Album]) -> None:
+        if isinstance(obj, models.Artist):
+            obj.albums = (await self.get_artist(obj.id)).albums
+        else:
+            obj.songs = (await self.get_album(obj.id)).songs
+
+    async def prefetch(self, objects: typing.Iterable[typing.Union[models.Artist, models.Album]]) -> None:
+        # relations can't load lazily from a property here, so callers prefetch what they're about to walk
+        pending = {id(obj): obj for obj in objects if not obj.loaded}.values()
+        await asyncio.gather(*[self._fill(obj) for obj in pending])
+
+    async def get_album_list(self, type_: str, size: int = 10, offset: int = 0, from_year: int = None,
+                             to_year: int = None, genre: int = None, music_folder_id: int = None) -> typing.List[
+        models.Album]:
+        params = self._album_list_params(type_, size, offset, from_year, to_year, genre, music_folder_id)
+        return self._parse_album_list((await self._request_get('getAlbumList', params=params))['albumList'])
+
+    async def create_share(self, id_: str, description: str = None, expires: int = None) -> typing.List[
+        models.Share]:
+        params = self._share_params(id_, description, expires)
+        return self._parse_shares((await self._request_get('createShare', params=params))['shares'])
+
+    async def scrobble(self, ids: typing.Union[str, typing.Sequence[str]], times: typing.Sequence[int] = None,
+                       submission: bool = True) -> None:
+        ids = [ids] if isinstance(ids, str) else ids
+        await self._request_get('scrobble', params=self._scrobble_params(ids, times, submission))
+
+    async def star(self, ids: typing.Sequence[str] = (), album_ids: typing.Sequence[str] = (),
+                   artist_ids: typing.Sequence[str] = ()) -> None:
+        await self._request_get('star', params=self._star_params(ids, album_ids, artist_ids))
+
+    async def unstar(self, ids: typing.Sequence[str] = (), album_ids: typing.Sequence[str] = (),
+                     artist_ids: typing.Sequence[str] = ()) -> None:
+        await self._request_get('unstar', params=self._star_params(ids, album_ids, artist_ids))
+
+    async def set_rating(self, id_: str, rating: int) -> None:
+        await self._request_get('setRating', params=self._rating_params(id_, rating))
+
+    async def get_playlists(self, username: str = None) -> typing.List[models.Playlist]:
+        params = {'username': username} if username else {}
+        return self._parse_playlists((await self._request_get('getPlaylists', params=params))['playlists'])
+
+    async def get_playlist(self, id_: str) -> models.Playlist:
+        return self._parse_playlist((await self._request_get('getPlaylist', params={'id': id_}))['playlist'])
+
+    async def create_playlist(self, name: str, song_ids: typing.Sequence[str] = ()) -> models.Playlist:
+        params, rest = self._create_playlist_requests(name, song_ids)
+        playlist = self._parse_playlist((await self._request_get('createPlaylist', params=params))['playlist'])
+        if rest:
+            await self.update_playlist(playlist.id, song_ids_to_add=rest)
+            playlist = await self.get_playlist(playlist.id)
+        return playlist
+
+    async def update_playlist(self, id_: str, name: str = None, comment: str = None, public: bool = None,
+                              song_ids_to_add: typing.Sequence[str] = (),
+                              song_indexes_to_remove: typing.Iterable[int] = ()) -> None:
+        for params in self._update_playlist_requests(id_, name, comment, public, song_ids_to_add,
+                                                     song_indexes_to_remove):
+            await self._request_get('updatePlaylist', params=params)
+
+    async def sync_playlist(self, id_: str, song_ids: typing.Sequence[str], ordered: bool = True) -> typing.Tuple[
+            int, int]:
+        current = [entry.id for entry in (await self.get_playlist(id_)).entries]
+        remove, add = playlist_diff(current, list(song_ids), ordered)
+        if remove or add:
+            await self.update_playlist(id_, song_ids_to_add=add, song_indexes_to_remove=remove)
+        return len(add), len(remove)
+
+    async def sync_playlists(self, playlists: typing.Dict[str, typing.Sequence[str]], ordered: bool = True) -> \
+            typing.Dict[str, typing.Tuple[int, int]]:
+        results = await asyncio.gather(*[self.sync_playlist(id_, song_ids, ordered)
+                                          for id_, song_ids in playlists.items()])
+        return dict(zip(playlists, results))
+
+    async def start_scan(self) -> models.ScanStatus:
+        return self._parse_scan_status((await self._request_get('startScan'))['scanStatus'])
+
+    async def get_scan_status(self) -> models.ScanStatus:
+        return self._parse_scan_status((await self._request_get('getScanStatus'))['scanStatus'])
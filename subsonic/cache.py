@@ -0,0 +1,277 @@
+import collections
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+from urllib.parse import quote, unquote, urlencode
+
+AUTH_PARAMS = frozenset(('u', 't', 's', 'p'))
+MISSING = object()
+
+
+def cache_key(endpoint: str, params: dict = None) -> str:
+    # Salt and token change on every request, so only the route and the caller's own params identify a response.
+    items = sorted((key, value) for key, value in (params or {}).items()
+                   if key not in AUTH_PARAMS and value is not None)
+    return '{0}?{1}'.format(endpoint, urlencode(items))
+
+
+class CacheStats(object):
+    __slots__ = ('hits', 'misses', 'coalesced', 'evictions')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __repr__(self):
+        return 'CacheStats<hits[{0}], misses[{1}], coalesced[{2}], evictions[{3}]>'.format(
+            self.hits, self.misses, self.coalesced, self.evictions)
+
+
+class MemoryCache(object):
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float) -> int:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, prefix: str = '') -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache(object):
+    # Entries outlive the process, so expiry uses wall-clock time rather than the monotonic clock.
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires REAL, '
+                                 'accessed REAL, value TEXT)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute('SELECT expires, value FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return MISSING
+            if row[0] <= now:
+                self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                return MISSING
+            self._connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+            return json.loads(row[1])
+
+    def set(self, key: str, value, ttl: float) -> int:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                                     (key, now + ttl, now, json.dumps(value)))
+            count = self._connection.execute('SELECT count(*) FROM responses').fetchone()[0]
+            evicted = max(0, count - self.max_entries)
+            if evicted:
+                self._connection.execute('DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+                                         'ORDER BY accessed LIMIT ?)', (evicted,))
+            return evicted
+
+    def delete(self, prefix: str = '') -> None:
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM responses WHERE substr(key, 1, ?) = ?', (len(prefix), prefix))
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT count(*) FROM responses').fetchone()[0]
+
+
+class _InFlight(object):
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResponseCache(object):
+    DEFAULT_TTLS = {'getMusicFolders': 3600, 'getArtists': 300, 'getArtist': 300, 'getAlbum': 300,
+                    'getMusicDirectory': 300}
+
+    def __init__(self, backend: typing.Union[MemoryCache, DiskCache] = None, ttls: typing.Dict[str, float] = None):
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttls = dict(self.DEFAULT_TTLS if ttls is None else ttls)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def fetch(self, endpoint: str, params: dict, loader: typing.Callable[[], dict]) -> dict:
+        ttl = self.ttls.get(endpoint)
+        if not ttl:
+            return loader()
+
+        key = cache_key(endpoint, params)
+        value = self.backend.get(key)
+        if value is not MISSING:
+            self.stats.hits += 1
+            return value
+
+        # identical concurrent misses wait on the first caller's request instead of issuing their own
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _InFlight()
+        if not leader:
+            call.event.wait()
+            self.stats.coalesced += 1
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self.stats.misses += 1
+        try:
+            call.result = loader()
+            self.stats.evictions += self.backend.set(key, call.result, ttl)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.event.set()
+
+    def invalidate(self, endpoint: str = None) -> None:
+        self.backend.delete('{0}?'.format(endpoint) if endpoint else '')
+
+
+class FileCache(object):
+    # Files on disk under a byte budget, evicted least recently used first. Writers fill `partial_path(key)` and
+    # call commit(); the partial file is what a resumed download appends to. Keys held by pinned() are never
+    # evicted, so the budget can be exceeded while they are; the next commit after release evicts the excess.
+    PARTIAL_SUFFIX = '.part'
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.stats = CacheStats()
+        self._entries = collections.OrderedDict()
+        self._pins = collections.Counter()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(self.PARTIAL_SUFFIX):
+                continue
+            stat = os.stat(os.path.join(directory, name))
+            files.append((stat.st_mtime, unquote(name), stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_bytes += size
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, quote(str(key), safe=''))
+
+    def partial_path(self, key: str) -> str:
+        return self.path(key) + self.PARTIAL_SUFFIX
+
+    def get(self, key: str) -> typing.Optional[str]:
+        with self._lock:
+            if key not in self._entries:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+        path = self.path(key)
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+        return path
+
+    def __contains__(self, key: str):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def commit(self, key: str) -> str:
+        path = self.path(key)
+        os.replace(self.partial_path(key), path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self.total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict(keep=key)
+        return path
+
+    @contextlib.contextmanager
+    def pinned(self, keys: typing.Iterable[str]) -> typing.Iterator[None]:
+        keys = list(keys)
+        with self._lock:
+            self._pins.update(keys)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins.subtract(keys)
+                self._pins = +self._pins
+
+    def discard(self, key: str) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.partial_path(key))
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.path(key))
+
+    def _evict(self, keep: str = None) -> None:
+        for key in list(self._entries):
+            if self.total_bytes <= self.max_bytes:
+                return
+            if key == keep or key in self._pins:
+                continue
+            self.total_bytes -= self._entries.pop(key)
+            self.stats.evictions += 1
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.path(key))
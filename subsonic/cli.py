@@ -0,0 +1,75 @@
+import argparse
+import logging
+import os
+import sys
+
+import export
+from api import SubsonicClient
+
+
+def _format(args: argparse.Namespace) -> str:
+    if args.format:
+        return args.format
+    extension = os.path.splitext(args.output)[1].lstrip('.').lower()
+    return {'json': 'ndjson', 'jsonl': 'ndjson', 'parquet': 'parquet', 'csv': 'csv'}.get(extension, 'ndjson')
+
+
+def run_export(args: argparse.Namespace) -> int:
+    format_ = _format(args)
+    if format_ == 'parquet' and args.output == '-':
+        output = sys.stdout.buffer
+    elif format_ == 'parquet':
+        output = args.output
+    elif args.output == '-':
+        output = sys.stdout
+    else:
+        output = open(args.output, 'w', newline='' if format_ == 'csv' else None, encoding='utf-8')
+
+    client = SubsonicClient(args.username, args.password, args.location, validation='lazy')
+    try:
+        writer = export.WRITERS[format_](output)
+        if args.source == 'fast':
+            songs = client.get_all_songs_fast(sessions=args.sessions, page_size=args.page_size)
+        else:
+            songs = client.iter_all_songs(workers=args.workers)
+        count = export.export_songs(songs, writer, batch_size=args.batch_size, dedupe=not args.no_dedupe)
+        writer.close()
+    finally:
+        client.close()
+        if output not in (sys.stdout, sys.stdout.buffer) and not isinstance(output, str):
+            output.close()
+    logging.getLogger(__name__).info("Exported {0} songs as {1}".format(count, format_))
+    return 0
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m subsonic', description='Subsonic client tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='stream every song to NDJSON, CSV or Parquet')
+    export_parser.add_argument('output', help="file to write, '-' for stdout")
+    export_parser.add_argument('--format', choices=sorted(export.WRITERS),
+                               help='defaults to the output extension, then ndjson')
+    export_parser.add_argument('--location', default=os.environ.get('LOCATION'), required='LOCATION' not in os.environ)
+    export_parser.add_argument('--username', default=os.environ.get('USERNAME'), required='USERNAME' not in os.environ)
+    export_parser.add_argument('--password', default=os.environ.get('PASSWORD'), required='PASSWORD' not in os.environ)
+    export_parser.add_argument('--source', choices=('crawl', 'fast'), default='crawl',
+                               help='getMusicDirectory crawl, or the db.view fast path')
+    export_parser.add_argument('--workers', type=int, default=8, help='concurrent directory requests for crawl')
+    export_parser.add_argument('--sessions', type=int, default=4, help='db.view sessions for fast')
+    export_parser.add_argument('--page-size', type=int, default=5000, help='db.view page size for fast')
+    export_parser.add_argument('--batch-size', type=int, default=5000, help='rows per write')
+    export_parser.add_argument('--no-dedupe', action='store_true', help='skip the id index')
+    export_parser.add_argument('-v', '--verbose', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+    try:
+        return run_export(args)
+    except ValueError as e:
+        print('error: {0}'.format(e), file=sys.stderr)
+        return 1
+
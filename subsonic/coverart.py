@@ -0,0 +1,110 @@
+import contextlib
+import hashlib
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from api import SubsonicClient
+from cache import FileCache
+
+
+class CoverArtCache(object):
+    # Images are stored once per sha256 of their bytes in a size-bounded FileCache, and a small SQLite index maps
+    # (cover id, size) to that digest, so albums sharing artwork share one file. Index rows whose blob has been
+    # evicted are treated as misses.
+    def __init__(self, client: SubsonicClient, directory: str, max_bytes: int = 256 * 1024 * 1024,
+                 workers: int = 8):
+        self.client = client
+        self.directory = directory
+        self.workers = workers
+        self.blobs = FileCache(os.path.join(directory, 'blobs'), max_bytes)
+        self._lock = threading.Lock()
+        self._index = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self._index.execute('CREATE TABLE IF NOT EXISTS covers (cover_id TEXT, size INTEGER, digest TEXT, '
+                            'PRIMARY KEY (cover_id, size))')
+
+    def close(self) -> None:
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _cached_digest(self, cover_id: str, size: int = None) -> typing.Optional[str]:
+        # the caller holds self._lock
+        row = self._index.execute('SELECT digest FROM covers WHERE cover_id = ? AND size = ?',
+                                  (cover_id, size or 0)).fetchone()
+        return row[0] if row and self.blobs.get(row[0]) is not None else None
+
+    def cached_path(self, cover_id: str, size: int = None) -> typing.Optional[str]:
+        with self._lock:
+            digest = self._cached_digest(cover_id, size)
+        return self.blobs.path(digest) if digest is not None else None
+
+    def _store(self, cover_id: str, size: int, image: bytes) -> str:
+        # the caller holds self._lock
+        digest = hashlib.sha256(image).hexdigest()
+        if digest not in self.blobs:
+            descriptor, temporary = tempfile.mkstemp(dir=self.blobs.directory, suffix=FileCache.PARTIAL_SUFFIX)
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(image)
+            os.replace(temporary, self.blobs.partial_path(digest))
+            self.blobs.commit(digest)
+        with self._index:
+            self._index.execute('INSERT OR REPLACE INTO covers VALUES (?, ?, ?)', (cover_id, size or 0, digest))
+        return digest
+
+    def _pin_cached(self, cover_id: str, size: int, pins: contextlib.ExitStack) -> typing.Optional[str]:
+        # Every blob commit goes through self._lock, so a blob found or stored under it can't be evicted before it is
+        # pinned on `pins`; its path stays valid until the caller closes them.
+        with self._lock:
+            digest = self._cached_digest(cover_id, size)
+            if digest is None:
+                return None
+            pins.enter_context(self.blobs.pinned([digest]))
+        return self.blobs.path(digest)
+
+    def _fetch(self, cover_id: str, size: int, pins: contextlib.ExitStack) -> str:
+        path = self._pin_cached(cover_id, size, pins)
+        if path is not None:
+            return path
+        image = self.client.get_cover_art(cover_id, size)
+        with self._lock:
+            digest = self._store(cover_id, size, image)
+            pins.enter_context(self.blobs.pinned([digest]))
+        return self.blobs.path(digest)
+
+    def fetch(self, cover_id: str, size: int = None) -> str:
+        with contextlib.ExitStack() as pins:
+            return self._fetch(cover_id, size, pins)
+
+    def fetch_many(self, cover_ids: typing.Iterable[str], size: int = None) -> typing.Dict[str, str]:
+        # the batch's blobs stay pinned until it returns, so storing the later covers can't evict the earlier ones
+        with contextlib.ExitStack() as pins:
+            paths = {}
+            missing = []
+            for cover_id in dict.fromkeys(cover_id for cover_id in cover_ids if cover_id):
+                path = self._pin_cached(cover_id, size, pins)
+                if path is None:
+                    missing.append(cover_id)
+                else:
+                    paths[cover_id] = path
+            if missing:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    paths.update(zip(missing, executor.map(lambda cover_id: self._fetch(cover_id, size, pins),
+                                                           missing)))
+            return paths
+
+    def open(self, cover_id: str, size: int = None) -> typing.Union[mmap.mmap, bytes]:
+        # read-only mapping of the cached file; pages come from the OS cache without copying into Python memory
+        with contextlib.ExitStack() as pins:
+            with open(self._fetch(cover_id, size, pins), 'rb') as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return b''
+                return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,156 @@
+import html
+import queue
+import re
+import threading
+import time
+import typing
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DB_COLUMNS = ['id', 'title', 'album', 'artist', 'track_number', 'genre', 'file_size', 'duration_seconds', 'bit_rate',
+              'path', 'play_count', 'created', 'format', 'album_artist', 'year', 'parent_path', 'variable_bit_rate']
+
+_TABLE = re.compile(r'<table[^>]*class="[^"]*ruleTable[^"]*"[^>]*>(.*?)</table>', re.S | re.I)
+_ROW = re.compile(r'<tr[^>]*>(.*?)</tr>', re.S | re.I)
+_CELL = re.compile(r'<td[^>]*>(.*?)</td>', re.S | re.I)
+_TAG = re.compile(r'<[^>]+>')
+
+_DONE = object()
+
+
+def _cell_text(cell: str) -> str:
+    if '<' in cell:
+        cell = _TAG.sub('', cell)
+    if '&' in cell:
+        cell = html.unescape(cell)
+    return cell
+
+
+def parse_rule_table(text: str) -> typing.Optional[typing.List[typing.List[str]]]:
+    # Pulls the cells out of db.view's result table with a handful of regex scans instead of building a DOM; the
+    # first row is the column header and is skipped.
+    table = _TABLE.search(text)
+    if table is None:
+        return None
+    rows = _ROW.findall(table.group(1))[1:]
+    return [[_cell_text(cell) for cell in _CELL.findall(row)] for row in rows]
+
+
+class DbViewExporter(object):
+    def __init__(self, server_location: str, username: str, password: str, sessions: int = 4, page_size: int = 5000,
+                 min_page_size: int = 500, max_page_size: int = 50000, target_page_seconds: float = 1.0,
+                 prefetch: int = 2, timeout: float = 300):
+        self.server_location = server_location
+        self.username = username
+        self.password = password
+        self.sessions = sessions
+        self.page_size = page_size
+        self.min_page_size = min_page_size
+        self.max_page_size = max_page_size
+        self.target_page_seconds = target_page_seconds
+        self.prefetch = prefetch
+        self.timeout = timeout
+
+    def _login(self) -> requests.Session:
+        session = requests.Session()
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        login = session.post('{0}/j_acegi_security_check'.format(self.server_location),
+                             data={'j_username': self.username, 'j_password': self.password}, timeout=self.timeout)
+        if '?error' in login.url:
+            session.close()
+            raise ValueError("Username or password is wrong")
+        return session
+
+    def _query(self, session: requests.Session, query: str) -> typing.Optional[typing.List[typing.List[str]]]:
+        response = session.post('{0}/db.view'.format(self.server_location), data={'query': query},
+                                timeout=self.timeout)
+        return parse_rule_table(response.text)
+
+    def _next_page_size(self, page_size: int, elapsed: float) -> int:
+        # aim each page at target_page_seconds, moving at most 2x per step so one slow page doesn't collapse it
+        if elapsed <= 0:
+            scaled = page_size * 2
+        else:
+            scaled = int(page_size * min(2.0, max(0.5, self.target_page_seconds / elapsed)))
+        return max(self.min_page_size, min(self.max_page_size, scaled))
+
+    def _partitions(self, low: int, high: int) -> typing.List[typing.Tuple[int, int]]:
+        # (exclusive lower bound, inclusive upper bound) id ranges of roughly equal width
+        width = max(1, (high - low + self.sessions) // self.sessions)
+        partitions = []
+        start = low - 1
+        while start < high:
+            end = min(high, start + width)
+            partitions.append((start, end))
+            start = end
+        return partitions
+
+    def _export_partition(self, bounds: typing.Tuple[int, int], pages: queue.Queue, stop: threading.Event,
+                          session: requests.Session = None) -> None:
+        try:
+            session = session if session is not None else self._login()
+            with session:
+                last_id, high = bounds
+                page_size = self.page_size
+                while last_id < high and not stop.is_set():
+                    started = time.monotonic()
+                    rows = self._query(session,
+                                       "select {0} from media_file where type = 'MUSIC' and id > {1} and id <= {2} "
+                                       "limit {3};".format(','.join(DB_COLUMNS), last_id, high, page_size))
+                    if not rows:
+                        break
+                    self._put(pages, rows, stop)
+                    if len(rows) < page_size:
+                        break
+                    last_id = int(rows[-1][0])
+                    page_size = self._next_page_size(page_size, time.monotonic() - started)
+        except Exception as e:
+            self._put(pages, e, stop)
+        finally:
+            self._put(pages, _DONE, stop)
+
+    @staticmethod
+    def _put(pages: queue.Queue, item, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def iter_rows(self) -> typing.Iterator[typing.List[str]]:
+        session = self._login()
+        bounds = self._query(session, "select min(id), max(id), count(id) from media_file where type = 'MUSIC';")
+        if not bounds or not bounds[0][0]:
+            session.close()
+            return
+        low, high, count = (int(value) for value in bounds[0])
+        partitions = self._partitions(low, high)
+        logger.info("Exporting {0} tracks over {1} partitions".format(count, len(partitions)))
+
+        pages = queue.Queue(maxsize=self.prefetch * len(partitions))
+        stop = threading.Event()
+        # the session used for the bounds query is handed to the first partition instead of logging in again
+        threads = [threading.Thread(target=self._export_partition,
+                                    args=(partition, pages, stop, session if i == 0 else None), daemon=True)
+                   for i, partition in enumerate(partitions)]
+        for thread in threads:
+            thread.start()
+        try:
+            running = len(threads)
+            while running:
+                page = pages.get()
+                if page is _DONE:
+                    running -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield from page
+        finally:
+            # not joined: a thread may be mid-POST for up to `timeout`, it sees `stop` once that returns and exits
+            stop.set()
@@ -0,0 +1,113 @@
+import os
+import threading
+import typing
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import models
+from api import SubsonicClient
+from cache import FileCache
+from instrumentation import count_chunks, describe_response
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadManager(object):
+    # Fetches song files into a FileCache with a pool of workers. Transfers write straight to a partial file in
+    # chunk_size pieces; an interrupted transfer resumes from the partial file's length with a Range request.
+    def __init__(self, client: SubsonicClient, cache: FileCache, workers: int = 4, chunk_size: int = 256 * 1024,
+                 endpoint: str = 'download', max_attempts: int = 3):
+        self.client = client
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.endpoint = endpoint
+        self.max_attempts = max_attempts
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _expected_size(self, song: models.Child) -> typing.Optional[int]:
+        # stream may transcode, only the original file from download is guaranteed to match Song.size
+        return song.size if self.endpoint == 'download' else None
+
+    def _transfer(self, song: models.Child) -> str:
+        partial = self.cache.partial_path(song.id)
+        url = self.client.stream_url_signer(endpoint=self.endpoint)(song.id)
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        expected = self._expected_size(song)
+        if expected is not None and offset == expected:
+            return self.cache.commit(song.id)
+        if expected is not None and offset > expected:
+            offset = 0
+        headers = {'Range': 'bytes={0}-'.format(offset)} if offset else {}
+
+        # the URL is signed already, the event's params only say which song it was
+        with self.client._measure(self.endpoint, {'id': song.id, 'offset': offset}) as event:
+            with self.client.transport.get(url, headers=headers, stream=True) as response:
+                describe_response(event, response)
+                if response.headers.get('Content-Type', '').startswith(('application/json', 'text/xml')):
+                    self.client._check_response(response.json())
+                    raise ValueError('Unexpected {0} response for {1}'.format(response.headers['Content-Type'],
+                                                                              song.id))
+                # a 200 means the server ignored the range, start the file over
+                mode = 'ab' if offset and response.status_code == 206 else 'wb'
+                with open(partial, mode) as file:
+                    for chunk in count_chunks(event, response.iter_content(self.chunk_size)):
+                        file.write(chunk)
+
+        size = os.path.getsize(partial)
+        if expected is not None and size != expected:
+            self.cache.discard(song.id)
+            raise ValueError('Downloaded {0} bytes for {1}, expected {2}'.format(size, song.id, expected))
+        return self.cache.commit(song.id)
+
+    def download(self, song: models.Child) -> str:
+        # through the pool, so a caller asking for a song that is already downloading waits for that transfer
+        return self.submit(song).result()
+
+    def _download(self, song: models.Child) -> str:
+        path = self.cache.get(song.id)
+        if path is not None:
+            return path
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return self._transfer(song)
+            except IOError as e:
+                # the partial file is kept so the next attempt resumes where this one stopped
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning("Download of {0} failed ({1}), retrying".format(song.id, e))
+
+    def submit(self, song: models.Child) -> Future:
+        with self._lock:
+            future = self._in_flight.get(song.id)
+            if future is not None:
+                return future
+            future = self._in_flight[song.id] = self._executor.submit(self._download, song)
+        # registered outside the lock: the callback runs inline when the future has already finished
+        future.add_done_callback(lambda _: self._done(song.id))
+        return future
+
+    def _done(self, id_: str) -> None:
+        with self._lock:
+            self._in_flight.pop(id_, None)
+
+    def download_all(self, songs: typing.Iterable[models.Child]) -> typing.List[str]:
+        # the batch is pinned until every path is returned, a batch larger than the cache would otherwise evict its
+        # own first files
+        songs = list(songs)
+        with self.cache.pinned(song.id for song in songs):
+            return [future.result() for future in [self.submit(song) for song in songs]]
+
+    def prefetch(self, queue: typing.Sequence[models.Child], position: int, ahead: int = 3) -> typing.List[Future]:
+        # background downloads for the `ahead` tracks after `position` that aren't already cached
+        return [self.submit(song) for song in queue[position + 1:position + 1 + ahead] if song.id not in self.cache]
@@ -0,0 +1,144 @@
+import csv
+import hashlib
+import json
+import typing
+
+import models
+
+EXPORT_COLUMNS = ('id', 'title', 'album', 'artist', 'track', 'genre', 'size', 'content_type', 'suffix', 'duration',
+                  'bit_rate', 'path', 'play_count', 'created', 'album_id', 'artist_id', 'type')
+INT_COLUMNS = frozenset(('track', 'size', 'duration', 'bit_rate', 'play_count'))
+# 16MiB of bitmap; ids past this go to the digest set instead of growing the bitmap further
+MAX_BITMAP_ID = 2 ** 27
+
+
+class IdIndex(object):
+    # Seen-set for song ids. Numeric ids, which is what Subsonic and Airsonic hand out, take one bit each in a
+    # bitmap; anything else is kept as a 64-bit digest rather than the id string.
+    def __init__(self):
+        self._bits = bytearray()
+        self._digests = set()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _number(id_: str) -> typing.Optional[int]:
+        # '007' and '7' are different ids, only canonical decimals share the bitmap
+        if id_.isdigit() and (id_ == '0' or id_[0] != '0'):
+            number = int(id_)
+            if number < MAX_BITMAP_ID:
+                return number
+        return None
+
+    @staticmethod
+    def _digest(id_: str) -> int:
+        return int.from_bytes(hashlib.blake2b(id_.encode(), digest_size=8).digest(), 'little')
+
+    def __contains__(self, id_: str):
+        number = self._number(str(id_))
+        if number is None:
+            return self._digest(str(id_)) in self._digests
+        byte, bit = divmod(number, 8)
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << bit))
+
+    def add(self, id_: str) -> bool:
+        # True when the id wasn't in the index yet
+        number = self._number(str(id_))
+        if number is None:
+            digest = self._digest(str(id_))
+            if digest in self._digests:
+                return False
+            self._digests.add(digest)
+        else:
+            byte, bit = divmod(number, 8)
+            if byte >= len(self._bits):
+                self._bits.extend(bytes(max(byte + 1 - len(self._bits), len(self._bits))))
+            if self._bits[byte] & (1 << bit):
+                return False
+            self._bits[byte] |= 1 << bit
+        self._count += 1
+        return True
+
+
+class NDJSONWriter(object):
+    def __init__(self, file: typing.TextIO, columns: typing.Sequence[str] = EXPORT_COLUMNS):
+        self.file = file
+        self.columns = tuple(columns)
+
+    def write_batch(self, rows: typing.List[tuple]) -> None:
+        self.file.write(''.join(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + '\n' for row in rows))
+
+    def close(self) -> None:
+        self.file.flush()
+
+
+class CSVWriter(object):
+    def __init__(self, file: typing.TextIO, columns: typing.Sequence[str] = EXPORT_COLUMNS):
+        self.file = file
+        self.columns = tuple(columns)
+        self._writer = csv.writer(file)
+        self._writer.writerow(self.columns)
+
+    def write_batch(self, rows: typing.List[tuple]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self.file.flush()
+
+
+class ParquetWriter(object):
+    # every batch becomes one row group, so only a batch worth of columns is ever held in memory
+    def __init__(self, file: typing.Union[str, typing.BinaryIO], columns: typing.Sequence[str] = EXPORT_COLUMNS):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('Parquet export needs pyarrow installed')
+        self._pyarrow = pyarrow
+        self.columns = tuple(columns)
+        self.schema = pyarrow.schema([(column, pyarrow.int64() if column in INT_COLUMNS else pyarrow.string())
+                                      for column in self.columns])
+        self._writer = pyarrow.parquet.ParquetWriter(file, self.schema)
+
+    def write_batch(self, rows: typing.List[tuple]) -> None:
+        arrays = [self._pyarrow.array([row[i] for row in rows], type=field.type)
+                  for i, field in enumerate(self.schema)]
+        self._writer.write_table(self._pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+WRITERS = {'ndjson': NDJSONWriter, 'csv': CSVWriter, 'parquet': ParquetWriter}
+
+
+def _value(song: models.Child, column: str):
+    value = getattr(song, column)
+    if column not in INT_COLUMNS and value is not None and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def export_songs(songs: typing.Iterable[models.Child],
+                 writer: typing.Union[NDJSONWriter, CSVWriter, ParquetWriter], batch_size: int = 5000,
+                 dedupe: bool = True) -> int:
+    # Rows are flushed every `batch_size` songs and the songs themselves are dropped as soon as their row is built,
+    # so memory is one batch plus the id index however large the library is.
+    index = IdIndex() if dedupe else None
+    columns = writer.columns
+    batch = []
+    written = 0
+    for song in songs:
+        if song.is_dir or (index is not None and not index.add(song.id)):
+            continue
+        batch.append(tuple(_value(song, column) for column in columns))
+        if len(batch) >= batch_size:
+            writer.write_batch(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        writer.write_batch(batch)
+        written += len(batch)
+    return written
@@ -0,0 +1,44 @@
+import threading
+import typing
+import weakref
+
+# relations and lazily built values are only copied over when the newer object actually carries them
+_KEEP_IF_MISSING = frozenset(('_songs', '_albums', '_stream_url', '_url_signer', '_loader'))
+
+
+def _fields(cls: type) -> typing.List[str]:
+    fields = []
+    for klass in reversed(cls.__mro__):
+        fields.extend(slot for slot in getattr(klass, '__slots__', ()) if slot != '__weakref__')
+    return fields
+
+
+class IdentityMap(object):
+    # One live model per (type, id). Entries are weak, so objects vanish from the map once the caller drops them;
+    # merging a freshly parsed object into a live one refreshes its fields in place and returns the live one.
+    def __init__(self):
+        self._objects = weakref.WeakValueDictionary()
+        self._fields = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def get(self, cls: type, id_: str):
+        return self._objects.get((cls, id_))
+
+    def merge(self, obj):
+        cls = type(obj)
+        with self._lock:
+            current = self._objects.get((cls, obj.id))
+            if current is None:
+                self._objects[(cls, obj.id)] = obj
+                return obj
+            fields = self._fields.get(cls)
+            if fields is None:
+                fields = self._fields[cls] = _fields(cls)
+            for field in fields:
+                value = getattr(obj, field)
+                if field not in _KEEP_IF_MISSING or (value is not None and value != ''):
+                    setattr(current, field, value)
+            return current
@@ -0,0 +1,208 @@
+import bisect
+import contextlib
+import threading
+import time
+import typing
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> typing.List[typing.Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return result
+
+    def quantile(self, q: float) -> float:
+        # upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+
+class RequestEvent(object):
+    __slots__ = ('endpoint', 'params', 'seconds', 'network_seconds', 'parse_seconds', 'request_bytes',
+                 'response_bytes', 'retries', 'error')
+
+    def __init__(self, endpoint: str, params: dict):
+        self.endpoint = endpoint
+        self.params = params
+        self.seconds = 0.0
+        self.network_seconds = 0.0
+        self.parse_seconds = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.error = None
+
+    def __repr__(self):
+        return 'RequestEvent<endpoint[{0}], seconds[{1:.4f}], error[{2}]>'.format(self.endpoint, self.seconds,
+                                                                                  self.error)
+
+
+def describe_response(event: RequestEvent, response) -> None:
+    event.request_bytes = len(response.request.url) + len(response.request.body or b'')
+    retries = getattr(response.raw, 'retries', None)
+    event.retries = len(retries.history) if retries is not None else 0
+
+
+def count_chunks(event: RequestEvent, chunks: typing.Iterable[bytes]) -> typing.Iterator[bytes]:
+    # for streamed bodies: bytes and the time spent waiting on the next chunk are network, the rest is the caller's
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        event.network_seconds += time.perf_counter() - started
+        if chunk is None:
+            return
+        event.response_bytes += len(chunk)
+        yield chunk
+
+
+class RouteStats(object):
+    __slots__ = ('latency', 'requests', 'errors', 'retries', 'request_bytes', 'response_bytes', 'network_seconds',
+                 'parse_seconds')
+
+    def __init__(self, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        self.latency = Histogram(buckets)
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.network_seconds = 0.0
+        self.parse_seconds = 0.0
+
+    def add(self, event: RequestEvent) -> None:
+        self.latency.observe(event.seconds)
+        self.requests += 1
+        self.errors += event.error is not None
+        self.retries += event.retries
+        self.request_bytes += event.request_bytes
+        self.response_bytes += event.response_bytes
+        self.network_seconds += event.network_seconds
+        self.parse_seconds += event.parse_seconds
+
+    def __repr__(self):
+        return 'RouteStats<requests[{0}], errors[{1}], network[{2:.3f}s], parse[{3:.3f}s]>'.format(
+            self.requests, self.errors, self.network_seconds, self.parse_seconds)
+
+
+class Instrumentation(object):
+    _COUNTERS = (('requests', 'subsonic_requests_total', 'Requests sent'),
+                 ('errors', 'subsonic_request_errors_total', 'Requests that raised'),
+                 ('retries', 'subsonic_request_retries_total', 'Transport level retries'),
+                 ('request_bytes', 'subsonic_request_bytes_total', 'Bytes of request line and body sent'),
+                 ('response_bytes', 'subsonic_response_bytes_total', 'Bytes of response body received'),
+                 ('network_seconds', 'subsonic_network_seconds_total', 'Time spent sending and receiving'),
+                 ('parse_seconds', 'subsonic_parse_seconds_total', 'Time spent decoding responses'))
+
+    def __init__(self, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.routes = {}
+        self.pre_request_hooks = []
+        self.post_request_hooks = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def add_pre_request_hook(self, hook: typing.Callable[[RequestEvent], None]) -> None:
+        self.pre_request_hooks.append(hook)
+
+    def add_post_request_hook(self, hook: typing.Callable[[RequestEvent], None]) -> None:
+        self.post_request_hooks.append(hook)
+
+    @contextlib.contextmanager
+    def measure(self, endpoint: str, params: dict) -> typing.Iterator[RequestEvent]:
+        # for calls that don't fit request(): the block fills in the event, timing and recording happen here
+        event = RequestEvent(endpoint, params)
+        for hook in self.pre_request_hooks:
+            hook(event)
+        started = time.perf_counter()
+        try:
+            yield event
+        except Exception as e:
+            event.error = e
+            raise
+        finally:
+            event.seconds = time.perf_counter() - started
+            self.record(event)
+
+    def request(self, endpoint: str, params: dict, send: typing.Callable, parse: typing.Callable):
+        with self.measure(endpoint, params) as event:
+            started = time.perf_counter()
+            response = send(event.params)
+            event.response_bytes = len(response.content)
+            event.network_seconds = time.perf_counter() - started
+            describe_response(event, response)
+            parse_started = time.perf_counter()
+            result = parse(response)
+            event.parse_seconds = time.perf_counter() - parse_started
+            return result
+
+    def record(self, event: RequestEvent) -> None:
+        with self._lock:
+            for target in [self] + self._collectors:
+                stats = target.routes.get(event.endpoint)
+                if stats is None:
+                    stats = target.routes[event.endpoint] = RouteStats(target.buckets)
+                stats.add(event)
+        for hook in self.post_request_hooks:
+            hook(event)
+
+    @contextlib.contextmanager
+    def collect(self) -> typing.Iterator['Instrumentation']:
+        # gathers every request recorded while the block runs, from any thread, into a separate set of stats
+        collector = Instrumentation(self.buckets)
+        with self._lock:
+            self._collectors.append(collector)
+        try:
+            yield collector
+        finally:
+            with self._lock:
+                self._collectors.remove(collector)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.routes = {}
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            routes = sorted(self.routes.items())
+            lines = ['# HELP subsonic_request_duration_seconds Request latency per route',
+                     '# TYPE subsonic_request_duration_seconds histogram']
+            for endpoint, stats in routes:
+                for bound, count in stats.latency.cumulative():
+                    lines.append('subsonic_request_duration_seconds_bucket{{route="{0}",le="{1}"}} {2}'.format(
+                        endpoint, bound, count))
+                lines.append('subsonic_request_duration_seconds_sum{{route="{0}"}} {1!r}'.format(
+                    endpoint, stats.latency.sum))
+                lines.append('subsonic_request_duration_seconds_count{{route="{0}"}} {1}'.format(
+                    endpoint, stats.latency.count))
+            for attribute, name, description in self._COUNTERS:
+                lines.append('# HELP {0} {1}'.format(name, description))
+                lines.append('# TYPE {0} counter'.format(name))
+                for endpoint, stats in routes:
+                    lines.append('{0}{{route="{1}"}} {2!r}'.format(name, endpoint, getattr(stats, attribute)))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,187 @@
+import sqlite3
+import time
+import typing
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import models
+from api import SubsonicClient
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS folders (id TEXT PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS artists (id TEXT PRIMARY KEY, name TEXT, cover_art TEXT, album_count INTEGER);
+CREATE TABLE IF NOT EXISTS albums (id TEXT PRIMARY KEY, name TEXT, cover_art TEXT, song_count INTEGER, created TEXT,
+                                   duration INTEGER, artist TEXT, artist_id TEXT, year INTEGER, genre TEXT);
+CREATE INDEX IF NOT EXISTS albums_artist_id ON albums (artist_id);
+CREATE TABLE IF NOT EXISTS songs (id TEXT PRIMARY KEY, is_dir INTEGER, title TEXT, album TEXT, artist TEXT,
+                                  track INTEGER, genre TEXT, size INTEGER, content_type TEXT, suffix TEXT,
+                                  duration INTEGER, bit_rate INTEGER, path TEXT, play_count INTEGER, created TEXT,
+                                  album_id TEXT, artist_id TEXT, type TEXT);
+CREATE INDEX IF NOT EXISTS songs_album_id ON songs (album_id);
+CREATE INDEX IF NOT EXISTS songs_artist_id ON songs (artist_id);
+'''
+
+# columns added after the first release, appended to mirrors created before them
+ADDED_ALBUM_COLUMNS = (('year', 'INTEGER'), ('genre', 'TEXT'))
+SONG_COLUMNS = ('id', 'is_dir', 'title', 'album', 'artist', 'track', 'genre', 'size', 'content_type', 'suffix',
+                'duration', 'bit_rate', 'path', 'play_count', 'created', 'album_id', 'artist_id', 'type')
+
+
+class LibraryMirror(object):
+    def __init__(self, client: SubsonicClient, path: str, workers: int = 8, full_interval: float = 24 * 3600):
+        # full_interval: seconds after which sync() refetches every album again, None to only do so on sync(full=True)
+        self.client = client
+        self.path = path
+        self.workers = workers
+        self.full_interval = full_interval
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(albums)')}
+        with self.connection:
+            for name, type_ in ADDED_ALBUM_COLUMNS:
+                if name not in columns:
+                    self.connection.execute('ALTER TABLE albums ADD COLUMN {0} {1}'.format(name, type_))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    @property
+    def last_modified(self) -> typing.Optional[int]:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'last_modified'").fetchone()
+        return int(row[0]) if row else None
+
+    def _full_sync_due(self) -> bool:
+        if self.full_interval is None:
+            return False
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'last_full_sync'").fetchone()
+        return row is None or time.time() - float(row[0]) >= self.full_interval
+
+    def sync(self, full: bool = False, page_size: int = 500) -> bool:
+        # The index lastModified gates the whole sync. Past that, artists come from one getArtists call and albums
+        # from getAlbumList2 in pages of `page_size`; only albums whose listing entry changed (name, artist, cover
+        # art, year, genre, song count, duration or created) are fetched again with getAlbum. A change the listing
+        # doesn't show, such as a retagged song title, is only picked up by a full sync: pass full=True, or let
+        # `full_interval` make one due.
+        full = full or self._full_sync_due()
+        last_modified = None if full else self.last_modified
+        index_root = self.client.get_indexes(if_modified_since=last_modified)
+        if index_root is None:
+            logger.info("Library unchanged since {0}".format(last_modified))
+            return False
+
+        # the library changed, so cached listings predate it and would be stored under the new lastModified
+        if self.client.cache is not None:
+            self.client.cache.invalidate()
+        folders = self.client.get_music_folders()
+        artists = [artist for index in self.client.get_artists() for artist in index.artists]
+        remote_albums = {album.id: album for album in
+                         self.client.iter_album_list2('alphabeticalByName', page_size=page_size)}
+        stale = [album.id for album in remote_albums.values() if full or self._album_changed(album)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            albums = list(executor.map(self.client.get_album, stale))
+
+        with self.connection:
+            self.connection.execute('DELETE FROM folders')
+            self.connection.executemany('INSERT INTO folders VALUES (?, ?)',
+                                        [(folder.id, folder.name) for folder in folders])
+            self.connection.execute('DELETE FROM artists')
+            self.connection.executemany('INSERT INTO artists VALUES (?, ?, ?, ?)',
+                                        [(artist.id, artist.name, artist.cover_art, artist.album_count)
+                                         for artist in artists])
+            self._delete_missing_albums(remote_albums)
+            self.connection.executemany('INSERT OR REPLACE INTO albums VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                        [self._album_row(album) for album in remote_albums.values()])
+            for album in albums:
+                self.connection.execute('DELETE FROM songs WHERE album_id = ?', (album.id,))
+                self.connection.executemany('INSERT OR REPLACE INTO songs VALUES ({0})'.format(
+                    ', '.join('?' * len(SONG_COLUMNS))), [self._song_row(song) for song in album.songs])
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('last_modified', ?)",
+                                    (str(index_root.last_modified),))
+            if full:
+                self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('last_full_sync', ?)", (str(time.time()),))
+
+        logger.info("Synced {0} artists, {1} of {2} albums refreshed".format(len(artists), len(albums),
+                                                                            len(remote_albums)))
+        return True
+
+    def _album_changed(self, album: models.Album) -> bool:
+        row = self.connection.execute('SELECT name, artist, cover_art, year, genre, song_count, duration, created '
+                                      'FROM albums WHERE id = ?', (album.id,)).fetchone()
+        return row != (album.name, album.artist, album.cover_art, album.year, album.genre, album.song_count,
+                       album.duration, album.created)
+
+    def _delete_missing_albums(self, remote_albums: typing.Dict[str, models.Album]) -> None:
+        local_ids = [row[0] for row in self.connection.execute('SELECT id FROM albums')]
+        missing = [(id_,) for id_ in local_ids if id_ not in remote_albums]
+        self.connection.executemany('DELETE FROM songs WHERE album_id = ?', missing)
+        self.connection.executemany('DELETE FROM albums WHERE id = ?', missing)
+
+    @staticmethod
+    def _album_row(album: models.Album) -> tuple:
+        return (album.id, album.name, album.cover_art, album.song_count, album.created, album.duration, album.artist,
+                album.artist_id, album.year, album.genre)
+
+    @staticmethod
+    def _song_row(song: models.Song) -> tuple:
+        return (song.id, song.is_dir, song.title, song.album, song.artist, song.track, song.genre, song.size,
+                song.content_type, song.suffix, song.duration, song.bit_rate, song.path, song.play_count, song.created,
+                song.album_id, song.artist_id, song.type)
+
+    @staticmethod
+    def _make_album(row: tuple, songs: typing.List[models.Song] = None) -> models.Album:
+        return models.Album(*row[:8], songs if songs is not None else [], year=row[8], genre=row[9])
+
+    @staticmethod
+    def _make_song(row: tuple) -> models.Song:
+        return models.Song(row[0], bool(row[1]), *row[2:])
+
+    def get_music_folders(self) -> typing.List[models.MusicFolder]:
+        return [models.MusicFolder(*row) for row in self.connection.execute('SELECT id, name FROM folders')]
+
+    def get_artists(self) -> typing.List[models.Artist]:
+        return [models.Artist(*row, []) for row in
+                self.connection.execute('SELECT id, name, cover_art, album_count FROM artists ORDER BY name')]
+
+    def get_artist(self, id_: str) -> typing.Optional[models.Artist]:
+        row = self.connection.execute('SELECT id, name, cover_art, album_count FROM artists WHERE id = ?',
+                                      (id_,)).fetchone()
+        if row is None:
+            return None
+        return models.Artist(*row, self.get_albums(artist_id=id_))
+
+    def get_albums(self, artist_id: str = None) -> typing.List[models.Album]:
+        if artist_id is None:
+            rows = self.connection.execute('SELECT * FROM albums ORDER BY artist, name')
+        else:
+            rows = self.connection.execute('SELECT * FROM albums WHERE artist_id = ? ORDER BY name', (artist_id,))
+        return [self._make_album(row) for row in rows]
+
+    def get_album(self, id_: str) -> typing.Optional[models.Album]:
+        row = self.connection.execute('SELECT * FROM albums WHERE id = ?', (id_,)).fetchone()
+        if row is None:
+            return None
+        return self._make_album(row, self.get_songs(album_id=id_))
+
+    def get_songs(self, album_id: str = None, artist_id: str = None) -> typing.List[models.Song]:
+        query = 'SELECT {0} FROM songs'.format(', '.join(SONG_COLUMNS))
+        if album_id is not None:
+            rows = self.connection.execute(query + ' WHERE album_id = ? ORDER BY track', (album_id,))
+        elif artist_id is not None:
+            rows = self.connection.execute(query + ' WHERE artist_id = ? ORDER BY album, track', (artist_id,))
+        else:
+            rows = self.connection.execute(query)
+        return [self._make_song(row) for row in rows]
+
+    def get_song(self, id_: str) -> typing.Optional[models.Song]:
+        row = self.connection.execute('SELECT {0} FROM songs WHERE id = ?'.format(', '.join(SONG_COLUMNS)),
+                                      (id_,)).fetchone()
+        return self._make_song(row) if row else None
@@ -2,6 +2,8 @@ import typing
 
 
 class MusicFolder(object):
+    __slots__ = ('id', 'name')
+
     def __init__(self, _id: str, name: str):
         self.id = _id
         self.name = name
@@ -14,6 +16,8 @@ class MusicFolder(object):
 
 
 class Index(object):
+    __slots__ = ('name', 'artists')
+
     def __init__(self, name: str, artist: typing.List[MusicFolder]):
         self.name = name
         self.artists = artist
@@ -23,6 +27,9 @@ class Index(object):
 
 
 class Child(object):
+    __slots__ = ('id', 'is_dir', 'title', 'album', 'artist', 'track', 'genre', 'size', 'content_type', 'suffix',
+                 'duration', 'bit_rate', 'path', 'play_count', 'created', 'album_id', 'artist_id', 'type', '__weakref__')
+
     def __init__(self, id_: str, is_dir: bool, title: str, album: str, artist: str, track: int, genre: str, size: int,
                  content_type: str,
                  suffix: str,
@@ -57,15 +64,17 @@ class Child(object):
         return 'Child<id[{0}], title[{1}]>'.format(self.id, self.title)
 
     def __hash__(self):
-        return hash(self.id + self.title)
+        return hash((self.id, self.title))
 
     def __eq__(self, other):
         if isinstance(other, Child):
-            return self.__hash__() == other.__hash__()
-        return False
+            return self.id == other.id and self.title == other.title
+        return NotImplemented
 
 
 class IndexRoot(object):
+    __slots__ = ('last_modified', 'ignored_articles', 'indices', 'children')
+
     def __init__(self, last_modified: int, ignored_articles: str, index: typing.List[Index], child: typing.List[Child]):
         self.last_modified = last_modified
         self.ignored_articles = ignored_articles
@@ -77,10 +86,14 @@ class IndexRoot(object):
 
 
 class Song(Child):
+    __slots__ = ('album_artist', 'year', 'parent_path', 'variable_bit_rate', 'file_format', '_stream_url',
+                 '_url_signer')
+
     def __init__(self, id_: str, is_dir: bool, title: str, album: str, artist: str, track: int, genre: str, size: int,
                  content_type: str, suffix: str, duration: int, bit_rate: int, path: str, play_count: int, created: str,
                  album_id: str, artist_id: str, type_: str, album_artist: str = '', year: int = None,
-                 parent_path: str = '', variable_bit_rate: bool = None, file_format: str = '', stream_url: str = ''):
+                 parent_path: str = '', variable_bit_rate: bool = None, file_format: str = '', stream_url: str = '',
+                 url_signer: typing.Callable[[str], str] = None):
         super().__init__(id_, is_dir, title, album, artist, track, genre, size, content_type, suffix, duration,
                          bit_rate, path, play_count, created, album_id, artist_id, type_)
         self.album_artist = album_artist
@@ -88,12 +101,28 @@ class Song(Child):
         self.parent_path = parent_path
         self.variable_bit_rate = variable_bit_rate
         self.file_format = file_format
-        self.stream_url = stream_url
+        self._stream_url = stream_url
+        self._url_signer = url_signer
+
+    @property
+    def stream_url(self) -> str:
+        # signed on first access when the listing handed over a signer instead of a finished URL
+        if not self._stream_url and self._url_signer is not None:
+            self._stream_url = self._url_signer(self.id)
+        return self._stream_url
+
+    @stream_url.setter
+    def stream_url(self, value: str):
+        self._stream_url = value
 
 
 class Album(object):
+    __slots__ = ('id', 'name', 'cover_art', 'song_count', 'created', 'duration', 'artist', 'artist_id', 'year',
+                 'genre', '_songs', '_loader', '__weakref__')
+
     def __init__(self, id_: str, name: str, cover_art: str, song_count: int, created: str, duration: int, artist: str,
-                 artist_id: str, songs: typing.List[Song]):
+                 artist_id: str, songs: typing.Optional[typing.List[Song]],
+                 loader: typing.Callable[['Album'], None] = None, year: int = None, genre: str = None):
         self.id = id_
         self.name = name
         self.cover_art = cover_art
@@ -102,25 +131,68 @@ class Album(object):
         self.duration = duration
         self.artist = artist
         self.artist_id = artist_id
-        self.songs = songs
+        self.year = year
+        self.genre = genre
+        self._songs = songs
+        self._loader = loader
+
+    @property
+    def loaded(self) -> bool:
+        return self._songs is not None
+
+    @property
+    def songs(self) -> typing.List[Song]:
+        # None means the listing didn't include songs; the loader fetches them on first access. Without one (the
+        # async client) an empty list would read as an empty album, so that's an error instead.
+        if self._songs is None:
+            if self._loader is None:
+                raise ValueError('Songs of album {0} are not loaded, prefetch() it first'.format(self.id))
+            self._loader(self)
+        return self._songs
+
+    @songs.setter
+    def songs(self, value: typing.Optional[typing.List[Song]]):
+        self._songs = value
 
     def __repr__(self):
         return 'Album<id[{0}], name[{1}], artist[{2}]>'.format(self.id, self.name, self.artist)
 
 
 class Artist(object):
-    def __init__(self, id_: str, name: str, cover_art: str, album_count: int, albums: typing.List[Album]):
+    __slots__ = ('id', 'name', 'cover_art', 'album_count', '_albums', '_loader', '__weakref__')
+
+    def __init__(self, id_: str, name: str, cover_art: str, album_count: int,
+                 albums: typing.Optional[typing.List[Album]], loader: typing.Callable[['Artist'], None] = None):
         self.id = id_
         self.name = name
         self.cover_art = cover_art
         self.album_count = album_count
-        self.albums = albums
+        self._albums = albums
+        self._loader = loader
+
+    @property
+    def loaded(self) -> bool:
+        return self._albums is not None
+
+    @property
+    def albums(self) -> typing.List[Album]:
+        if self._albums is None:
+            if self._loader is None:
+                raise ValueError('Albums of artist {0} are not loaded, prefetch() it first'.format(self.id))
+            self._loader(self)
+        return self._albums
+
+    @albums.setter
+    def albums(self, value: typing.Optional[typing.List[Album]]):
+        self._albums = value
 
     def __repr__(self):
         return 'Artist<id[{0}], name[{1}], album_count[{2}]>'.format(self.id, self.name, self.album_count)
 
 
 class ArtistIndex(object):
+    __slots__ = ('name', 'artists')
+
     def __init__(self, name: str, artists: typing.List[Artist]):
         self.name = name
         self.artists = artists
@@ -130,6 +202,8 @@ class ArtistIndex(object):
 
 
 class Directory(object):
+    __slots__ = ('id', 'name', 'children')
+
     def __init__(self, id_: str, name: str, child: typing.List[Child]):
         self.id = id_
         self.name = name
@@ -140,6 +214,8 @@ class Directory(object):
 
 
 class ScanStatus(object):
+    __slots__ = ('scanning', 'count')
+
     def __init__(self, scanning: bool, count: int):
         self.scanning = scanning
         self.count = count
@@ -149,6 +225,8 @@ class ScanStatus(object):
 
 
 class Share(object):
+    __slots__ = ('id', 'url', 'username', 'created', 'expires', 'visit_count', 'entry')
+
     def __init__(self, id_: str, url: str, username: str, created: str, expires: str, visit_count: int,
                  entry: typing.List[Child]):
         self.id = id_
@@ -161,3 +239,39 @@ class Share(object):
 
     def __repr__(self):
         return 'Share<id[{0}], url[{1}], expires[{2}]>'.format(self.id, self.url, self.expires)
+
+
+class Playlist(object):
+    __slots__ = ('id', 'name', 'comment', 'owner', 'public', 'song_count', 'duration', 'created', 'changed',
+                 'cover_art', 'entries')
+
+    def __init__(self, id_: str, name: str, comment: str, owner: str, public: bool, song_count: int, duration: int,
+                 created: str, changed: str, cover_art: str, entries: typing.List[Child]):
+        self.id = id_
+        self.name = name
+        self.comment = comment
+        self.owner = owner
+        self.public = public
+        self.song_count = song_count
+        self.duration = duration
+        self.created = created
+        self.changed = changed
+        self.cover_art = cover_art
+        self.entries = entries
+
+    def __repr__(self):
+        return 'Playlist<id[{0}], name[{1}], song_count[{2}]>'.format(self.id, self.name, self.song_count)
+
+
+class SearchResult(object):
+    __slots__ = ('artists', 'albums', 'songs')
+
+    def __init__(self, artists: typing.List[Artist], albums: typing.List[typing.Union[Album, Child]],
+                 songs: typing.List[Child]):
+        self.artists = artists
+        self.albums = albums
+        self.songs = songs
+
+    def __repr__(self):
+        return 'SearchResult<len(Artist)={0} len(Album)={1} len(Song)={2}>'.format(len(self.artists),
+                                                                                  len(self.albums), len(self.songs))
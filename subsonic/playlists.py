@@ -0,0 +1,55 @@
+import collections
+import typing
+from urllib.parse import quote
+
+# Jetty, Tomcat and nginx reject request lines past 8KiB by default
+MAX_URL_LENGTH = 8000
+
+
+def playlist_diff(current: typing.Sequence[str], desired: typing.Sequence[str],
+                  ordered: bool = True) -> typing.Tuple[typing.List[int], typing.List[str]]:
+    # Returns (indexes to remove, ids to append). updatePlaylist can only remove by index and append, so with
+    # `ordered` the entries kept are the longest prefix of `desired` that appears in order in `current`; matching
+    # greedily finds it in one pass. Without `ordered` only the multiset of ids has to end up equal.
+    remove = []
+    if ordered:
+        kept = 0
+        for index, id_ in enumerate(current):
+            if kept < len(desired) and id_ == desired[kept]:
+                kept += 1
+            else:
+                remove.append(index)
+        return remove, list(desired[kept:])
+
+    wanted = collections.Counter(desired)
+    for index, id_ in enumerate(current):
+        if wanted[id_] > 0:
+            wanted[id_] -= 1
+        else:
+            remove.append(index)
+    add = []
+    for id_ in desired:
+        if wanted[id_] > 0:
+            wanted[id_] -= 1
+            add.append(id_)
+    return remove, add
+
+
+def chunk_values(key: str, values: typing.Sequence, budget: int) -> typing.List[list]:
+    # splits repeated `key=value` params so each chunk's encoded query fits in `budget` characters
+    chunks = []
+    chunk = []
+    used = 0
+    for value in values:
+        size = len(key) + 2 + len(quote(str(value), safe=''))
+        if size > budget:
+            raise ValueError('{0}={1} alone exceeds the URL length limit'.format(key, value))
+        if chunk and used + size > budget:
+            chunks.append(chunk)
+            chunk = []
+            used = 0
+        chunk.append(value)
+        used += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
@@ -0,0 +1,155 @@
+import re
+import threading
+import time
+import typing
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from instrumentation import Histogram
+
+logger = logging.getLogger(__name__)
+
+# State changing calls never go to a replica, nor do reads of state only the primary writes: the status of a scan
+# it runs and playlists, which sync_playlist diffs against and so must not read stale.
+PINNED_ENDPOINTS = frozenset(('createShare', 'updateShare', 'deleteShare', 'startScan', 'getScanStatus', 'scrobble',
+                              'star', 'unstar', 'setRating', 'getPlaylists', 'getPlaylist', 'createPlaylist',
+                              'updatePlaylist', 'deletePlaylist'))
+LATENCY_BUCKETS = tuple(0.001 * 1.25 ** i for i in range(42))
+_QUERY = re.compile(r'\?[^\s\'")]*')
+
+
+def _is_replica_failure(error: IOError) -> bool:
+    # connection errors, timeouts and 5xx are the replica's fault; a 4xx would get the same answer anywhere
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500
+
+
+def _strip_query(message: str) -> str:
+    # request URLs carry the auth token and salt
+    return _QUERY.sub('', message)
+
+
+class Replica(object):
+    __slots__ = ('location', 'ewma', 'latency', 'failures', 'down_until', 'requests')
+
+    def __init__(self, location: str, buckets: typing.Sequence[float] = LATENCY_BUCKETS):
+        self.location = location.rstrip('/')
+        self.ewma = None
+        self.latency = Histogram(buckets)
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+
+    def healthy(self, now: float = None) -> bool:
+        return self.down_until <= (time.monotonic() if now is None else now)
+
+    def __repr__(self):
+        return 'Replica<location[{0}], ewma[{1}], failures[{2}]>'.format(self.location, self.ewma, self.failures)
+
+
+class ReplicaRouter(object):
+    # Sends each read to the healthy replica with the lowest latency EWMA and fails over to the next one on connection
+    # errors, timeouts and 5xx; a failing replica sits out for `cooldown` seconds, doubling per consecutive failure.
+    # With `hedge`, a read still running after that replica's p95 is duplicated to the runner-up and the first answer
+    # wins.
+    def __init__(self, primary: str, replicas: typing.Sequence[str] = (), alpha: float = 0.3, hedge: bool = False,
+                 hedge_quantile: float = 0.95, min_hedge_samples: int = 20, cooldown: float = 5.0,
+                 max_cooldown: float = 300.0, workers: int = 8):
+        self.primary = Replica(primary)
+        self.replicas = [self.primary] + [Replica(location) for location in replicas
+                                          if location.rstrip('/') != self.primary.location]
+        self.alpha = alpha
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_samples = min_hedge_samples
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.hedged = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers) if hedge else None
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def ranked(self) -> typing.List[Replica]:
+        # unmeasured replicas sort first so every replica gets probed; replicas in cooldown are a last resort
+        now = time.monotonic()
+        with self._lock:
+            healthy = sorted((replica for replica in self.replicas if replica.healthy(now)),
+                             key=lambda replica: replica.ewma or 0.0)
+            down = sorted((replica for replica in self.replicas if not replica.healthy(now)),
+                          key=lambda replica: replica.down_until)
+        return healthy + down
+
+    def observe(self, replica: Replica, seconds: float, error: Exception = None) -> None:
+        with self._lock:
+            replica.requests += 1
+            if error is not None:
+                replica.failures += 1
+                replica.down_until = time.monotonic() + min(self.max_cooldown,
+                                                            self.cooldown * 2 ** (replica.failures - 1))
+                return
+            replica.failures = 0
+            replica.down_until = 0.0
+            replica.latency.observe(seconds)
+            replica.ewma = seconds if replica.ewma is None else self.alpha * seconds + (1 - self.alpha) * replica.ewma
+
+    def hedge_delay(self, replica: Replica) -> typing.Optional[float]:
+        if replica.latency.count < self.min_hedge_samples:
+            return None
+        return replica.latency.quantile(self.hedge_quantile)
+
+    def _timed(self, replica: Replica, send: typing.Callable[[str], typing.Any]):
+        started = time.perf_counter()
+        try:
+            result = send(replica.location)
+        except IOError as e:
+            if _is_replica_failure(e):
+                self.observe(replica, time.perf_counter() - started, e)
+                logger.warning("Request to {0} failed ({1})".format(replica.location, _strip_query(str(e))))
+            raise
+        self.observe(replica, time.perf_counter() - started)
+        return result
+
+    def call(self, send: typing.Callable[[str], typing.Any], pinned: bool = False, hedge: bool = True):
+        # `send` gets a server location; only connection errors, timeouts and 5xx count against a replica, anything
+        # else (a 4xx, a failed status) is the server's answer and is raised as is
+        if pinned:
+            return self._timed(self.primary, send)
+        candidates = self.ranked()
+        if hedge and self._executor is not None and len(candidates) > 1:
+            return self._hedged(candidates, send)
+        error = None
+        for replica in candidates:
+            try:
+                return self._timed(replica, send)
+            except IOError as e:
+                if not _is_replica_failure(e):
+                    raise
+                error = e
+        raise error
+
+    def _hedged(self, candidates: typing.List[Replica], send: typing.Callable[[str], typing.Any]):
+        candidates = list(candidates)
+        in_flight = {self._executor.submit(self._timed, candidates[0], send)}
+        delay = self.hedge_delay(candidates.pop(0))
+        error = None
+        while in_flight:
+            timeout = delay if candidates and delay is not None else None
+            done, in_flight = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except IOError as e:
+                    if not _is_replica_failure(e):
+                        raise
+                    error = e
+            if candidates and (not done or not in_flight):
+                # either the timer ran out or the only request failed, bring in the next replica
+                if not done:
+                    self.hedged += 1
+                replica = candidates.pop(0)
+                in_flight.add(self._executor.submit(self._timed, replica, send))
+                delay = self.hedge_delay(replica)
+        raise error
@@ -0,0 +1,119 @@
+import asyncio
+import inspect
+import time
+import typing
+import logging
+
+import models
+from mirror import LibraryMirror
+
+logger = logging.getLogger(__name__)
+
+
+class ScanPoller(object):
+    # Spaces getScanStatus polls so each one sees about `target_step` newly scanned files at the current rate.
+    # Polls that see no progress back off geometrically up to max_interval.
+    def __init__(self, min_interval: float = 0.25, max_interval: float = 10.0, target_step: int = 500,
+                 backoff: float = 2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_step = target_step
+        self.backoff = backoff
+        self.interval = min_interval
+        self._last = None
+
+    def observe(self, status: models.ScanStatus, now: float = None) -> float:
+        now = time.monotonic() if now is None else now
+        if self._last is not None:
+            last_count, last_time = self._last
+            grown = status.count - last_count
+            if grown > 0 and now > last_time:
+                rate = grown / (now - last_time)
+                self.interval = self.target_step / rate
+            else:
+                self.interval *= self.backoff
+            self.interval = min(self.max_interval, max(self.min_interval, self.interval))
+        self._last = (status.count, now)
+        return self.interval
+
+
+class ScanWatcher(object):
+    # Starts a scan, reports every status through the callbacks (or as an iterator) and, once the server reports
+    # the scan finished, runs an incremental LibraryMirror.sync gated on the getIndexes lastModified. The client
+    # may be a SubsonicClient or an AsyncSubsonicClient; async iteration also works with the blocking client.
+    def __init__(self, client, mirror: LibraryMirror = None, poller: ScanPoller = None, timeout: float = None,
+                 on_progress: typing.Callable[[models.ScanStatus], None] = None,
+                 on_complete: typing.Callable[[models.ScanStatus, bool], None] = None):
+        self.client = client
+        self.mirror = mirror
+        self.poller = poller if poller is not None else ScanPoller()
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.on_complete = on_complete
+
+    def _deadline(self) -> typing.Optional[float]:
+        return time.monotonic() + self.timeout if self.timeout is not None else None
+
+    def _check_deadline(self, deadline: typing.Optional[float]) -> None:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError('Scan still running after {0}s'.format(self.timeout))
+
+    def _report(self, status: models.ScanStatus) -> None:
+        if self.on_progress is not None:
+            self.on_progress(status)
+
+    def __iter__(self) -> typing.Iterator[models.ScanStatus]:
+        deadline = self._deadline()
+        status = self.client.start_scan()
+        while True:
+            yield status
+            if not status.scanning:
+                return
+            self._check_deadline(deadline)
+            time.sleep(self.poller.observe(status))
+            status = self.client.get_scan_status()
+
+    async def _call(self, method: str):
+        result = getattr(self.client, method)()
+        if inspect.isawaitable(result):
+            return await result
+        # a blocking client answered synchronously; that's fine for the status calls which are tiny
+        return result
+
+    async def __aiter__(self) -> typing.AsyncIterator[models.ScanStatus]:
+        deadline = self._deadline()
+        status = await self._call('start_scan')
+        while True:
+            yield status
+            if not status.scanning:
+                return
+            self._check_deadline(deadline)
+            await asyncio.sleep(self.poller.observe(status))
+            status = await self._call('get_scan_status')
+
+    def _refresh(self) -> bool:
+        cache = getattr(self.client, 'cache', None)
+        if cache is not None:
+            cache.invalidate()
+        return self.mirror.sync() if self.mirror is not None else False
+
+    def _finish(self, status: models.ScanStatus, changed: bool) -> models.ScanStatus:
+        logger.info("Scan finished with {0} files, library {1}".format(status.count,
+                                                                       'refreshed' if changed else 'unchanged'))
+        if self.on_complete is not None:
+            self.on_complete(status, changed)
+        return status
+
+    def run(self) -> models.ScanStatus:
+        status = None
+        for status in self:
+            self._report(status)
+        return self._finish(status, self._refresh())
+
+    async def run_async(self) -> models.ScanStatus:
+        status = None
+        async for status in self:
+            self._report(status)
+        # the mirror talks to the server through a blocking client, keep it off the event loop
+        changed = await asyncio.get_running_loop().run_in_executor(None, self._refresh)
+        return self._finish(status, changed)
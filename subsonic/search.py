@@ -0,0 +1,159 @@
+import bisect
+import heapq
+import re
+import typing
+import unicodedata
+
+import models
+
+FIELD_WEIGHTS = {'title': 3.0, 'artist': 2.0, 'album': 1.0}
+PREFIX_FACTOR = 0.8
+FUZZY_FACTOR = 0.5
+MIN_SIMILARITY = 0.3
+MAX_EXPANSIONS = 64
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> typing.List[str]:
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _WORD.findall(text.lower())
+
+
+def trigrams(token: str) -> typing.Set[str]:
+    padded = '  {0} '.format(token)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex(object):
+    # Inverted index over title/artist/album. Each query term matches whole tokens first, then token prefixes (so
+    # the last, half-typed word of an autocomplete query still hits), then trigram-similar tokens for typos.
+    # Every term must match for a song to be returned; scores add up across terms and fields.
+    def __init__(self, songs: typing.Iterable[models.Child] = None):
+        self.songs = {}
+        self._postings = {}
+        self._song_tokens = {}
+        self._trigrams = {}
+        self._gram_counts = {}
+        # kept sorted on every add/remove rather than re-sorted per query, so prefix lookups stay a bisect
+        self._sorted_tokens = []
+        if songs is not None:
+            self.extend(songs)
+
+    def __len__(self):
+        return len(self.songs)
+
+    def __contains__(self, id_: str):
+        return id_ in self.songs
+
+    def add(self, song: models.Child) -> None:
+        for token in self._add(song):
+            bisect.insort(self._sorted_tokens, token)
+
+    def _add(self, song: models.Child) -> typing.List[str]:
+        # returns the tokens new to the index, for the caller to file into _sorted_tokens
+        if song.id in self.songs:
+            self.remove(song.id)
+        new_tokens = []
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(getattr(song, field, None)):
+                weights[token] = weights.get(token, 0.0) + weight
+        self.songs[song.id] = song
+        self._song_tokens[song.id] = weights
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                grams = trigrams(token)
+                self._gram_counts[token] = len(grams)
+                for gram in grams:
+                    self._trigrams.setdefault(gram, set()).add(token)
+                new_tokens.append(token)
+            postings[song.id] = weight
+        return new_tokens
+
+    def extend(self, songs: typing.Iterable[models.Child]) -> None:
+        # one merge for the whole batch, inserting each new token would shift the list once per token
+        new_tokens = []
+        for song in songs:
+            if not getattr(song, 'is_dir', False):
+                new_tokens.extend(self._add(song))
+        if new_tokens:
+            # a song added twice in the batch may have dropped a token again, or brought it back a second time
+            self._sorted_tokens.extend(token for token in set(new_tokens) if token in self._postings)
+            self._sorted_tokens.sort()
+
+    def remove(self, id_: str) -> None:
+        self.songs.pop(id_, None)
+        for token in self._song_tokens.pop(id_, {}):
+            postings = self._postings[token]
+            del postings[id_]
+            if not postings:
+                del self._postings[token]
+                del self._gram_counts[token]
+                for gram in trigrams(token):
+                    tokens = self._trigrams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigrams[gram]
+                position = bisect.bisect_left(self._sorted_tokens, token)
+                # still missing while extend() is filing the batch's new tokens
+                if position < len(self._sorted_tokens) and self._sorted_tokens[position] == token:
+                    del self._sorted_tokens[position]
+
+    def _prefixed(self, prefix: str) -> typing.List[str]:
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        matches = []
+        for token in self._sorted_tokens[start:start + MAX_EXPANSIONS]:
+            if not token.startswith(prefix):
+                break
+            matches.append(token)
+        return matches
+
+    def _similar(self, term: str) -> typing.List[typing.Tuple[str, float]]:
+        grams = trigrams(term)
+        shared = {}
+        for gram in grams:
+            for token in self._trigrams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        similar = []
+        for token, count in shared.items():
+            # Jaccard similarity of the two trigram sets
+            similarity = count / (len(grams) + self._gram_counts[token] - count)
+            if similarity >= MIN_SIMILARITY:
+                similar.append((token, similarity))
+        return heapq.nlargest(MAX_EXPANSIONS, similar, key=lambda item: item[1])
+
+    def _term_scores(self, term: str) -> typing.Dict[str, float]:
+        scores = {}
+        expansions = [(token, 1.0 if token == term else PREFIX_FACTOR) for token in self._prefixed(term)]
+        if not expansions:
+            expansions = [(token, FUZZY_FACTOR * similarity) for token, similarity in self._similar(term)]
+        for token, factor in expansions:
+            for id_, weight in self._postings[token].items():
+                score = weight * factor
+                if score > scores.get(id_, 0.0):
+                    scores[id_] = score
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> typing.List[models.Child]:
+        return [song for _, song in self.search_scored(query, limit)]
+
+    def search_scored(self, query: str, limit: int = 10) -> typing.List[typing.Tuple[float, models.Child]]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # rarest terms first so the candidate set shrinks as fast as possible
+        term_scores = sorted((self._term_scores(term) for term in terms), key=len)
+        totals = term_scores[0]
+        for scores in term_scores[1:]:
+            totals = {id_: total + scores[id_] for id_, total in totals.items() if id_ in scores}
+            if not totals:
+                return []
+        # a partial sort: only `limit` of what can be every song in the index are ever ordered
+        ranked = heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1], self.songs[item[0]].title or ''))
+        return [(score, self.songs[id_]) for id_, score in ranked]
@@ -0,0 +1,82 @@
+import json
+import re
+import typing
+
+_VALUE_START = re.compile(r'\s*:\s*(\S)')
+_SEPARATORS = re.compile(r'[\s,]*')
+_COMPACT_AT = 1 << 16
+
+
+class ArrayNotFound(Exception):
+    def __init__(self, document: str):
+        super().__init__('array not found in response')
+        self.document = document
+
+
+def iter_array(chunks: typing.Iterable[str], key: str) -> typing.Iterator[dict]:
+    # Scans the text stream for the first `"key": [` and decodes the array elements one at a time, so at most one
+    # element (plus a chunk of lookahead) is ever held alongside the caller's own objects. The short header before
+    # the array is walked by hand to skip over string values; elements are handed to the C decoder via raw_decode.
+    chunks = iter(chunks)
+    decoder = json.JSONDecoder()
+    target = '"{0}"'.format(key)
+    buffer = ''
+    pos = 0
+    in_string = escaped = False
+    string_start = 0
+
+    while True:
+        if pos >= len(buffer):
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ArrayNotFound(buffer)
+            buffer += chunk
+            continue
+        char = buffer[pos]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+                if buffer[string_start:pos + 1] == target:
+                    match = _VALUE_START.match(buffer, pos + 1)
+                    while match is None:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            raise ArrayNotFound(buffer)
+                        buffer += chunk
+                        match = _VALUE_START.match(buffer, pos + 1)
+                    if match.group(1) == '[':
+                        pos = match.end()
+                        break
+        elif char == '"':
+            in_string = True
+            string_start = pos
+        pos += 1
+
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if pos >= len(buffer):
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError('response ended inside "{0}" array'.format(key))
+            buffer = chunk
+            pos = 0
+            continue
+        if buffer[pos] == ']':
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        if pos > _COMPACT_AT:
+            buffer = buffer[pos:]
+            pos = 0
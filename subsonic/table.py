@@ -0,0 +1,273 @@
+import typing
+from array import array
+
+import models
+
+NULL = -(1 << 63)
+
+# Low-cardinality strings are stored once per table and referenced by code, high-cardinality ones stay in lists.
+INTERNED_COLUMNS = ('album', 'artist', 'genre', 'content_type', 'suffix', 'album_id', 'artist_id', 'type',
+                    'album_artist', 'file_format', 'parent_path')
+TEXT_COLUMNS = ('id', 'title', 'path', 'created', 'stream_url')
+INT_COLUMNS = ('track', 'size', 'duration', 'bit_rate', 'play_count', 'year')
+BOOL_COLUMNS = ('is_dir', 'variable_bit_rate')
+COLUMNS = TEXT_COLUMNS + INTERNED_COLUMNS + INT_COLUMNS + BOOL_COLUMNS
+
+
+class _InternedColumn(object):
+    __slots__ = ('values', 'lookup', 'codes')
+
+    def __init__(self, values: list = None, lookup: dict = None, codes: array = None):
+        self.values = values if values is not None else []
+        self.lookup = lookup if lookup is not None else {}
+        self.codes = codes if codes is not None else array('I')
+
+    def code(self, value) -> int:
+        code = self.lookup.get(value)
+        if code is None:
+            code = self.lookup[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value) -> None:
+        self.codes.append(self.code(value))
+
+    def __getitem__(self, index: int):
+        return self.values[self.codes[index]]
+
+    def take(self, indices: typing.Sequence[int]) -> '_InternedColumn':
+        # the dictionary is shared; it only ever grows, so existing codes stay valid for both tables
+        codes = self.codes
+        return _InternedColumn(self.values, self.lookup, array('I', [codes[i] for i in indices]))
+
+    def sort_keys(self) -> list:
+        ranks = [0] * len(self.values)
+        for rank, code in enumerate(sorted(range(len(self.values)), key=lambda c: _sort_key(self.values[c]))):
+            ranks[code] = rank
+        return [ranks[code] for code in self.codes]
+
+
+class _IntColumn(object):
+    __slots__ = ('data',)
+
+    def __init__(self, typecode: str, data: array = None):
+        self.data = data if data is not None else array(typecode)
+
+    def append(self, value) -> None:
+        self.data.append(NULL if value is None else int(value))
+
+    def __getitem__(self, index: int):
+        value = self.data[index]
+        return None if value == NULL else value
+
+    def take(self, indices: typing.Sequence[int]) -> '_IntColumn':
+        data = self.data
+        return _IntColumn(data.typecode, array(data.typecode, [data[i] for i in indices]))
+
+    def sort_keys(self) -> array:
+        return self.data
+
+
+class _BoolColumn(_IntColumn):
+    __slots__ = ()
+    NULL_FLAG = -1
+
+    def append(self, value) -> None:
+        self.data.append(self.NULL_FLAG if value is None else int(bool(value)))
+
+    def __getitem__(self, index: int):
+        value = self.data[index]
+        return None if value == self.NULL_FLAG else bool(value)
+
+    def take(self, indices: typing.Sequence[int]) -> '_BoolColumn':
+        data = self.data
+        return _BoolColumn(data.typecode, array(data.typecode, [data[i] for i in indices]))
+
+
+class _TextColumn(object):
+    __slots__ = ('data',)
+
+    def __init__(self, data: list = None):
+        self.data = data if data is not None else []
+
+    def append(self, value) -> None:
+        self.data.append(value)
+
+    def __getitem__(self, index: int):
+        return self.data[index]
+
+    def take(self, indices: typing.Sequence[int]) -> '_TextColumn':
+        data = self.data
+        return _TextColumn([data[i] for i in indices])
+
+    def sort_keys(self) -> list:
+        return [_sort_key(value) for value in self.data]
+
+
+def _sort_key(value):
+    # None sorts first without comparing against strings
+    return (value is not None, value if value is not None else '')
+
+
+def _new_column(name: str):
+    if name in INTERNED_COLUMNS:
+        return _InternedColumn()
+    if name in INT_COLUMNS:
+        return _IntColumn('q')
+    if name in BOOL_COLUMNS:
+        return _BoolColumn('b')
+    return _TextColumn()
+
+
+class SongRow(object):
+    # A view onto one row of a SongTable; reads go straight to the columns, nothing is copied.
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: 'SongTable', index: int):
+        self._table = table
+        self._index = index
+
+    def __getattr__(self, name: str):
+        try:
+            column = self._table.columns[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        return column[self._index]
+
+    @property
+    def stream_url(self) -> str:
+        url = self._table.columns['stream_url'][self._index]
+        if not url and self._table.url_signer is not None:
+            return self._table.url_signer(self.id)
+        return url
+
+    def to_song(self) -> models.Song:
+        return models.Song(self.id, self.is_dir, self.title, self.album, self.artist, self.track, self.genre,
+                           self.size, self.content_type, self.suffix, self.duration, self.bit_rate, self.path,
+                           self.play_count, self.created, self.album_id, self.artist_id, self.type,
+                           album_artist=self.album_artist, year=self.year, parent_path=self.parent_path,
+                           variable_bit_rate=self.variable_bit_rate, file_format=self.file_format,
+                           stream_url=self.stream_url)
+
+    def __repr__(self):
+        return 'Child<id[{0}], title[{1}]>'.format(self.id, self.title)
+
+    def __hash__(self):
+        return hash((self.id, self.title))
+
+    def __eq__(self, other):
+        if isinstance(other, (SongRow, models.Child)):
+            return self.id == other.id and self.title == other.title
+        return NotImplemented
+
+
+class SongTable(object):
+    def __init__(self, songs: typing.Iterable[models.Child] = None, unique: bool = False,
+                 url_signer: typing.Callable[[str], str] = None):
+        self.columns = {name: _new_column(name) for name in COLUMNS}
+        self._ids = set() if unique else None
+        self.url_signer = url_signer
+        if songs is not None:
+            self.extend(songs)
+
+    @classmethod
+    def _from_columns(cls, columns: dict, url_signer: typing.Callable[[str], str] = None) -> 'SongTable':
+        table = cls.__new__(cls)
+        table.columns = columns
+        table._ids = None
+        table.url_signer = url_signer
+        return table
+
+    def append(self, song: models.Child) -> None:
+        if self._ids is not None:
+            if song.id in self._ids:
+                return
+            self._ids.add(song.id)
+        for name, column in self.columns.items():
+            if name == 'stream_url':
+                # keep lazily signed URLs lazy: store what was set explicitly and sign rows on access
+                column.append(getattr(song, '_stream_url', None))
+                if self.url_signer is None:
+                    self.url_signer = getattr(song, '_url_signer', None)
+            else:
+                column.append(getattr(song, name, None))
+
+    def extend(self, songs: typing.Iterable[models.Child]) -> None:
+        for song in songs:
+            self.append(song)
+
+    def __len__(self):
+        return len(self.columns['id'].data)
+
+    def __getitem__(self, index: int) -> SongRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return SongRow(self, index)
+
+    def __iter__(self) -> typing.Iterator[SongRow]:
+        for index in range(len(self)):
+            yield SongRow(self, index)
+
+    def column(self, name: str) -> list:
+        column = self.columns[name]
+        return [column[index] for index in range(len(self))]
+
+    def take(self, indices: typing.Sequence[int]) -> 'SongTable':
+        return self._from_columns({name: column.take(indices) for name, column in self.columns.items()},
+                                  self.url_signer)
+
+    def _matching(self, name: str, value) -> typing.List[int]:
+        column = self.columns[name]
+        if isinstance(column, _InternedColumn):
+            code = column.lookup.get(value)
+            if code is None:
+                return []
+            return [index for index, row_code in enumerate(column.codes) if row_code == code]
+        if isinstance(column, _IntColumn):
+            if value is None:
+                target = column.NULL_FLAG if isinstance(column, _BoolColumn) else NULL
+            else:
+                target = int(value)
+            return [index for index, row_value in enumerate(column.data) if row_value == target]
+        return [index for index, row_value in enumerate(column.data) if row_value == value]
+
+    def filter(self, predicate: typing.Callable[[SongRow], bool] = None, **equals) -> 'SongTable':
+        # keyword filters compare whole columns (codes for interned columns); the predicate sees row views
+        indices = None
+        for name, value in equals.items():
+            matching = self._matching(name, value)
+            if indices is not None:
+                matching = set(matching)
+                matching = [index for index in indices if index in matching]
+            indices = matching
+        if indices is None:
+            indices = range(len(self))
+        if predicate is not None:
+            indices = [index for index in indices if predicate(SongRow(self, index))]
+        return self.take(indices)
+
+    def argsort(self, *names: str, reverse: bool = False) -> typing.List[int]:
+        indices = list(range(len(self)))
+        for name in reversed(names):
+            keys = self.columns[name].sort_keys()
+            indices.sort(key=keys.__getitem__, reverse=reverse)
+        return indices
+
+    def sort(self, *names: str, reverse: bool = False) -> 'SongTable':
+        return self.take(self.argsort(*names, reverse=reverse))
+
+    def group_by(self, name: str) -> typing.Dict[typing.Any, 'SongTable']:
+        column = self.columns[name]
+        groups = {}
+        if isinstance(column, _InternedColumn):
+            for index, code in enumerate(column.codes):
+                groups.setdefault(code, []).append(index)
+            return {column.values[code]: self.take(indices) for code, indices in groups.items()}
+        for index in range(len(self)):
+            groups.setdefault(column[index], []).append(index)
+        return {value: self.take(indices) for value, indices in groups.items()}
+
+    def __repr__(self):
+        return 'SongTable<len(Song)={0}>'.format(len(self))
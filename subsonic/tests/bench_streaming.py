@@ -0,0 +1,68 @@
+# Peak memory of decoding one large getMusicDirectory response whole versus streaming it:
+#     python tests/bench_streaming.py
+import codecs
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# the client modules import each other by bare name, as they do when run from the package directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import streaming  # noqa: E402
+from api import BaseSubsonicClient  # noqa: E402
+
+ENTRIES = 100000
+CHUNK_SIZE = 64 * 1024
+
+
+def synthetic_directory(entries: int) -> bytes:
+    children = [{'id': str(i), 'parent': '1', 'isDir': False, 'title': 'Track {0}'.format(i),
+                 'album': 'Album {0}'.format(i // 12), 'artist': 'Artist {0}'.format(i // 120), 'track': i % 12 + 1,
+                 'genre': 'Rock', 'size': 8000000 + i, 'contentType': 'audio/mpeg', 'suffix': 'mp3', 'duration': 240,
+                 'bitRate': 320, 'path': 'Artist {0}/Album {1}/{2}.mp3'.format(i // 120, i // 12, i),
+                 'playCount': i % 7, 'created': '2017-09-01T00:00:00.000Z', 'albumId': str(i // 12),
+                 'artistId': str(i // 120), 'type': 'music'} for i in range(entries)]
+    return json.dumps({'subsonic-response': {'status': 'ok', 'version': '1.16.0',
+                                             'directory': {'id': '1', 'name': 'All', 'child': children}}}).encode()
+
+
+def chunked(body: bytes):
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+
+def full_decode(client: BaseSubsonicClient, body: bytes) -> int:
+    # what _request_get does: join the body, decode it whole, then copy into models
+    result = client._check_response(json.loads(b''.join(chunked(body)).decode()))
+    return len(client._parse_directory(result['directory']).children)
+
+
+def streaming_decode(client: BaseSubsonicClient, body: bytes) -> int:
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    count = 0
+    for child in streaming.iter_array((decoder.decode(chunk) for chunk in chunked(body)), 'child'):
+        client._make_child(child)
+        count += 1
+    return count
+
+
+def measure(name: str, func, client: BaseSubsonicClient, body: bytes) -> None:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(client, body)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{0:<10} entries={1} peak={2:.1f}MiB time={3:.2f}s'.format(name, count, peak / 2 ** 20, elapsed))
+
+
+if __name__ == '__main__':
+    client = BaseSubsonicClient('bench', 'bench', 'http://127.0.0.1')
+    body = synthetic_directory(ENTRIES)
+    print('response body {0:.1f}MiB'.format(len(body) / 2 ** 20))
+    measure('full', full_decode, client, body)
+    measure('streaming', streaming_decode, client, body)
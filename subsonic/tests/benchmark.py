@@ -0,0 +1,133 @@
+# Time, requests and peak memory of the bulk client methods against a local fake server:
+#     python tests/benchmark.py [--only get_all_songs] [--artists 200]
+import argparse
+import multiprocessing
+import os
+import queue
+import resource
+import sys
+import tempfile
+import time
+import typing
+
+# the client modules import each other by bare name, as they do when run from the package directory; spawned
+# benchmark processes re-run this on import too
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_server import FakeLibrary, FakeSubsonicServer  # noqa: E402
+
+USERNAME = PASSWORD = 'admin'
+
+
+def _consume(result) -> int:
+    if isinstance(result, (set, list)) or hasattr(result, '__len__'):
+        return len(result)
+    return sum(1 for _ in result)
+
+
+def _bench_get_all_songs(client, options):
+    return client.get_all_songs()
+
+
+def _bench_get_all_songs_parallel(client, options):
+    return client.get_all_songs(workers=options.workers)
+
+
+def _bench_get_all_songs_table(client, options):
+    return client.get_all_songs(workers=options.workers, as_table=True)
+
+
+def _bench_get_all_songs_fast(client, options):
+    return list(client.get_all_songs_fast(sessions=options.sessions))
+
+
+def _bench_get_all_songs_fast_table(client, options):
+    return client.get_all_songs_fast(as_table=True, sessions=options.sessions)
+
+
+def _bench_iter_album_list(client, options):
+    return list(client.iter_album_list('alphabeticalByName', read_ahead=options.workers, workers=options.workers))
+
+
+def _bench_mirror_sync(client, options):
+    import mirror
+    with tempfile.TemporaryDirectory() as directory:
+        with mirror.LibraryMirror(client, os.path.join(directory, 'library.db'), workers=options.workers) as library:
+            library.sync(full=True)
+            return library.get_songs()
+
+
+BENCHMARKS = {
+    'get_all_songs': _bench_get_all_songs,
+    'get_all_songs[workers]': _bench_get_all_songs_parallel,
+    'get_all_songs[table]': _bench_get_all_songs_table,
+    'get_all_songs_fast': _bench_get_all_songs_fast,
+    'get_all_songs_fast[table]': _bench_get_all_songs_fast_table,
+    'iter_album_list': _bench_iter_album_list,
+    'LibraryMirror.sync': _bench_mirror_sync,
+}
+
+
+def _run(name: str, url: str, options, results: multiprocessing.Queue) -> None:
+    # Runs in a fresh spawned process so peak RSS belongs to this benchmark alone.
+    import logging
+    import io
+    import contextlib
+    from api import SubsonicClient
+
+    logging.disable(logging.CRITICAL)
+    client = SubsonicClient(USERNAME, PASSWORD, url)
+    blocks_before = sys.getallocatedblocks()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = BENCHMARKS[name](client, options)
+        count = _consume(result)
+    elapsed = time.perf_counter() - start
+    blocks = sys.getallocatedblocks() - blocks_before
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put({'count': count, 'seconds': elapsed, 'peak_rss_kib': peak_rss, 'live_blocks': blocks})
+
+
+def run_benchmarks(options) -> typing.List[dict]:
+    library = FakeLibrary(options.artists, options.albums, options.songs, options.depth)
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    with FakeSubsonicServer(library, latency=options.latency, username=USERNAME, password=PASSWORD) as server:
+        for name in options.only or BENCHMARKS:
+            server.reset_stats()
+            results = context.Queue()
+            process = context.Process(target=_run, args=(name, server.url, options, results))
+            process.start()
+            row = None
+            while row is None:
+                try:
+                    row = results.get(timeout=1)
+                except queue.Empty:
+                    # a child that crashed never puts its result, one that exited normally has flushed it already
+                    if not process.is_alive() and results.empty():
+                        raise ValueError('Benchmark {0} exited with code {1}'.format(name, process.exitcode))
+            process.join()
+            # the ping issued by the client constructor is not part of the measured call
+            row.update(name=name, requests=server.requests - 1, bytes=server.bytes_sent)
+            rows.append(row)
+            print('{name:<26} {count:>8} items {seconds:>8.2f}s {requests:>7} req {mib:>8.1f}MiB '
+                  '{rss:>8.1f}MiB rss {live_blocks:>9} blocks'.format(mib=row['bytes'] / 2 ** 20,
+                                                                      rss=row['peak_rss_kib'] / 1024, **row))
+    return rows
+
+
+def parse_args(argv: typing.List[str] = None):
+    parser = argparse.ArgumentParser(description='Benchmark bulk client methods against a local fake server')
+    parser.add_argument('--artists', type=int, default=50)
+    parser.add_argument('--albums', type=int, default=4, help='albums per artist')
+    parser.add_argument('--songs', type=int, default=12, help='songs per album')
+    parser.add_argument('--depth', type=int, default=0, help='extra directory levels above each album')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS))
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    run_benchmarks(parse_args())
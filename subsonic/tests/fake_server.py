@@ -0,0 +1,516 @@
+import hashlib
+import html
+import json
+import re
+import threading
+import time
+import typing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+DB_VIEW_COLUMNS = {'id': 'id', 'title': 'title', 'album': 'album', 'artist': 'artist', 'track_number': 'track',
+                   'genre': 'genre', 'file_size': 'size', 'duration_seconds': 'duration', 'bit_rate': 'bitRate',
+                   'path': 'path', 'play_count': 'playCount', 'created': 'created', 'format': 'suffix',
+                   'album_artist': 'artist', 'year': 'year', 'parent_path': 'parent', 'variable_bit_rate': 'vbr'}
+# params these endpoints accept more than once reach their handlers as lists
+MULTI_VALUED = {'scrobble': ('id', 'time'), 'star': ('id', 'albumId', 'artistId'),
+                'unstar': ('id', 'albumId', 'artistId'), 'createPlaylist': ('songId',),
+                'updatePlaylist': ('songIdToAdd', 'songIndexToRemove')}
+_DB_QUERY = re.compile(r"select (.+) from media_file where type = 'MUSIC' and id > (-?\d+)(?: and id <= (\d+))? "
+                       r"limit (\d+);")
+
+
+class FakeLibrary(object):
+    # A generated library: `artists` x `albums_per_artist` x `songs_per_album`, with `depth` extra directory levels
+    # between each artist folder and its album folders.
+    def __init__(self, artists: int = 10, albums_per_artist: int = 3, songs_per_album: int = 10, depth: int = 0,
+                 song_size: int = 4000000):
+        self.last_modified = 1
+        self.folders = [{'id': 1, 'name': 'Music'}]
+        self.artists = {}
+        self.albums = {}
+        self.songs = {}
+        self.directories = {}
+        self.starred = set()
+        self.ratings = {}
+        self.scrobbles = []
+        self.playlists = {}
+        song_id = 0
+        for artist_number in range(artists):
+            artist_id = 'ar-{0}'.format(artist_number)
+            artist_name = 'Artist {0}'.format(artist_number)
+            self.artists[artist_id] = {'id': artist_id, 'name': artist_name, 'coverArt': artist_id, 'albums': []}
+            parent = self._directory(artist_id, artist_name)
+            for level in range(depth):
+                nested = self._directory('{0}-d{1}'.format(artist_id, level), 'Disc set {0}'.format(level))
+                self._add_child(parent, {'id': nested['id'], 'isDir': True, 'title': nested['name']})
+                parent = nested
+            for album_number in range(albums_per_artist):
+                album_id = 'al-{0}-{1}'.format(artist_number, album_number)
+                album_name = 'Album {0}'.format(album_number)
+                album = {'id': album_id, 'name': album_name, 'coverArt': album_id, 'songCount': songs_per_album,
+                         'created': '2017-09-01T00:00:00.000Z', 'duration': 240 * songs_per_album,
+                         'artist': artist_name, 'artistId': artist_id, 'year': 2000 + album_number % 20,
+                         'genre': 'Genre {0}'.format(artist_number % 7), 'song': []}
+                self.albums[album_id] = album
+                self.artists[artist_id]['albums'].append(album_id)
+                self._add_child(parent, {'id': album_id, 'isDir': True, 'title': album_name, 'artist': artist_name,
+                                         'coverArt': album_id})
+                album_directory = self._directory(album_id, album_name)
+                for track in range(1, songs_per_album + 1):
+                    song_id += 1
+                    path = '{0}/{1}/{2:02d} Track {3}.mp3'.format(artist_name, album_name, track, song_id)
+                    song = {'id': str(song_id), 'parent': album_id, 'isDir': False,
+                            'title': 'Track {0}'.format(song_id), 'album': album_name, 'artist': artist_name,
+                            'track': track, 'year': album['year'], 'genre': album['genre'], 'coverArt': album_id,
+                            'size': song_size + song_id, 'contentType': 'audio/mpeg', 'suffix': 'mp3',
+                            'duration': 240, 'bitRate': 320, 'path': path, 'playCount': song_id % 5,
+                            'created': '2017-09-01T00:00:00.000Z', 'albumId': album_id, 'artistId': artist_id,
+                            'type': 'music', 'vbr': False}
+                    self.songs[song['id']] = song
+                    album['song'].append(song)
+                    self._add_child(album_directory, song)
+
+    def _directory(self, id_: str, name: str) -> dict:
+        directory = self.directories[id_] = {'id': id_, 'name': name, 'child': []}
+        return directory
+
+    @staticmethod
+    def _add_child(directory: dict, child: dict) -> None:
+        directory['child'].append(child)
+
+    def touch(self) -> None:
+        self.last_modified += 1
+
+
+class SubsonicError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeSubsonicServer(object):
+    API_VERSION = '1.16.0'
+
+    def __init__(self, library: FakeLibrary = None, latency: float = 0.0, username: str = 'admin',
+                 password: str = 'admin', scan_seconds: float = 0.0):
+        self.library = library if library is not None else FakeLibrary()
+        self.latency = latency
+        self.scan_seconds = scan_seconds
+        # answer every GET with a 503, as a node that is up but out of service would
+        self.unavailable = False
+        self.max_url_length = 8192
+        self._scan_started = None
+        self.username = username
+        self.password = password
+        self._lock = threading.Lock()
+        self.reset_stats()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{0}'.format(self._server.server_address[1])
+
+    def start(self) -> 'FakeSubsonicServer':
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.endpoints = {}
+
+    def record(self, endpoint: str, size: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+            self.endpoints[endpoint] = self.endpoints.get(endpoint, 0) + 1
+
+    def authenticate(self, params: dict) -> None:
+        if params.get('u') != self.username:
+            raise SubsonicError(40, 'Wrong username or password')
+        if 't' in params:
+            expected = hashlib.md5((self.password + params.get('s', '')).encode()).hexdigest()
+            if params['t'] != expected:
+                raise SubsonicError(40, 'Wrong username or password')
+        elif params.get('p') != self.password:
+            raise SubsonicError(40, 'Wrong username or password')
+
+    def rest(self, endpoint: str, params: dict, headers: dict = None) -> typing.Union[dict, tuple]:
+        media = getattr(self, 'media_{0}'.format(endpoint), None)
+        if media is not None:
+            return media(params, headers or {})
+        handler = getattr(self, 'rest_{0}'.format(endpoint), None)
+        if handler is None:
+            raise SubsonicError(0, 'Unknown endpoint {0}'.format(endpoint))
+        return handler(params)
+
+    @staticmethod
+    def song_bytes(song: dict) -> bytes:
+        pattern = '{0}:'.format(song['id']).encode()
+        return (pattern * (song['size'] // len(pattern) + 1))[:song['size']]
+
+    @staticmethod
+    def _ranged(body: bytes, content_type: str, headers: dict) -> tuple:
+        match = re.match(r'bytes=(\d+)-(\d*)$', headers.get('Range') or '')
+        if match is None:
+            return 200, body, content_type, {'Accept-Ranges': 'bytes'}
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(body) - 1
+        if start >= len(body):
+            return 416, b'', content_type, {'Content-Range': 'bytes */{0}'.format(len(body))}
+        return 206, body[start:end + 1], content_type, {
+            'Content-Range': 'bytes {0}-{1}/{2}'.format(start, end, len(body)), 'Accept-Ranges': 'bytes'}
+
+    def media_download(self, params: dict, headers: dict) -> tuple:
+        song = self._lookup(self.library.songs, params.get('id'))
+        return self._ranged(self.song_bytes(song), song['contentType'], headers)
+
+    def media_getCoverArt(self, params: dict, headers: dict) -> tuple:
+        # every album of an artist shares one image, so identical bytes show up under many cover ids
+        cover_id = params.get('id', '')
+        if cover_id not in self.library.albums and cover_id not in self.library.artists:
+            raise SubsonicError(70, 'Cover art not found')
+        image = '{0}:{1}'.format(cover_id.rsplit('-', 1)[0] if cover_id.startswith('al-') else cover_id,
+                                 params.get('size', 'full')).encode()
+        return 200, b'\x89PNG\r\n\x1a\n' + image * 512, 'image/png', {}
+
+    def media_stream(self, params: dict, headers: dict) -> tuple:
+        return self.media_download(params, headers)
+
+    def _lookup(self, collection: dict, id_: str) -> dict:
+        if id_ not in collection:
+            raise SubsonicError(70, 'Requested data was not found')
+        return collection[id_]
+
+    @staticmethod
+    def _without(item: dict, *keys: str) -> dict:
+        return {key: value for key, value in item.items() if key not in keys}
+
+    def rest_ping(self, params: dict) -> dict:
+        return {}
+
+    def rest_getMusicFolders(self, params: dict) -> dict:
+        return {'musicFolders': {'musicFolder': self.library.folders}}
+
+    def rest_getIndexes(self, params: dict) -> dict:
+        last_modified = self.library.last_modified
+        indexes = {'lastModified': last_modified, 'ignoredArticles': 'The El La Los Las Le Les'}
+        if int(params.get('ifModifiedSince', 0)) < last_modified:
+            indexes['index'] = [{'name': 'A', 'artist': [{'id': artist['id'], 'name': artist['name']}
+                                                         for artist in self.library.artists.values()]}]
+        return {'indexes': indexes}
+
+    def rest_getMusicDirectory(self, params: dict) -> dict:
+        return {'directory': self._lookup(self.library.directories, params.get('id'))}
+
+    def rest_getArtists(self, params: dict) -> dict:
+        return {'artists': {'ignoredArticles': '', 'index': [
+            {'name': 'A', 'artist': [{'id': artist['id'], 'name': artist['name'], 'coverArt': artist['coverArt'],
+                                      'albumCount': len(artist['albums'])}
+                                     for artist in self.library.artists.values()]}]}}
+
+    def rest_getArtist(self, params: dict) -> dict:
+        artist = self._lookup(self.library.artists, params.get('id'))
+        return {'artist': {'id': artist['id'], 'name': artist['name'], 'coverArt': artist['coverArt'],
+                           'albumCount': len(artist['albums']),
+                           'album': [self._without(self.library.albums[album_id], 'song')
+                                     for album_id in artist['albums']]}}
+
+    def rest_getAlbum(self, params: dict) -> dict:
+        return {'album': self._lookup(self.library.albums, params.get('id'))}
+
+    def rest_getAlbumList(self, params: dict) -> dict:
+        offset = int(params.get('offset', 0))
+        size = min(500, int(params.get('size', 10)))
+        albums = list(self.library.albums.values())
+        if params.get('type') == 'alphabeticalByName':
+            albums.sort(key=lambda album: album['name'])
+        return {'albumList': {'album': [dict(self._without(album, 'song', 'name'), title=album['name'],
+                                             isDir=True) for album in albums[offset:offset + size]]}}
+
+    def rest_getAlbumList2(self, params: dict) -> dict:
+        offset = int(params.get('offset', 0))
+        size = min(500, int(params.get('size', 10)))
+        albums = list(self.library.albums.values())
+        if params.get('type') == 'alphabeticalByName':
+            albums.sort(key=lambda album: album['name'])
+        return {'albumList2': {'album': [self._without(album, 'song') for album in albums[offset:offset + size]]}}
+
+    def _search(self, params: dict) -> typing.Tuple[list, list, list]:
+        query = params.get('query', '').strip('"').lower()
+
+        def page(items, kind):
+            offset = int(params.get('{0}Offset'.format(kind), 0))
+            return items[offset:offset + int(params.get('{0}Count'.format(kind), 20))]
+
+        artists = [artist for artist in self.library.artists.values() if query in artist['name'].lower()]
+        albums = [album for album in self.library.albums.values() if query in album['name'].lower()]
+        songs = [song for song in self.library.songs.values() if query in song['title'].lower()]
+        return page(artists, 'artist'), page(albums, 'album'), page(songs, 'song')
+
+    def rest_search2(self, params: dict) -> dict:
+        artists, albums, songs = self._search(params)
+        return {'searchResult2': {'artist': [{'id': artist['id'], 'name': artist['name']} for artist in artists],
+                                  'album': [{'id': album['id'], 'isDir': True, 'title': album['name'],
+                                             'artist': album['artist']} for album in albums],
+                                  'song': songs}}
+
+    def rest_search3(self, params: dict) -> dict:
+        artists, albums, songs = self._search(params)
+        return {'searchResult3': {'artist': [{'id': artist['id'], 'name': artist['name'],
+                                              'albumCount': len(artist['albums'])} for artist in artists],
+                                  'album': [self._without(album, 'song') for album in albums],
+                                  'song': songs}}
+
+    def _require(self, id_: str) -> None:
+        if id_ not in self.library.songs and id_ not in self.library.albums and id_ not in self.library.artists:
+            raise SubsonicError(70, 'Not found: {0}'.format(id_))
+
+    def rest_scrobble(self, params: dict) -> dict:
+        ids = params.get('id', [])
+        times = params.get('time', [None] * len(ids))
+        if not ids or len(times) != len(ids):
+            raise SubsonicError(10, 'Required parameter is missing')
+        for id_ in ids:
+            self._require(id_)
+        submission = params.get('submission', 'true') == 'true'
+        with self._lock:
+            self.library.scrobbles.extend((id_, int(time_) if time_ else None, submission)
+                                          for id_, time_ in zip(ids, times))
+        return {}
+
+    def _star(self, params: dict, starred: bool) -> dict:
+        items = [(kind, id_) for kind in ('id', 'albumId', 'artistId') for id_ in params.get(kind, [])]
+        if not items:
+            raise SubsonicError(10, 'Required parameter is missing')
+        for _, id_ in items:
+            self._require(id_)
+        with self._lock:
+            if starred:
+                self.library.starred.update(items)
+            else:
+                self.library.starred.difference_update(items)
+        return {}
+
+    def rest_star(self, params: dict) -> dict:
+        return self._star(params, True)
+
+    def rest_unstar(self, params: dict) -> dict:
+        return self._star(params, False)
+
+    def rest_setRating(self, params: dict) -> dict:
+        self._require(params.get('id'))
+        rating = int(params.get('rating', -1))
+        if not 0 <= rating <= 5:
+            raise SubsonicError(10, 'Rating must be between 0 and 5')
+        with self._lock:
+            if rating:
+                self.library.ratings[params['id']] = rating
+            else:
+                self.library.ratings.pop(params['id'], None)
+        return {}
+
+    def _playlist(self, playlist: dict, entries: bool = True) -> dict:
+        songs = [self.library.songs[id_] for id_ in playlist['entry']]
+        result = {key: value for key, value in playlist.items() if key != 'entry'}
+        result.update({'songCount': len(songs), 'duration': sum(song['duration'] for song in songs)})
+        if entries:
+            result['entry'] = songs
+        return result
+
+    def rest_getPlaylists(self, params: dict) -> dict:
+        with self._lock:
+            return {'playlists': {'playlist': [self._playlist(playlist, entries=False)
+                                               for playlist in self.library.playlists.values()]}}
+
+    def rest_getPlaylist(self, params: dict) -> dict:
+        with self._lock:
+            return {'playlist': self._playlist(self._lookup(self.library.playlists, params.get('id')))}
+
+    def rest_createPlaylist(self, params: dict) -> dict:
+        song_ids = params.get('songId', [])
+        for id_ in song_ids:
+            self._lookup(self.library.songs, id_)
+        with self._lock:
+            if 'playlistId' in params:
+                playlist = self._lookup(self.library.playlists, params['playlistId'])
+            else:
+                id_ = str(len(self.library.playlists) + 1)
+                playlist = self.library.playlists[id_] = {
+                    'id': id_, 'name': params.get('name', ''), 'comment': '', 'owner': self.username,
+                    'public': False, 'created': '2017-09-01T00:00:00.000Z', 'changed': '2017-09-01T00:00:00.000Z'}
+            playlist['entry'] = list(song_ids)
+            return {'playlist': self._playlist(playlist)}
+
+    def rest_updatePlaylist(self, params: dict) -> dict:
+        added = params.get('songIdToAdd', [])
+        for id_ in added:
+            self._lookup(self.library.songs, id_)
+        with self._lock:
+            playlist = self._lookup(self.library.playlists, params.get('playlistId'))
+            for key in ('name', 'comment'):
+                if key in params:
+                    playlist[key] = params[key]
+            if 'public' in params:
+                playlist['public'] = params['public'] == 'true'
+            # like Subsonic, removal indexes refer to the playlist before this request and go before the adds
+            for index in sorted({int(index) for index in params.get('songIndexToRemove', [])}, reverse=True):
+                if index < len(playlist['entry']):
+                    del playlist['entry'][index]
+            playlist['entry'].extend(added)
+        return {}
+
+    def _scan_status(self) -> dict:
+        # a scan walks the songs at an even pace over scan_seconds and bumps lastModified when it finishes
+        total = len(self.library.songs)
+        with self._lock:
+            if self._scan_started is None:
+                return {'scanStatus': {'scanning': False, 'count': total}}
+            elapsed = time.monotonic() - self._scan_started
+            if elapsed < self.scan_seconds:
+                return {'scanStatus': {'scanning': True, 'count': int(total * elapsed / self.scan_seconds)}}
+            self._scan_started = None
+            self.library.touch()
+        return {'scanStatus': {'scanning': False, 'count': total}}
+
+    def rest_startScan(self, params: dict) -> dict:
+        with self._lock:
+            if self._scan_started is None:
+                self._scan_started = time.monotonic()
+        return self._scan_status()
+
+    def rest_getScanStatus(self, params: dict) -> dict:
+        return self._scan_status()
+
+    def db_view(self, query: str) -> str:
+        songs = sorted(self.library.songs.values(), key=lambda song: int(song['id']))
+        if 'min(id)' in query:
+            ids = [int(song['id']) for song in songs]
+            return self._rule_table(['C1', 'C2', 'C3'], [[min(ids), max(ids), len(ids)]] if ids else [[None] * 3])
+        if 'count(id)' in query:
+            return self._rule_table(['C1'], [[len(songs)]])
+        match = _DB_QUERY.match(query)
+        if match is None:
+            return '<html><body><p>Unsupported query</p></body></html>'
+        columns = match.group(1).split(',')
+        low = int(match.group(2))
+        high = int(match.group(3)) if match.group(3) else None
+        selected = [song for song in songs
+                    if int(song['id']) > low and (high is None or int(song['id']) <= high)][:int(match.group(4))]
+        return self._rule_table([column.upper() for column in columns],
+                                [[self._db_value(song, column) for column in columns] for song in selected])
+
+    @staticmethod
+    def _db_value(song: dict, column: str):
+        if column == 'parent_path':
+            return song['path'].rsplit('/', 1)[0]
+        return song.get(DB_VIEW_COLUMNS[column])
+
+    @staticmethod
+    def _rule_table(header: typing.List[str], rows: typing.List[list]) -> str:
+        parts = ['<html><body><table class="ruleTable indent"><tr>']
+        parts.extend('<th class="ruleTableHeader">{0}</th>'.format(name) for name in header)
+        parts.append('</tr>')
+        for row in rows:
+            parts.append('<tr>')
+            parts.extend('<td class="ruleTableCell">{0}</td>'.format(
+                html.escape('' if value is None else str(value).lower() if isinstance(value, bool) else str(value)))
+                for value in row)
+            parts.append('</tr>')
+        parts.append('</table></body></html>')
+        return ''.join(parts)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake = None
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, endpoint: str, status: int, body: bytes, content_type: str, headers: dict = None) -> None:
+        # recorded before the body goes out, a client that got its response always sees the request counted
+        self.fake.record(endpoint, len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.rsplit('/', 1)[-1]
+        if endpoint.endswith('.view'):
+            endpoint = endpoint[:-len('.view')]
+        multi = MULTI_VALUED.get(endpoint, ())
+        params = {key: values if key in multi else values[-1] for key, values in parse_qs(url.query).items()}
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        if self.fake.unavailable:
+            self._send(endpoint, 503, b'Service Unavailable', 'text/plain')
+            return
+        if len(self.path) > self.fake.max_url_length:
+            self._send(endpoint, 414, b'URI Too Long', 'text/plain')
+            return
+
+        if not url.path.startswith('/rest/'):
+            self._send(endpoint, 200, b'<html><body>ok</body></html>', 'text/html')
+            return
+        response = {'status': 'ok', 'version': self.fake.API_VERSION}
+        try:
+            self.fake.authenticate(params)
+            result = self.fake.rest(endpoint, params, self.headers)
+            if isinstance(result, tuple):
+                self._send(endpoint, *result)
+                return
+            response.update(result)
+        except SubsonicError as e:
+            response = {'status': 'failed', 'version': self.fake.API_VERSION,
+                        'error': {'code': e.code, 'message': str(e)}}
+        self._send(endpoint, 200, json.dumps({'subsonic-response': response}).encode(), 'application/json')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length', 0))
+        form = {key: values[-1] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+
+        if url.path == '/j_acegi_security_check':
+            valid = form.get('j_username') == self.fake.username and form.get('j_password') == self.fake.password
+            self.send_response(302)
+            self.send_header('Location', '/index.view' if valid else '/login.view?error')
+            if valid:
+                self.send_header('Set-Cookie', 'JSESSIONID=fake; Path=/')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            self.fake.record('j_acegi_security_check', 0)
+        elif url.path == '/db.view':
+            self._send('db', 200, self.fake.db_view(form.get('query', '')).encode(), 'text/html')
+        else:
+            self._send(url.path, 404, b'', 'text/plain')
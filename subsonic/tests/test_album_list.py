@@ -0,0 +1,73 @@
+import unittest
+
+from api import ListTypes, SubsonicClient
+from models import Album
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class FolderIdServer(FakeSubsonicServer):
+    # real servers number folders and ID3 albums separately, the fake one shares ids between them
+    def rest_getAlbumList(self, params: dict) -> dict:
+        result = super().rest_getAlbumList(params)
+        for album in result['albumList']['album']:
+            album['id'] = 'dir-{0}'.format(album['id'])
+        return result
+
+
+class AlbumListTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=13, albums_per_artist=1, songs_per_album=1)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_stops_on_short_page(self):
+        albums = list(self.api.iter_album_list(ListTypes.NEWEST, page_size=5, read_ahead=0))
+        self.assertEqual([album.id for album in albums], list(self.server.library.albums))
+        self.assertEqual(self.server.endpoints['getAlbumList'], 3)
+
+    def test_exact_multiple_needs_one_empty_page(self):
+        albums = list(self.api.iter_album_list(ListTypes.NEWEST, page_size=13, read_ahead=0))
+        self.assertEqual(len(albums), 13)
+        self.assertEqual(self.server.endpoints['getAlbumList'], 2)
+
+    def test_parallel_windows_keep_order(self):
+        albums = list(self.api.iter_album_list(ListTypes.ALPHABETICAL_NAME, page_size=2, read_ahead=4, workers=3))
+        self.assertEqual(len(albums), 13)
+        self.assertEqual([album.name for album in albums], sorted(album.name for album in albums))
+        # read-ahead never runs more than read_ahead pages past the short one
+        self.assertLessEqual(self.server.endpoints['getAlbumList'], 7 + 4)
+
+    def test_id3_list(self):
+        albums = list(self.api.iter_album_list2(ListTypes.NEWEST, page_size=4))
+        self.assertEqual({album.id for album in albums}, set(self.server.library.albums))
+        self.assertEqual(albums[0].name, 'Album 0')
+
+    def test_invalid_params_raise_before_iterating(self):
+        with self.assertRaises(ValueError):
+            self.api.iter_album_list(ListTypes.BY_YEAR)
+        self.assertEqual(self.server.requests, 0)
+
+
+class FolderAlbumListTestCase(unittest.TestCase):
+    def test_folder_albums_are_not_id3_albums(self):
+        with FolderIdServer(FakeLibrary(artists=2, albums_per_artist=2, songs_per_album=2)) as server:
+            with SubsonicClient(server.username, server.password, server.url) as api:
+                albums = api.get_album_list(ListTypes.NEWEST, size=10)
+                self.assertEqual(len(albums), 4)
+                server.reset_stats()
+                self.assertTrue(all(album.songs == [] for album in albums))
+                self.assertEqual(server.requests, 0)
+                self.assertIsNone(api.identity_map.get(Album, albums[0].id))
+                album = api.get_album(albums[0].id[len('dir-'):])
+                self.assertIsNot(album, albums[0])
+                self.assertEqual(len(album.songs), 2)
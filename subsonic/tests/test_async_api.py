@@ -0,0 +1,41 @@
+import unittest
+
+from async_api import AsyncSubsonicClient
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class AsyncClientTestCase(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=3, albums_per_artist=2, songs_per_album=4))
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_stats()
+
+    async def test_concurrent_reads(self):
+        async with AsyncSubsonicClient(self.server.username, self.server.password, self.server.url) as client:
+            folders = await client.get_music_folders()
+            albums = await client.get_albums(sorted(self.server.library.albums))
+            directories = await client.get_music_directories(['ar-0', 'ar-1', 'ar-2'])
+        self.assertEqual([folder.name for folder in folders], ['Music'])
+        self.assertEqual([album.id for album in albums], sorted(self.server.library.albums))
+        self.assertEqual(sum(len(album.songs) for album in albums), len(self.server.library.songs))
+        self.assertEqual([len(directory.children) for directory in directories], [2, 2, 2])
+        self.assertEqual(self.server.endpoints['getAlbum'], len(self.server.library.albums))
+
+    async def test_wrong_password(self):
+        client = AsyncSubsonicClient(self.server.username, 'wrong', self.server.url)
+        with self.assertRaises(ValueError):
+            async with client:
+                pass
+        await client.close()
+
+    async def test_repeated_params(self):
+        async with AsyncSubsonicClient(self.server.username, self.server.password, self.server.url) as client:
+            await client.scrobble(['1', '2'], [1000, 2000], submission=False)
+        self.assertEqual(self.server.library.scrobbles[-2:], [('1', 1000, False), ('2', 2000, False)])
@@ -0,0 +1,144 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from api import SubsonicClient
+from cache import MISSING, DiskCache, MemoryCache, ResponseCache, cache_key
+from mirror import LibraryMirror
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class CacheKeyTestCase(unittest.TestCase):
+    def test_normalised(self):
+        self.assertEqual(cache_key('getAlbum', {'id': '1', 'u': 'admin', 't': 'abc', 's': '123', 'v': '1.16.0'}),
+                         cache_key('getAlbum', {'v': '1.16.0', 'id': '1', 's': '456', 't': 'def', 'u': 'admin'}))
+        self.assertEqual(cache_key('getAlbumList', {'type': 'newest', 'genre': None}),
+                         cache_key('getAlbumList', {'type': 'newest'}))
+        self.assertNotEqual(cache_key('getAlbum', {'id': '1'}), cache_key('getArtist', {'id': '1'}))
+        self.assertNotEqual(cache_key('getAlbum', {'id': '1'}), cache_key('getAlbum', {'id': '2'}))
+
+
+class BackendTestCase(unittest.TestCase):
+    def _check_backend(self, backend):
+        backend.set('getAlbum?id=1', {'n': 1}, 60)
+        backend.set('getAlbum?id=2', {'n': 2}, 0.05)
+        self.assertEqual(backend.get('getAlbum?id=1'), {'n': 1})
+        time.sleep(0.06)
+        self.assertIs(backend.get('getAlbum?id=2'), MISSING)
+        backend.set('getArtist?id=1', {'n': 3}, 60)
+        backend.delete('getAlbum?')
+        self.assertIs(backend.get('getAlbum?id=1'), MISSING)
+        self.assertEqual(len(backend), 1)
+
+    def test_memory(self):
+        self._check_backend(MemoryCache())
+
+    def test_memory_lru(self):
+        backend = MemoryCache(max_entries=2)
+        backend.set('a', 1, 60)
+        backend.set('b', 2, 60)
+        backend.get('a')
+        self.assertEqual(backend.set('c', 3, 60), 1)
+        self.assertIs(backend.get('b'), MISSING)
+        self.assertEqual((backend.get('a'), backend.get('c')), (1, 3))
+
+    def test_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            backend = DiskCache(path)
+            self._check_backend(backend)
+            backend.close()
+            backend = DiskCache(path, max_entries=2)
+            self.assertEqual(backend.get('getArtist?id=1'), {'n': 3})
+            backend.set('x', 1, 60)
+            time.sleep(0.01)
+            backend.get('getArtist?id=1')
+            self.assertEqual(backend.set('y', 2, 60), 1)
+            self.assertIs(backend.get('x'), MISSING)
+            backend.close()
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def test_uncached_endpoint(self):
+        cache = ResponseCache()
+        calls = []
+        for _ in range(2):
+            cache.fetch('getIndexes', {}, lambda: calls.append(1) or {})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats.hits + cache.stats.misses, 0)
+
+    def test_hits_and_misses(self):
+        cache = ResponseCache()
+        for _ in range(3):
+            self.assertEqual(cache.fetch('getAlbum', {'id': '1'}, lambda: {'album': 1}), {'album': 1})
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (2, 1))
+        cache.invalidate('getAlbum')
+        cache.fetch('getAlbum', {'id': '1'}, lambda: {'album': 1})
+        self.assertEqual(cache.stats.misses, 2)
+
+    def test_concurrent_misses_coalesce(self):
+        cache = ResponseCache()
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait(5)
+            return {'album': 1}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.fetch('getAlbum', {'id': '1'}, loader)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'album': 1}] * 5)
+        self.assertEqual(cache.stats.coalesced, 4)
+
+    def test_errors_are_shared_not_cached(self):
+        def fail():
+            raise ValueError('not found')
+
+        cache = ResponseCache()
+        with self.assertRaises(ValueError):
+            cache.fetch('getAlbum', {'id': '1'}, fail)
+        self.assertEqual(cache.fetch('getAlbum', {'id': '1'}, lambda: {'album': 1}), {'album': 1})
+
+
+class ClientCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSubsonicServer(FakeLibrary(artists=3, albums_per_artist=1, songs_per_album=4)).start()
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url, cache=ResponseCache())
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+    def test_repeat_reads_hit_cache(self):
+        for _ in range(3):
+            self.assertEqual(len(self.api.get_album('al-1-0').songs), 4)
+            self.api.get_music_folders()
+        self.assertEqual(self.server.endpoints, {'getAlbum': 1, 'getMusicFolders': 1})
+        self.assertEqual(self.api.cache.stats.hits, 4)
+
+    def test_mirror_sync_sees_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with LibraryMirror(self.api, os.path.join(directory, 'library.db')) as mirror:
+                mirror.sync()
+                self.api.get_album('al-2-0')
+                library = self.server.library
+                song = library.albums['al-2-0']['song'].pop()
+                library.albums['al-2-0']['songCount'] -= 1
+                del library.songs[song['id']]
+                library.touch()
+                self.assertTrue(mirror.sync())
+                self.assertEqual(len(mirror.get_songs(album_id='al-2-0')), 3)
+                self.assertEqual(len(mirror.get_songs()), 11)
+                self.assertEqual(len(self.api.get_album('al-2-0').songs), 3)
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from api import SubsonicClient
+from coverart import CoverArtCache
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class CoverArtCacheTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=3, albums_per_artist=4, songs_per_album=1)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+        self.directory = tempfile.TemporaryDirectory()
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.api.close()
+
+    def _cache(self, **kwargs) -> CoverArtCache:
+        cache = CoverArtCache(self.api, self.directory.name, workers=4, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_shared_images_stored_once(self):
+        covers = self._cache().fetch_many(list(self.server.library.albums) + [None, 'al-0-0'])
+        self.assertEqual(len(covers), 12)
+        self.assertEqual(self.server.endpoints, {'getCoverArt': 12})
+        # the fake server gives every album of an artist the same image
+        self.assertEqual(len(set(covers.values())), 3)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory.name, 'blobs'))), 3)
+
+    def test_warm_cache_makes_no_requests(self):
+        self._cache().fetch_many(self.server.library.albums, size=128)
+        self.server.reset_stats()
+        cache = self._cache()
+        paths = cache.fetch_many(self.server.library.albums, size=128)
+        self.assertEqual(self.server.requests, 0)
+        self.assertIsNone(cache.cached_path('al-0-0'))
+        with open(paths['al-1-1'], 'rb') as file:
+            self.assertEqual(bytes(cache.open('al-1-1', size=128)), file.read())
+        self.assertEqual(self.server.requests, 0)
+
+    def test_missing_cover(self):
+        with self.assertRaises(ValueError):
+            self._cache().fetch('missing')
+
+    def test_evicted_blob_is_refetched(self):
+        cache = self._cache()
+        path = cache.fetch('ar-2')
+        cache.blobs.remove(os.path.basename(path))
+        self.assertIsNone(cache.cached_path('ar-2'))
+        self.assertEqual(cache.fetch('ar-2'), path)
+        self.assertEqual(self.server.endpoints['getCoverArt'], 2)
+
+    def test_batch_larger_than_cache(self):
+        # six distinct images of ~4.6KB against room for two
+        cache = self._cache(max_bytes=10000)
+        covers = cache.fetch_many(['ar-0', 'ar-1', 'ar-2', 'al-0-0', 'al-1-0', 'al-2-0'])
+        self.assertTrue(all(os.path.exists(path) for path in covers.values()))
+        self.assertEqual(len(set(covers.values())), 6)
+        # released after the batch, the next store brings the cache back under budget
+        cache.fetch('al-0-1', size=64)
+        self.assertLessEqual(cache.blobs.total_bytes, cache.blobs.max_bytes)
@@ -0,0 +1,51 @@
+import time
+import unittest
+
+from dbview import DbViewExporter, parse_rule_table
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class ParseRuleTableTestCase(unittest.TestCase):
+    def test_cells(self):
+        text = ('<html><table class="other"><tr><td>skip</td></tr></table>'
+                '<table class="ruleTable indent">\n<tr><th>ID</th><th>TITLE</th></tr>\n'
+                '<tr><td class="ruleTableCell">1</td><td class="ruleTableCell">Rock &amp; <b>Roll</b></td></tr>'
+                '<TR><TD>2</TD><TD></TD></TR></table></html>')
+        self.assertEqual(parse_rule_table(text), [['1', 'Rock & Roll'], ['2', '']])
+
+    def test_header_only(self):
+        self.assertEqual(parse_rule_table('<table class="ruleTable"><tr><th>ID</th></tr></table>'), [])
+
+    def test_no_table(self):
+        self.assertIsNone(parse_rule_table('<html><body><p>Unsupported query</p></body></html>'))
+
+
+class PartitionsTestCase(unittest.TestCase):
+    def _exporter(self, sessions: int) -> DbViewExporter:
+        return DbViewExporter('http://127.0.0.1', 'admin', 'admin', sessions=sessions)
+
+    def _covered(self, partitions):
+        return [id_ for low, high in partitions for id_ in range(low + 1, high + 1)]
+
+    def test_even_split(self):
+        partitions = self._exporter(4)._partitions(1, 100)
+        self.assertEqual(len(partitions), 4)
+        self.assertEqual(self._covered(partitions), list(range(1, 101)))
+
+    def test_uneven_and_small_ranges(self):
+        for sessions, low, high in ((3, 5, 17), (8, 1, 3), (4, 7, 7), (5, -2, 40)):
+            partitions = self._exporter(sessions)._partitions(low, high)
+            self.assertLessEqual(len(partitions), sessions)
+            self.assertEqual(self._covered(partitions), list(range(low, high + 1)))
+
+
+class DbViewExporterTestCase(unittest.TestCase):
+    def test_close_early_does_not_wait_for_requests(self):
+        library = FakeLibrary(artists=4, albums_per_artist=2, songs_per_album=5)
+        with FakeSubsonicServer(library, latency=0.2) as server:
+            rows = DbViewExporter(server.url, server.username, server.password, sessions=4, page_size=2).iter_rows()
+            next(rows)
+            # the other partitions are mid-request now
+            started = time.perf_counter()
+            rows.close()
+            self.assertLess(time.perf_counter() - started, 0.1)
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from api import SubsonicClient
+from cache import FileCache
+from downloads import DownloadManager
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+SONG_SIZE = 20000
+
+
+class DownloadManagerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=1, albums_per_artist=1, songs_per_album=6,
+                                                    song_size=SONG_SIZE)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+        self.songs = self.api.get_album('al-0-0').songs
+        self.directory = tempfile.TemporaryDirectory()
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.directory.cleanup()
+        self.api.close()
+
+    def _manager(self, max_bytes: int = 10 ** 7, **kwargs) -> DownloadManager:
+        manager = DownloadManager(self.api, FileCache(self.directory.name, max_bytes), chunk_size=4096, **kwargs)
+        self.addCleanup(manager.close)
+        return manager
+
+    def _read(self, path: str) -> bytes:
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def test_download_and_cache(self):
+        downloads = self._manager()
+        path = downloads.download(self.songs[0])
+        self.assertEqual(self._read(path), self.server.song_bytes(self.server.library.songs[self.songs[0].id]))
+        self.assertEqual(downloads.download(self.songs[0]), path)
+        self.assertEqual(self.server.endpoints, {'download': 1})
+
+    def test_resume_from_partial(self):
+        downloads = self._manager()
+        song = self.songs[1]
+        expected = self.server.song_bytes(self.server.library.songs[song.id])
+        with open(downloads.cache.partial_path(song.id), 'wb') as file:
+            file.write(expected[:5000])
+        self.assertEqual(self._read(downloads.download(song)), expected)
+        self.assertEqual(self.server.bytes_sent, len(expected) - 5000)
+
+    def test_size_mismatch(self):
+        downloads = self._manager()
+        song = self.songs[2]
+        song.size += 1
+        try:
+            with self.assertRaises(ValueError):
+                downloads.download(song)
+        finally:
+            song.size -= 1
+        self.assertFalse(os.path.exists(downloads.cache.partial_path(song.id)))
+        self.assertNotIn(song.id, downloads.cache)
+
+    def test_eviction(self):
+        downloads = self._manager(max_bytes=SONG_SIZE * 3 + 100)
+        for song in self.songs[:4]:
+            downloads.download(song)
+        self.assertEqual(len(downloads.cache), 3)
+        self.assertNotIn(self.songs[0].id, downloads.cache)
+        self.assertEqual(downloads.cache.stats.evictions, 1)
+
+    def test_batch_larger_than_cache(self):
+        downloads = self._manager(max_bytes=SONG_SIZE * 3 + 100, workers=2)
+        paths = downloads.download_all(self.songs[:4])
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+        # released after the batch, the next commit brings the cache back under budget
+        downloads.download(self.songs[4])
+        self.assertLessEqual(downloads.cache.total_bytes, downloads.cache.max_bytes)
+
+    def test_concurrent_callers_share_transfer(self):
+        downloads = self._manager()
+        self.server.latency = 0.1
+        try:
+            paths = []
+            threads = [threading.Thread(target=lambda: paths.append(downloads.download(self.songs[5])))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self.server.latency = 0.0
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(self.server.endpoints, {'download': 1})
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import export
+from api import SubsonicClient
+from cli import main
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class IdIndexTestCase(unittest.TestCase):
+    def test_add(self):
+        index = export.IdIndex()
+        for id_ in ('7', '007', 'ar-7', str(export.MAX_BITMAP_ID + 1)):
+            self.assertTrue(index.add(id_))
+            self.assertFalse(index.add(id_))
+            self.assertIn(id_, index)
+        self.assertNotIn('8', index)
+        self.assertNotIn('07', index)
+        self.assertEqual(len(index), 4)
+
+
+class ExportTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=4, albums_per_artist=2, songs_per_album=3, depth=1))
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_ndjson_dedupes_in_batches(self):
+        output = io.StringIO()
+        songs = list(self.api.iter_all_songs(workers=4))
+        count = export.export_songs(songs + songs[:5], export.NDJSONWriter(output), batch_size=4)
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(count, len(self.server.library.songs))
+        self.assertEqual({row['id'] for row in rows}, set(self.server.library.songs))
+        self.assertEqual(rows[0]['size'], self.server.library.songs[rows[0]['id']]['size'])
+
+    def test_cli_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'songs.csv')
+            self.assertEqual(main(['export', path, '--location', self.server.url, '--username', 'admin',
+                                   '--password', 'admin', '--source', 'fast', '--batch-size', '5']), 0)
+            with open(path, newline='') as file:
+                rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), len(self.server.library.songs))
+        self.assertEqual({row['id'] for row in rows}, set(self.server.library.songs))
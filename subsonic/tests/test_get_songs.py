@@ -0,0 +1,51 @@
+import unittest
+
+from api import SubsonicClient
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class GetSongsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=6, albums_per_artist=2, songs_per_album=5, depth=1))
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_get_all_songs(self):
+        songs = self.api.get_all_songs()
+        self.assertEqual({song.id for song in songs}, set(self.server.library.songs))
+        self.assertEqual(songs, self.api.get_all_songs(workers=4))
+
+    def test_iter_all_songs(self):
+        songs = list(self.api.iter_all_songs(workers=4))
+        self.assertEqual(len(songs), len(self.server.library.songs))
+        self.assertEqual({song.id for song in songs}, set(self.server.library.songs))
+
+    def test_get_all_songs_as_table(self):
+        table = self.api.get_all_songs(workers=4, as_table=True)
+        self.assertEqual(len(table), len(self.server.library.songs))
+        by_artist = table.group_by('artist')
+        self.assertEqual(len(by_artist), 6)
+        self.assertEqual(len(by_artist['Artist 1']), 10)
+
+    def test_get_all_songs_fast(self):
+        songs = list(self.api.get_all_songs_fast(sessions=3, page_size=7))
+        self.assertEqual(sorted((song.id for song in songs), key=int), sorted(self.server.library.songs, key=int))
+        song = next(song for song in songs if song.id == '1')
+        self.assertEqual(song.title, 'Track 1')
+        self.assertEqual(song.track, 1)
+        self.assertEqual(song.variable_bit_rate, False)
+
+    def test_get_all_songs_fast_wrong_password(self):
+        self.api.password = 'wrong'
+        with self.assertRaises(ValueError):
+            list(self.api.get_all_songs_fast())
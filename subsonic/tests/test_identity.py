@@ -0,0 +1,87 @@
+import gc
+import unittest
+
+from api import SubsonicClient
+from async_api import AsyncSubsonicClient
+from identity import IdentityMap
+from models import Album, Artist
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class IdentityMapTestCase(unittest.TestCase):
+    def test_merge_refreshes_in_place(self):
+        identity_map = IdentityMap()
+        songs = []
+        first = identity_map.merge(Album('1', 'Old', None, 1, '', 10, 'A', 'ar-1', songs))
+        second = identity_map.merge(Album('1', 'New', 'cover', 2, '', 20, 'A', 'ar-1', None))
+        self.assertIs(second, first)
+        self.assertEqual((first.name, first.cover_art, first.song_count), ('New', 'cover', 2))
+        # a listing without songs doesn't wipe the ones already loaded
+        self.assertIs(first.songs, songs)
+        self.assertIs(identity_map.get(Album, '1'), first)
+        self.assertIsNone(identity_map.get(Artist, '1'))
+
+    def test_entries_are_weak(self):
+        identity_map = IdentityMap()
+        identity_map.merge(Artist('1', 'Gone', None, 0, []))
+        gc.collect()
+        self.assertEqual(len(identity_map), 0)
+
+
+class LazyRelationsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=4, albums_per_artist=3, songs_per_album=2)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_loaded_on_first_access(self):
+        artist = self.api.get_artists()[0].artists[0]
+        self.assertFalse(artist.loaded)
+        self.assertEqual(self.server.endpoints, {'getArtists': 1})
+        album = artist.albums[0]
+        self.assertEqual(len(artist.albums), 3)
+        self.assertEqual(self.server.endpoints['getArtist'], 1)
+        self.assertEqual([song.id for song in album.songs], ['1', '2'])
+        self.assertEqual(self.server.endpoints['getAlbum'], 1)
+
+    def test_one_object_per_id(self):
+        artist = self.api.get_artists()[0].artists[1]
+        self.assertIs(self.api.get_artist(artist.id), artist)
+        self.assertTrue(artist.loaded)
+        self.assertIs(self.api.get_album(artist.albums[0].id), artist.albums[0])
+        self.assertEqual(self.server.endpoints.get('getArtist'), 1)
+
+    def test_prefetch(self):
+        artists = [artist for index in self.api.get_artists() for artist in index.artists]
+        self.api.prefetch(artists, workers=4)
+        self.api.prefetch(artists, workers=4)
+        self.assertTrue(all(artist.loaded for artist in artists))
+        self.assertEqual(self.server.endpoints['getArtist'], 4)
+        self.assertEqual(sum(len(artist.albums) for artist in artists), 12)
+        self.assertEqual(self.server.endpoints['getArtist'], 4)
+
+
+class AsyncLazyRelationsTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_unloaded_relation_raises(self):
+        with FakeSubsonicServer(FakeLibrary(artists=2, albums_per_artist=2, songs_per_album=2)) as server:
+            async with AsyncSubsonicClient(server.username, server.password, server.url) as client:
+                artists = (await client.get_artists())[0].artists
+                with self.assertRaises(ValueError):
+                    artists[0].albums
+                await client.prefetch(artists)
+                self.assertEqual([len(artist.albums) for artist in artists], [2, 2])
+                albums = artists[0].albums
+                with self.assertRaises(ValueError):
+                    albums[0].songs
+                await client.prefetch(albums)
+                self.assertEqual(len(albums[0].songs), 2)
@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+
+from api import SubsonicClient
+from cache import FileCache
+from downloads import DownloadManager
+from instrumentation import Histogram, Instrumentation, RequestEvent
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_cumulative_and_quantile(self):
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [('0.1', 2), ('1.0', 3), ('+Inf', 4)])
+        self.assertEqual(histogram.quantile(0.5), 0.1)
+        self.assertEqual(histogram.quantile(0.75), 1.0)
+        self.assertEqual(histogram.quantile(1.0), float('inf'))
+        self.assertEqual(Histogram().quantile(0.5), 0.0)
+
+
+class PrometheusTestCase(unittest.TestCase):
+    def test_exposition(self):
+        instrumentation = Instrumentation(buckets=(0.5,))
+        for seconds, error in ((0.25, None), (1.5, ValueError('failed'))):
+            event = RequestEvent('getAlbum', {})
+            event.seconds = seconds
+            event.response_bytes = 100
+            event.error = error
+            instrumentation.record(event)
+        lines = instrumentation.to_prometheus().splitlines()
+        for line in ('# TYPE subsonic_request_duration_seconds histogram',
+                     'subsonic_request_duration_seconds_bucket{route="getAlbum",le="0.5"} 1',
+                     'subsonic_request_duration_seconds_bucket{route="getAlbum",le="+Inf"} 2',
+                     'subsonic_request_duration_seconds_sum{route="getAlbum"} 1.75',
+                     'subsonic_request_duration_seconds_count{route="getAlbum"} 2',
+                     '# TYPE subsonic_requests_total counter',
+                     'subsonic_requests_total{route="getAlbum"} 2',
+                     'subsonic_request_errors_total{route="getAlbum"} 1',
+                     'subsonic_response_bytes_total{route="getAlbum"} 200'):
+            self.assertIn(line, lines)
+
+
+class ClientInstrumentationTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=2, albums_per_artist=2, songs_per_album=3,
+                                                    song_size=50000)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.instrumentation = Instrumentation()
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url,
+                                  instrumentation=self.instrumentation)
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_hooks_and_collect(self):
+        seen = []
+        self.instrumentation.add_pre_request_hook(lambda event: event.params.update(c='hooked'))
+        self.instrumentation.add_post_request_hook(seen.append)
+        with self.instrumentation.collect() as collected:
+            self.api.get_album('al-0-0')
+        self.api.get_music_folders()
+        self.assertEqual([event.params['c'] for event in seen], ['hooked', 'hooked'])
+        self.assertEqual(list(collected.routes), ['getAlbum'])
+        self.assertEqual(self.instrumentation.routes['getAlbum'].response_bytes, self.server.bytes_sent -
+                         self.instrumentation.routes['getMusicFolders'].response_bytes)
+        with self.assertRaises(ValueError):
+            self.api.get_album('missing')
+        self.assertEqual(self.instrumentation.routes['getAlbum'].errors, 1)
+
+    def test_streamed_listing(self):
+        self.assertEqual(len(list(self.api.iter_music_directory('al-1-1'))), 3)
+        stats = self.instrumentation.routes['getMusicDirectory']
+        self.assertEqual((stats.requests, stats.response_bytes), (1, self.server.bytes_sent))
+        self.assertGreater(stats.request_bytes, 0)
+
+    def test_cover_art(self):
+        image = self.api.get_cover_art('al-0-1', size=64)
+        stats = self.instrumentation.routes['getCoverArt']
+        self.assertEqual((stats.requests, stats.response_bytes), (1, len(image)))
+
+    def test_downloads(self):
+        songs = [self.api.get_album('al-1-0').songs[0]]
+        with tempfile.TemporaryDirectory() as directory:
+            with DownloadManager(self.api, FileCache(directory, 10 ** 7)) as downloads:
+                downloads.download_all(songs)
+        stats = self.instrumentation.routes['download']
+        self.assertEqual((stats.requests, stats.response_bytes, stats.errors), (1, songs[0].size, 0))
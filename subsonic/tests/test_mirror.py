@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from api import SubsonicClient
+from mirror import LibraryMirror
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class MirrorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSubsonicServer(FakeLibrary(artists=5, albums_per_artist=3, songs_per_album=4)).start()
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+        self.directory = tempfile.TemporaryDirectory()
+        self.mirror = LibraryMirror(self.api, os.path.join(self.directory.name, 'library.db'), workers=4)
+
+    def tearDown(self):
+        self.mirror.close()
+        self.directory.cleanup()
+        self.api.close()
+        self.server.stop()
+
+    def _remove_song(self, album_id: str) -> None:
+        library = self.server.library
+        song = library.albums[album_id]['song'].pop()
+        library.albums[album_id]['songCount'] -= 1
+        del library.songs[song['id']]
+        library.touch()
+
+    def test_full_sync(self):
+        self.assertTrue(self.mirror.sync())
+        self.assertEqual(len(self.mirror.get_artists()), 5)
+        self.assertEqual(len(self.mirror.get_albums()), 15)
+        self.assertEqual(len(self.mirror.get_songs()), 60)
+        self.assertEqual(len(self.mirror.get_album('al-1-2').songs), 4)
+        self.assertEqual(self.mirror.get_song('1').title, 'Track 1')
+        self.assertEqual(self.mirror.last_modified, 1)
+
+    def test_unchanged_library_is_one_request(self):
+        self.mirror.sync()
+        self.server.reset_stats()
+        self.assertFalse(self.mirror.sync())
+        self.assertEqual(self.server.endpoints, {'getIndexes': 1})
+
+    def test_incremental_sync_refetches_only_changed_albums(self):
+        self.mirror.sync(page_size=4)
+        self._remove_song('al-2-1')
+        self.server.reset_stats()
+        self.assertTrue(self.mirror.sync(page_size=4))
+        self.assertEqual(self.server.endpoints.get('getArtist', 0), 0)
+        self.assertEqual(self.server.endpoints['getAlbum'], 1)
+        # 15 albums in pages of 4, plus whatever read-ahead had already sent past the short page
+        self.assertIn(self.server.endpoints['getAlbumList2'], (4, 5, 6))
+        self.assertEqual(len(self.mirror.get_songs(album_id='al-2-1')), 3)
+        self.assertEqual(len(self.mirror.get_songs()), 59)
+        self.assertEqual(self.mirror.last_modified, 2)
+
+    def test_retagged_album_is_refetched(self):
+        self.mirror.sync()
+        album = self.server.library.albums['al-3-0']
+        album['genre'] = 'Retagged'
+        for song in album['song']:
+            song['genre'] = 'Retagged'
+        self.server.library.touch()
+        self.server.reset_stats()
+        self.mirror.sync()
+        self.assertEqual(self.server.endpoints['getAlbum'], 1)
+        self.assertEqual(self.mirror.get_album('al-3-0').genre, 'Retagged')
+        self.assertEqual({song.genre for song in self.mirror.get_songs(album_id='al-3-0')}, {'Retagged'})
+
+    def test_full_interval(self):
+        self.mirror.sync()
+        self.server.library.songs['1']['title'] = 'Retitled'
+        self.server.library.touch()
+        # a song title doesn't show in the album listing, only a full sync picks it up
+        self.mirror.sync()
+        self.assertEqual(self.mirror.get_song('1').title, 'Track 1')
+        self.mirror.full_interval = 0
+        self.server.reset_stats()
+        self.assertTrue(self.mirror.sync())
+        self.assertEqual(self.server.endpoints['getAlbum'], 15)
+        self.assertEqual(self.mirror.get_song('1').title, 'Retitled')
+
+    def test_adds_columns_to_older_mirror(self):
+        path = os.path.join(self.directory.name, 'old.db')
+        connection = sqlite3.connect(path)
+        connection.execute('CREATE TABLE albums (id TEXT PRIMARY KEY, name TEXT, cover_art TEXT, song_count INTEGER, '
+                           'created TEXT, duration INTEGER, artist TEXT, artist_id TEXT)')
+        connection.close()
+        with LibraryMirror(self.api, path) as mirror:
+            mirror.sync()
+            self.assertEqual(mirror.get_album('al-1-1').year, 2001)
+
+    def test_removed_album(self):
+        self.mirror.sync()
+        library = self.server.library
+        for song in library.albums.pop('al-0-0')['song']:
+            del library.songs[song['id']]
+        library.artists['ar-0']['albums'].remove('al-0-0')
+        library.touch()
+        self.mirror.sync()
+        self.assertIsNone(self.mirror.get_album('al-0-0'))
+        self.assertEqual(self.mirror.get_songs(album_id='al-0-0'), [])
+        self.assertEqual(self.mirror.get_artist('ar-0').album_count, 2)
@@ -0,0 +1,78 @@
+import unittest
+
+from api import SubsonicClient
+from playlists import chunk_values, playlist_diff
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class PlaylistDiffTestCase(unittest.TestCase):
+    def _apply(self, current, remove, add):
+        kept = [id_ for index, id_ in enumerate(current) if index not in set(remove)]
+        return kept + add
+
+    def test_ordered(self):
+        current = ['1', '2', '3', '4', '5']
+        for desired in (['1', '2', '3', '4', '5'], ['1', '3', '5', '6'], ['2', '1'], [], ['1', '1', '2']):
+            remove, add = playlist_diff(current, desired)
+            self.assertEqual(self._apply(current, remove, add), desired)
+        self.assertEqual(playlist_diff(current, ['1', '3', '5', '6']), ([1, 3], ['6']))
+
+    def test_unordered(self):
+        remove, add = playlist_diff(['1', '2', '2', '3'], ['3', '2', '4', '1'], ordered=False)
+        self.assertEqual((remove, add), ([2], ['4']))
+
+    def test_chunk_values(self):
+        chunks = chunk_values('songId', [str(id_) for id_ in range(1000)], 200)
+        self.assertEqual([id_ for chunk in chunks for id_ in chunk], [str(id_) for id_ in range(1000)])
+        self.assertTrue(all(sum(len('&songId=') + len(id_) for id_ in chunk) <= 200 for chunk in chunks))
+        with self.assertRaises(ValueError):
+            chunk_values('songId', ['x' * 300], 200)
+
+
+class PlaylistTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=10, albums_per_artist=10, songs_per_album=20))
+        cls.server.max_url_length = 1000
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+        self.api.max_url_length = 1000
+        self.ids = sorted(self.server.library.songs, key=int)
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_create_large_playlist(self):
+        playlist = self.api.create_playlist('All', self.ids)
+        self.assertEqual([entry.id for entry in playlist.entries], self.ids)
+        self.assertGreater(self.server.endpoints['updatePlaylist'], 1)
+
+    def test_sync_sends_only_changes(self):
+        playlist = self.api.create_playlist('Sync', self.ids[:1000])
+        desired = self.ids[:400] + self.ids[500:1000] + self.ids[1500:1600]
+        self.server.reset_stats()
+        self.assertEqual(self.api.sync_playlist(playlist.id, desired), (100, 100))
+        self.assertEqual([entry.id for entry in self.api.get_playlist(playlist.id).entries], desired)
+        self.assertEqual(self.api.sync_playlist(playlist.id, desired), (0, 0))
+
+    def test_sync_playlists(self):
+        first = self.api.create_playlist('First', self.ids[:10])
+        second = self.api.create_playlist('Second', self.ids[10:20])
+        results = self.api.sync_playlists({first.id: self.ids[5:15], second.id: self.ids[10:20][::-1]},
+                                          ordered=False)
+        self.assertEqual(results, {first.id: (5, 5), second.id: (0, 0)})
+        self.assertEqual({entry.id for entry in self.api.get_playlist(first.id).entries}, set(self.ids[5:15]))
+
+    def test_update_metadata(self):
+        playlist = self.api.create_playlist('Old')
+        self.api.update_playlist(playlist.id, name='New', comment='Renamed', public=True)
+        playlist = self.api.get_playlist(playlist.id)
+        self.assertEqual((playlist.name, playlist.comment, playlist.public), ('New', 'Renamed', True))
+        self.assertIn(playlist.id, [listed.id for listed in self.api.get_playlists()])
@@ -0,0 +1,97 @@
+import time
+import unittest
+
+from api import SubsonicClient
+from routing import ReplicaRouter
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class RoutingTestCase(unittest.TestCase):
+    def setUp(self):
+        library = FakeLibrary(artists=3, albums_per_artist=1, songs_per_album=2)
+        self.primary = FakeSubsonicServer(library, latency=0.05)
+        self.fast = FakeSubsonicServer(library, latency=0.0)
+        self.slow = FakeSubsonicServer(library, latency=0.02)
+        for server in (self.primary, self.fast, self.slow):
+            server.start()
+
+    def tearDown(self):
+        for server in (self.primary, self.fast, self.slow):
+            server.stop()
+
+    def _client(self, **kwargs) -> SubsonicClient:
+        router = ReplicaRouter(self.primary.url, [self.fast.url, self.slow.url], **kwargs)
+        client = SubsonicClient(self.primary.username, self.primary.password, self.primary.url, router=router)
+        self.addCleanup(client.close)
+        return client
+
+    def test_reads_prefer_fastest_replica(self):
+        client = self._client()
+        for _ in range(20):
+            client.get_music_folders()
+        self.assertGreaterEqual(self.fast.endpoints['getMusicFolders'], 17)
+
+    def test_writes_pinned_to_primary(self):
+        client = self._client()
+        for _ in range(3):
+            client.start_scan()
+            client.get_scan_status()
+        self.assertEqual(self.primary.endpoints['startScan'], 3)
+        self.assertEqual(self.primary.endpoints['getScanStatus'], 3)
+
+    def test_failover(self):
+        client = self._client()
+        for _ in range(5):
+            client.get_music_folders()
+        self.fast.unavailable = True
+        self.assertEqual(len(client.get_music_folders()), 1)
+        fast = client.router.replicas[1]
+        self.assertFalse(fast.healthy())
+        self.assertEqual(client.router.ranked()[-1], fast)
+
+    def test_hedged_request(self):
+        client = self._client(hedge=True, min_hedge_samples=5)
+        for _ in range(10):
+            client.get_music_folders()
+        # a warm-up read can outlast fast's few-millisecond p95 too, only count the slow one
+        hedged = client.router.hedged
+        self.fast.latency = 1.0
+        started = time.perf_counter()
+        client.get_music_folders()
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual(client.router.hedged, hedged + 1)
+
+    def test_client_error_not_a_replica_failure(self):
+        for hedge in (False, True):
+            with self.subTest(hedge=hedge):
+                # too few samples to hedge on, the hedged path only gets the chance to fail over
+                client = self._client(hedge=hedge, min_hedge_samples=100)
+                for _ in range(10):
+                    client.get_music_folders()
+                for server in (self.primary, self.fast, self.slow):
+                    server.reset_stats()
+                    server.max_url_length = 10
+                try:
+                    with self.assertRaises(IOError):
+                        client.get_music_folders()
+                finally:
+                    for server in (self.primary, self.fast, self.slow):
+                        server.max_url_length = 8192
+                self.assertTrue(all(replica.healthy() for replica in client.router.replicas))
+                self.assertEqual(sum(server.requests for server in (self.primary, self.fast, self.slow)), 1)
+
+    def test_failure_log_hides_credentials(self):
+        client = self._client()
+        for _ in range(5):
+            client.get_music_folders()
+        self.fast.unavailable = True
+        with self.assertLogs('routing', 'WARNING') as logs:
+            client.get_music_folders()
+        self.assertIn(self.fast.url, logs.output[0])
+        self.assertIn('/rest/getMusicFolders', logs.output[0])
+        self.assertNotIn('t=', logs.output[0])
+        self.assertNotIn('s=', logs.output[0])
+
+    def test_primary_must_match(self):
+        with self.assertRaises(ValueError):
+            SubsonicClient('admin', 'admin', self.fast.url, router=ReplicaRouter(self.primary.url))
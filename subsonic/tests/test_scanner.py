@@ -0,0 +1,73 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from api import SubsonicClient
+from cache import ResponseCache
+from mirror import LibraryMirror
+from models import ScanStatus
+from scanner import ScanPoller, ScanWatcher
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+class ScanPollerTestCase(unittest.TestCase):
+    def test_interval_follows_rate(self):
+        poller = ScanPoller(min_interval=0.25, max_interval=10.0, target_step=500)
+        self.assertEqual(poller.observe(ScanStatus(True, 0), now=0.0), 0.25)
+        # 1000 files/s, so 500 more files take half a second
+        self.assertEqual(poller.observe(ScanStatus(True, 1000), now=1.0), 0.5)
+        self.assertEqual(poller.observe(ScanStatus(True, 1010), now=2.0), 10.0)
+
+    def test_backoff_without_progress(self):
+        poller = ScanPoller(min_interval=0.5, max_interval=3.0, backoff=2.0)
+        intervals = [poller.observe(ScanStatus(True, 10), now=float(second)) for second in range(5)]
+        self.assertEqual(intervals, [0.5, 1.0, 2.0, 3.0, 3.0])
+        self.assertEqual(poller.observe(ScanStatus(True, 100000), now=5.0), 0.5)
+
+
+class ScanWatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSubsonicServer(FakeLibrary(artists=2, albums_per_artist=2, songs_per_album=3),
+                                         scan_seconds=0.3).start()
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url, cache=ResponseCache())
+        self.directory = tempfile.TemporaryDirectory()
+        self.mirror = LibraryMirror(self.api, os.path.join(self.directory.name, 'library.db'))
+        self.mirror.sync()
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.mirror.close()
+        self.directory.cleanup()
+        self.api.close()
+        self.server.stop()
+
+    def _poller(self) -> ScanPoller:
+        return ScanPoller(min_interval=0.02, max_interval=0.1, target_step=1)
+
+    def test_run_syncs_mirror(self):
+        progress = []
+        completed = []
+        watcher = ScanWatcher(self.api, self.mirror, self._poller(), on_progress=progress.append,
+                              on_complete=lambda status, changed: completed.append(changed))
+        status = watcher.run()
+        self.assertFalse(status.scanning)
+        self.assertTrue(progress[0].scanning)
+        self.assertEqual(completed, [True])
+        self.assertEqual(self.mirror.last_modified, 2)
+        self.assertEqual(self.server.endpoints['startScan'], 1)
+        self.assertEqual(self.server.endpoints['getScanStatus'], len(progress) - 1)
+        self.assertEqual(self.server.endpoints['getIndexes'], 1)
+
+    def test_async_iteration(self):
+        async def watch():
+            return [status async for status in ScanWatcher(self.api, poller=self._poller())]
+
+        statuses = asyncio.run(watch())
+        self.assertTrue(statuses[0].scanning)
+        self.assertFalse(statuses[-1].scanning)
+
+    def test_timeout(self):
+        self.server.scan_seconds = 5.0
+        with self.assertRaises(TimeoutError):
+            ScanWatcher(self.api, poller=self._poller(), timeout=0.1).run()
@@ -0,0 +1,108 @@
+import unittest
+
+from api import SubsonicClient
+from models import Child
+from search import SearchIndex, tokenize
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+def _child(id_: str, title: str, artist: str = 'Someone', album: str = 'Something', is_dir: bool = False) -> Child:
+    return Child(id_, is_dir, title, album, artist, None, None, None, None, None, None, None, None, None, None, None,
+                 None, None)
+
+
+class SearchIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex([
+            _child('1', 'Paranoid Android', 'Radiohead', 'OK Computer'),
+            _child('2', 'Karma Police', 'Radiohead', 'OK Computer'),
+            _child('3', 'Paranoid', 'Black Sabbath', 'Paranoid'),
+            _child('4', 'Café del Mar', 'Energy 52', 'Café del Mar'),
+            _child('5', 'Track', 'Various', 'Hits'),
+            _child('d', 'Paranoid', is_dir=True),
+        ])
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Café, del-Mar!'), ['cafe', 'del', 'mar'])
+        self.assertEqual(tokenize(None), [])
+
+    def test_ranking(self):
+        # a title hit outweighs an album hit, more matching fields add up
+        self.assertEqual([song.id for song in self.index.search('paranoid')], ['3', '1'])
+        self.assertEqual([song.id for song in self.index.search('radiohead')], ['2', '1'])
+        self.assertNotIn('d', self.index)
+
+    def test_every_term_must_match(self):
+        self.assertEqual([song.id for song in self.index.search('paranoid radiohead')], ['1'])
+        self.assertEqual(self.index.search('paranoid nobody'), [])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_prefix_and_accents(self):
+        self.assertEqual([song.id for song in self.index.search('karma pol')], ['2'])
+        self.assertEqual([song.id for song in self.index.search('cafe')], ['4'])
+
+    def test_typos(self):
+        self.assertEqual([song.id for song in self.index.search('trak')], ['5'])
+        self.assertEqual([song.id for song in self.index.search('parnoid')], ['3', '1'])
+        self.assertEqual(self.index.search('zzzz'), [])
+
+    def test_limit_keeps_ranking(self):
+        index = SearchIndex(_child(str(id_), 'Song {0}'.format(id_), 'Artist' if id_ % 3 else 'Song')
+                            for id_ in range(100))
+        top = index.search_scored('song', limit=5)
+        self.assertEqual([song.id for _, song in top], ['0', '12', '15', '18', '21'])
+        self.assertEqual(top, index.search_scored('song', limit=100)[:5])
+
+    def test_tokens_stay_sorted(self):
+        self.index.search('para')
+        self.index.add(_child('6', 'Parachutes', 'Coldplay', 'Parachutes'))
+        self.assertEqual([song.id for song in self.index.search('parac')], ['6'])
+        self.index.remove('6')
+        self.index.remove('3')
+        self.assertEqual([song.id for song in self.index.search('para')], ['1'])
+        self.assertEqual(self.index._sorted_tokens, sorted(self.index._postings))
+        self.index.extend([_child('7', 'Yellow'), _child('7', 'Trouble'), _child('8', 'Yellow Submarine')])
+        self.assertEqual([song.id for song in self.index.search('yel')], ['8'])
+        self.assertEqual(self.index._sorted_tokens, sorted(self.index._postings))
+
+    def test_remove_and_replace(self):
+        self.index.remove('2')
+        self.assertEqual(self.index.search('karma'), [])
+        self.assertEqual(self.index.search('karm'), [])
+        self.index.add(_child('3', 'War Pigs', 'Black Sabbath', 'Paranoid'))
+        self.assertEqual([song.id for song in self.index.search('war')], ['3'])
+        self.assertEqual([song.id for song in self.index.search('paranoid')], ['1', '3'])
+        self.assertEqual(len(self.index), 4)
+
+
+class SearchEndpointTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=3, albums_per_artist=4, songs_per_album=5)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_search2_and_search3(self):
+        result = self.api.search_query('track 1', song_count=5)
+        self.assertEqual(len(result.songs), 5)
+        self.assertTrue(all(song.title.startswith('Track 1') for song in result.songs))
+        result = self.api.search3('album 2')
+        self.assertEqual(sorted(album.id for album in result.albums), ['al-0-2', 'al-1-2', 'al-2-2'])
+        self.assertEqual(result.artists, [])
+
+    def test_search_all_pages_each_category(self):
+        result = self.api.search_all('a', page_size=7)
+        self.assertEqual(len(result.artists), 3)
+        self.assertEqual(len(result.albums), 12)
+        self.assertEqual(len({song.id for song in result.songs}), 60)
+        # 60 songs need 9 pages of 7, albums and artists dropped out of the requests long before
+        self.assertEqual(self.server.endpoints['search3'], 9)
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import api
+from api import SubsonicClient
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+IMPORT_BUDGET_SECONDS = 0.1
+DEFERRED_MODULES = ('requests', 'tortilla', 'bs4', 'dbview', 'aiohttp')
+
+# measured in a fresh interpreter, the parent process has already imported everything
+_MEASURE = '''
+import json, sys, time
+started = time.perf_counter()
+import api
+client = api.SubsonicClient('admin', 'admin', 'http://127.0.0.1:9', validation='lazy')
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'modules': [name for name in %r if name in sys.modules]}))
+'''
+
+
+class StartupTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=2, albums_per_artist=1, songs_per_album=2))
+        cls.server.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset_stats()
+
+    def _measure(self) -> dict:
+        output = subprocess.run([sys.executable, '-c', _MEASURE % (DEFERRED_MODULES,)],
+                                cwd=os.path.dirname(os.path.abspath(api.__file__)), check=True,
+                                capture_output=True, text=True).stdout
+        return json.loads(output)
+
+    def test_import_budget(self):
+        # best of three, so a busy machine doesn't fail the budget on one unlucky run
+        results = [self._measure() for _ in range(3)]
+        self.assertEqual(results[0]['modules'], [])
+        self.assertLess(min(result['seconds'] for result in results), IMPORT_BUDGET_SECONDS)
+
+    def test_lazy_validation(self):
+        client = SubsonicClient(self.server.username, 'wrong', self.server.url, validation='lazy')
+        self.assertEqual(self.server.requests, 0)
+        with self.assertRaises(ValueError):
+            client.get_music_folders()
+        client.close()
+
+    def test_background_validation(self):
+        client = SubsonicClient(self.server.username, 'wrong', self.server.url, validation='background')
+        with self.assertRaises(ValueError):
+            client.get_artists()
+        client.close()
+        client = SubsonicClient(self.server.username, self.server.password, self.server.url, validation='background')
+        self.assertEqual(len(client.get_music_folders()), 1)
+        self.assertEqual(self.server.endpoints['ping'], 2)
+        client.close()
+
+    def _start_unavailable(self, password: str) -> SubsonicClient:
+        self.server.unavailable = True
+        try:
+            client = SubsonicClient(self.server.username, password, self.server.url, validation='background')
+            with self.assertRaises(IOError):
+                client.wait_validated()
+        finally:
+            self.server.unavailable = False
+        self.addCleanup(client.close)
+        return client
+
+    def test_background_validation_recovers_from_io_error(self):
+        self.assertEqual(len(self._start_unavailable(self.server.password).get_music_folders()), 1)
+        # bad credentials are still reported once the server is back
+        with self.assertRaises(ValueError):
+            self._start_unavailable('wrong').get_music_folders()
+
+    def test_unknown_validation_mode(self):
+        with self.assertRaises(ValueError):
+            SubsonicClient(self.server.username, self.server.password, self.server.url, validation='never')
@@ -0,0 +1,58 @@
+import unittest
+from urllib.parse import parse_qs, urlparse
+
+from api import BaseSubsonicClient, StreamUrlSigner, SubsonicClient
+from models import Song
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+def _song(id_: str, **kwargs) -> Song:
+    return Song(id_, False, 'Track', 'Album', 'Artist', 1, 'Rock', 1, 'audio/mpeg', 'mp3', 240, 320, 'a.mp3', 0, '',
+                'al-1', 'ar-1', 'music', **kwargs)
+
+
+class StreamUrlSignerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = BaseSubsonicClient('admin', 'admin', 'http://127.0.0.1:4040')
+
+    def test_urls_share_one_token(self):
+        urls = self.client.private_stream_urls(['1', 'a b/c'], max_bit_rate=128, format_='mp3')
+        queries = [parse_qs(urlparse(url).query) for url in urls]
+        self.assertEqual([query['id'] for query in queries], [['1'], ['a b/c']])
+        self.assertEqual(queries[0]['s'], queries[1]['s'])
+        self.assertEqual((queries[0]['maxBitRate'], queries[0]['format']), (['128'], ['mp3']))
+        self.assertTrue(urls[0].startswith('http://127.0.0.1:4040/rest/stream?'))
+
+    def test_matches_private_stream_url(self):
+        expected = parse_qs(urlparse(self.client.private_stream_url('7')).query)
+        signed = parse_qs(urlparse(self.client.stream_url_signer()('7')).query)
+        self.assertEqual(set(signed), set(expected))
+        self.assertEqual(repr(self.client.stream_url_signer(endpoint='download')),
+                         'StreamUrlSigner<http://127.0.0.1:4040/rest/download>')
+
+
+class LazyStreamUrlTestCase(unittest.TestCase):
+    def test_signed_once_on_first_access(self):
+        calls = []
+        signer = StreamUrlSigner('http://host/rest/stream', {'u': 'admin'})
+        song = _song('5', url_signer=lambda id_: calls.append(id_) or signer(id_))
+        self.assertEqual(calls, [])
+        self.assertEqual(song.stream_url, 'http://host/rest/stream?u=admin&id=5')
+        self.assertEqual(song.stream_url, 'http://host/rest/stream?u=admin&id=5')
+        self.assertEqual(calls, ['5'])
+
+    def test_explicit_url_wins(self):
+        song = _song('5', stream_url='http://other', url_signer=lambda id_: 'unused')
+        self.assertEqual(song.stream_url, 'http://other')
+        song.stream_url = 'http://changed'
+        self.assertEqual(song.stream_url, 'http://changed')
+        self.assertEqual(_song('6').stream_url, '')
+
+    def test_server_accepts_signed_url(self):
+        with FakeSubsonicServer(FakeLibrary(artists=1, albums_per_artist=1, songs_per_album=3,
+                                            song_size=1000)) as server:
+            with SubsonicClient(server.username, server.password, server.url) as client:
+                songs = list(client.get_all_songs_fast(sessions=1))
+                self.assertTrue(all(song._stream_url == '' for song in songs))
+                response = client.transport.get(songs[0].stream_url)
+                self.assertEqual(len(response.content), 1000 + int(songs[0].id))
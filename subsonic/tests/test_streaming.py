@@ -0,0 +1,73 @@
+import json
+import unittest
+
+import streaming
+from api import ListTypes, SubsonicClient
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+
+
+def _chunks(text: str, size: int):
+    return (text[start:start + size] for start in range(0, len(text), size))
+
+
+class IterArrayTestCase(unittest.TestCase):
+    ITEMS = [{'id': str(i), 'title': 'Track "{0}", [child]'.format(i), 'nested': {'child': [i, {'x': '\\'}]}}
+             for i in range(20)]
+
+    def _document(self, items) -> str:
+        # the key shows up in a string value and a nested object before the real array
+        return json.dumps({'subsonic-response': {'status': 'ok', 'note': 'no "child" here', 'nested': {'other': []},
+                                                 'directory': {'id': '1', 'child': items}}})
+
+    def test_every_chunk_size(self):
+        document = self._document(self.ITEMS)
+        for size in (1, 2, 3, 7, 64, len(document)):
+            self.assertEqual(list(streaming.iter_array(_chunks(document, size), 'child')), self.ITEMS)
+
+    def test_empty_array(self):
+        self.assertEqual(list(streaming.iter_array(_chunks(self._document([]), 5), 'child')), [])
+
+    def test_missing_array(self):
+        document = json.dumps({'subsonic-response': {'status': 'failed', 'error': {'code': 70, 'message': 'x'}}})
+        with self.assertRaises(streaming.ArrayNotFound) as context:
+            list(streaming.iter_array(_chunks(document, 3), 'child'))
+        self.assertEqual(json.loads(context.exception.document)['subsonic-response']['status'], 'failed')
+
+    def test_key_with_non_array_value(self):
+        document = json.dumps({'child': {'id': '1'}})
+        with self.assertRaises(streaming.ArrayNotFound):
+            list(streaming.iter_array([document], 'child'))
+
+    def test_truncated(self):
+        document = self._document(self.ITEMS)
+        with self.assertRaises(ValueError):
+            list(streaming.iter_array(_chunks(document[:len(document) // 2], 10), 'child'))
+
+
+class StreamedRequestTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeSubsonicServer(FakeLibrary(artists=2, albums_per_artist=2, songs_per_album=3)).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_matches_full_decode(self):
+        self.assertEqual([child.id for child in self.api.iter_music_directory('al-1-0')],
+                         [child.id for child in self.api.get_music_directory('al-1-0').children])
+        self.assertEqual([song.id for song in self.api.iter_album_songs('al-0-1')], ['4', '5', '6'])
+        self.assertEqual(len(list(self.api.iter_album_list_page(ListTypes.NEWEST, size=3))), 3)
+
+    def test_failed_response(self):
+        with self.assertRaises(ValueError):
+            list(self.api.iter_music_directory('missing'))
+
+    def test_empty_listing(self):
+        self.assertEqual(list(self.api.iter_album_list_page(ListTypes.NEWEST, size=10, offset=100)), [])
@@ -0,0 +1,111 @@
+import unittest
+
+from models import Song
+from table import COLUMNS, SongTable
+
+
+def _song(id_: str, title: str, album: str, artist: str, track: int = None, genre: str = None, year: int = None,
+          variable_bit_rate: bool = None, **kwargs) -> Song:
+    return Song(id_, False, title, album, artist, track, genre, 1000, 'audio/mpeg', 'mp3', 240, 320,
+                '{0}.mp3'.format(id_), 0, '', 'al-{0}'.format(album), 'ar-{0}'.format(artist), 'music', year=year,
+                variable_bit_rate=variable_bit_rate, **kwargs)
+
+
+def _ids(table: SongTable) -> list:
+    return table.column('id')
+
+
+class SongTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.songs = [_song('1', 'B', 'X', 'A1', track=2, genre='Rock', year=2001, variable_bit_rate=True),
+                      _song('2', 'A', 'X', 'A1', track=1),
+                      _song('3', 'C', 'Y', 'A2', genre='Jazz', year=1999, variable_bit_rate=False),
+                      _song('4', 'A', 'Y', 'A2', track=1, genre='Rock', year=2001, variable_bit_rate=True)]
+        self.table = SongTable(self.songs)
+
+    def test_rows(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table[-1].id, '4')
+        self.assertEqual((self.table[1].genre, self.table[1].track, self.table[1].year), (None, 1, None))
+        with self.assertRaises(IndexError):
+            self.table[4]
+        with self.assertRaises(AttributeError):
+            self.table[0].missing
+
+    def test_filter_keywords(self):
+        self.assertEqual(_ids(self.table.filter(genre='Rock')), ['1', '4'])
+        self.assertEqual(_ids(self.table.filter(genre=None)), ['2'])
+        self.assertEqual(_ids(self.table.filter(genre='Pop')), [])
+        self.assertEqual(_ids(self.table.filter(title='A')), ['2', '4'])
+        self.assertEqual(_ids(self.table.filter(track=1)), ['2', '4'])
+        self.assertEqual(_ids(self.table.filter(track=None)), ['3'])
+        self.assertEqual(_ids(self.table.filter(variable_bit_rate=False)), ['3'])
+        self.assertEqual(_ids(self.table.filter(variable_bit_rate=None)), ['2'])
+        self.assertEqual(_ids(self.table.filter(is_dir=False)), ['1', '2', '3', '4'])
+        self.assertEqual(_ids(self.table.filter(artist='A1', track=1)), ['2'])
+
+    def test_filter_predicate(self):
+        self.assertEqual(_ids(self.table.filter(lambda row: (row.year or 0) > 2000)), ['1', '4'])
+        self.assertEqual(_ids(self.table.filter(lambda row: row.title != 'C', album='Y')), ['4'])
+        self.assertEqual(_ids(self.table.filter(lambda row: False, album='Y')), [])
+
+    def test_sort(self):
+        self.assertEqual(_ids(self.table.sort('title')), ['2', '4', '1', '3'])
+        # None sorts first, in int and interned columns alike
+        self.assertEqual(_ids(self.table.sort('album', 'track')), ['2', '1', '3', '4'])
+        self.assertEqual(_ids(self.table.sort('genre')), ['2', '3', '1', '4'])
+        self.assertEqual(_ids(self.table.sort('year', reverse=True)), ['1', '4', '3', '2'])
+        self.assertEqual(self.table.argsort('artist', 'title', reverse=True), [2, 3, 0, 1])
+        self.assertEqual(_ids(self.table.sort('genre', 'title')), ['2', '3', '4', '1'])
+
+    def test_take(self):
+        taken = self.table.take([3, 0, 3])
+        self.assertEqual(_ids(taken), ['4', '1', '4'])
+        self.assertEqual(taken.column('album'), ['Y', 'X', 'Y'])
+        # the interned dictionary is shared, values added to the source later don't disturb the taken table
+        self.table.append(_song('5', 'D', 'Z', 'A3', genre='Pop'))
+        self.assertEqual(taken.column('genre'), ['Rock', 'Rock', 'Rock'])
+        self.assertEqual(self.table[4].genre, 'Pop')
+
+    def test_row_equality(self):
+        row = self.table[0]
+        self.assertEqual(row, self.songs[0])
+        self.assertEqual(self.songs[0], row)
+        self.assertEqual(hash(row), hash(self.songs[0]))
+        self.assertIn(row, set(self.songs))
+        self.assertNotEqual(row, self.table[1])
+        self.assertNotEqual(row, '1')
+        self.assertEqual(row, SongTable(self.songs[:1])[0])
+
+    def test_to_song(self):
+        for row, song in zip(self.table, self.songs):
+            copy = row.to_song()
+            self.assertIsInstance(copy, Song)
+            self.assertEqual({name: getattr(copy, name) for name in COLUMNS},
+                             {name: getattr(song, name) for name in COLUMNS})
+
+    def test_lazy_stream_url(self):
+        signed = []
+
+        def signer(id_: str) -> str:
+            signed.append(id_)
+            return 'http://host/rest/stream?id={0}'.format(id_)
+
+        table = SongTable([_song('1', 'B', 'X', 'A1', url_signer=signer),
+                           _song('2', 'A', 'X', 'A1', stream_url='http://other/2')])
+        self.assertIs(table.url_signer, signer)
+        self.assertEqual(signed, [])
+        self.assertEqual(table[1].stream_url, 'http://other/2')
+        self.assertEqual(table.take([0])[0].stream_url, 'http://host/rest/stream?id=1')
+        self.assertEqual(table[0].to_song().stream_url, 'http://host/rest/stream?id=1')
+        self.assertEqual(signed, ['1', '1'])
+        self.assertEqual(SongTable(self.songs, url_signer=signer)[3].stream_url, 'http://host/rest/stream?id=4')
+
+    def test_unique(self):
+        songs = self.songs + [self.songs[0]]
+        self.assertEqual(len(SongTable(songs)), 5)
+        table = SongTable(songs, unique=True)
+        self.assertEqual(_ids(table), ['1', '2', '3', '4'])
+        table.append(self.songs[1])
+        table.extend([_song('5', 'D', 'Z', 'A3'), _song('5', 'D', 'Z', 'A3')])
+        self.assertEqual(_ids(table), ['1', '2', '3', '4', '5'])
@@ -0,0 +1,49 @@
+import time
+import unittest
+
+from api import BaseSubsonicClient, SubsonicClient
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+from transport import TokenPolicy
+
+
+class TokenPolicyTestCase(unittest.TestCase):
+    def _salts(self, policy: TokenPolicy, count: int):
+        client = BaseSubsonicClient('admin', 'admin', 'http://127.0.0.1', token_policy=policy)
+        return [client._merge_params()['s'] for _ in range(count)]
+
+    def test_fresh_salt_by_default(self):
+        self.assertEqual(len(set(self._salts(TokenPolicy(), 5))), 5)
+
+    def test_rotate_after_max_uses(self):
+        salts = self._salts(TokenPolicy(max_uses=3), 7)
+        self.assertEqual(len(set(salts[:3])), 1)
+        self.assertEqual(len(set(salts[3:6])), 1)
+        self.assertEqual(len(set(salts)), 3)
+
+    def test_rotate_after_max_age(self):
+        client = BaseSubsonicClient('admin', 'admin', 'http://127.0.0.1',
+                                    token_policy=TokenPolicy(max_uses=None, max_age=0.05))
+        first = client._merge_params()['s']
+        self.assertEqual(client._merge_params()['s'], first)
+        time.sleep(0.06)
+        self.assertNotEqual(client._merge_params()['s'], first)
+
+    def test_merge_does_not_leak_params(self):
+        client = BaseSubsonicClient('admin', 'admin', 'http://127.0.0.1', token_policy=TokenPolicy(max_uses=10))
+        client._merge_params({'id': '1'})
+        self.assertNotIn('id', client._merge_params())
+
+    def test_invalid_max_uses(self):
+        with self.assertRaises(ValueError):
+            TokenPolicy(max_uses=0)
+
+
+class TransportTestCase(unittest.TestCase):
+    def test_reused_token_accepted(self):
+        with FakeSubsonicServer(FakeLibrary(artists=1, albums_per_artist=1, songs_per_album=1)) as server:
+            with SubsonicClient(server.username, server.password, server.url, pool_size=2,
+                                token_policy=TokenPolicy(max_uses=100)) as client:
+                for _ in range(5):
+                    client.get_music_folders()
+                self.assertEqual(client._token_uses, 6)
+            self.assertIsNone(client.transport._session)
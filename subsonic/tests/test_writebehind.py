@@ -0,0 +1,88 @@
+import os
+import queue
+import tempfile
+import unittest
+
+from api import SubsonicClient
+from tests.fake_server import FakeLibrary, FakeSubsonicServer
+from writebehind import WriteBehindQueue
+
+
+class WriteBehindTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeSubsonicServer(FakeLibrary(artists=2, albums_per_artist=2, songs_per_album=30)).start()
+        self.api = SubsonicClient(self.server.username, self.server.password, self.server.url)
+        self.server.reset_stats()
+
+    def tearDown(self):
+        self.api.close()
+        self.server.stop()
+
+    def test_coalesce_and_batch(self):
+        with WriteBehindQueue(self.api, batch_size=50, flush_interval=0.1) as writes:
+            for id_ in range(1, 121):
+                writes.scrobble(str(id_), time_=id_)
+            writes.scrobble('1', time_=1)
+            writes.star('1')
+            writes.unstar('1')
+            writes.star('2')
+            writes.star('al-0-0', kind='albumId')
+            for rating in (1, 2, 5):
+                writes.set_rating('3', rating)
+            self.assertTrue(writes.flush(5))
+        self.assertEqual(self.server.endpoints, {'scrobble': 3, 'star': 1, 'unstar': 1, 'setRating': 1})
+        self.assertEqual(len(self.server.library.scrobbles), 120)
+        self.assertEqual(self.server.library.starred, {('id', '2'), ('albumId', 'al-0-0')})
+        self.assertEqual(self.server.library.ratings, {'3': 5})
+        self.assertEqual(writes.coalesced, 4)
+
+    def test_rejected_item_does_not_drop_batch(self):
+        with WriteBehindQueue(self.api, flush_interval=0.05) as writes:
+            writes.star('1')
+            writes.star('missing')
+            writes.star('2')
+            self.assertTrue(writes.flush(5))
+        self.assertEqual(self.server.library.starred, {('id', '1'), ('id', '2')})
+        self.assertEqual(writes.dropped, 1)
+
+    def test_spool_while_server_down(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spool = os.path.join(directory, 'writes.jsonl')
+            self.server.unavailable = True
+            writes = WriteBehindQueue(self.api, flush_interval=0.05, retry_interval=0.05, spool_path=spool)
+            for id_ in range(1, 11):
+                writes.scrobble(str(id_))
+            self.assertFalse(writes.flush(0.3))
+            self.assertEqual(len(writes), 0)
+            self.assertTrue(os.path.exists(spool))
+            writes.close()
+
+            # a new queue picks the spool up and delivers it once the server is back
+            self.server.unavailable = False
+            with WriteBehindQueue(self.api, flush_interval=0.05, spool_path=spool) as writes:
+                self.assertTrue(writes.flush(5))
+            self.assertFalse(os.path.exists(spool))
+        self.assertEqual(len(self.server.library.scrobbles), 10)
+
+    def test_newer_write_wins_over_spool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.server.unavailable = True
+            with WriteBehindQueue(self.api, flush_interval=0.05, retry_interval=0.05,
+                                  spool_path=os.path.join(directory, 'writes.jsonl')) as writes:
+                writes.star('1')
+                writes.unstar('2')
+                self.assertFalse(writes.flush(0.3))
+                writes.star('2')
+                self.server.unavailable = False
+                self.assertTrue(writes.flush(5))
+        self.assertEqual(self.server.library.starred, {('id', '1'), ('id', '2')})
+        self.assertEqual(writes.coalesced, 1)
+
+    def test_backpressure(self):
+        with WriteBehindQueue(self.api, max_pending=3, batch_size=100, flush_interval=60) as writes:
+            for id_ in ('1', '2', '3'):
+                writes.star(id_)
+            writes.unstar('1')
+            with self.assertRaises(queue.Full):
+                writes.star('4', timeout=0.1)
+        self.assertEqual(self.server.library.starred, {('id', '2'), ('id', '3')})
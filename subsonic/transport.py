@@ -0,0 +1,63 @@
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    import requests
+
+
+class TokenPolicy(object):
+    # A salt/token pair is reused until it has signed `max_uses` requests or is `max_age` seconds old, whichever comes
+    # first. The defaults sign every request with a fresh salt.
+    def __init__(self, max_uses: int = 1, max_age: float = None):
+        if max_uses is not None and max_uses < 1:
+            raise ValueError('max_uses must be at least 1')
+        self.max_uses = max_uses
+        self.max_age = max_age
+
+    def expired(self, uses: int, created: float) -> bool:
+        if self.max_uses is not None and uses >= self.max_uses:
+            return True
+        return self.max_age is not None and time.monotonic() - created >= self.max_age
+
+    def __repr__(self):
+        return 'TokenPolicy<max_uses[{0}], max_age[{1}]>'.format(self.max_uses, self.max_age)
+
+
+class Transport(object):
+    def __init__(self, pool_size: int = 10, timeout: typing.Union[float, typing.Tuple[float, float]] = 30,
+                 max_retries: int = 0):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> 'requests.Session':
+        # requests costs ~100ms to import, so it's only loaded once the first request goes out
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                          max_retries=self.max_retries)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def get(self, url: str, params: dict = None, **kwargs) -> 'requests.Response':
+        response = self.session.get(url, params=params, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __repr__(self):
+        return 'Transport<pool_size[{0}], timeout[{1}]>'.format(self.pool_size, self.timeout)
@@ -0,0 +1,263 @@
+import collections
+import json
+import os
+import queue
+import threading
+import time
+import typing
+import logging
+
+from api import BaseSubsonicClient, SubsonicClient
+
+logger = logging.getLogger(__name__)
+
+STAR_KEYS = (('id', 'ids'), ('albumId', 'album_ids'), ('artistId', 'artist_ids'))
+
+
+def _event_key(event: list) -> tuple:
+    # the item an event writes to, as the stores key it
+    if event[0] == 'scrobble':
+        return ('scrobble', event[1], event[2], True) if event[3] else ('scrobble', event[1], None, False)
+    return tuple(event[:-1])
+
+
+class WriteBehindQueue(object):
+    # Buffers scrobble, star/unstar and setRating calls and sends them from a background thread once `batch_size`
+    # items are pending or the oldest has waited `flush_interval` seconds. Writes to the same item coalesce: the last
+    # star/unstar and the last rating win, a play repeated with the same timestamp is sent once and a newer
+    # now-playing replaces the older one. scrobble, star and unstar carry up to `batch_size` ids per request.
+    # Producers block once `max_pending` items are buffered. Writes that can't be delivered because the server is
+    # unreachable are appended to `spool_path` (or kept in memory without one) and retried with exponential backoff.
+    def __init__(self, client: SubsonicClient, batch_size: int = 50, flush_interval: float = 2.0,
+                 max_pending: int = 10000, spool_path: str = None, retry_interval: float = 1.0,
+                 max_retry_interval: float = 60.0):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spool_path = spool_path
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.requests = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._scrobbles = collections.OrderedDict()
+        self._stars = collections.OrderedDict()
+        self._ratings = collections.OrderedDict()
+        self._oldest = None
+        self._spooled = spool_path is not None and os.path.exists(spool_path)
+        self._retry_at = 0.0
+        self._backoff = retry_interval
+        self._flush_requested = False
+        self._sending = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name='subsonic-write-behind', daemon=True)
+        self._worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        with self._condition:
+            return self._pending()
+
+    def _pending(self) -> int:
+        return len(self._scrobbles) + len(self._stars) + len(self._ratings)
+
+    def _put(self, store: collections.OrderedDict, key: tuple, value, timeout: float = None) -> None:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while key not in store and self._pending() >= self.max_pending and not self._closed:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise queue.Full('{0} writes already pending'.format(self._pending()))
+                self._condition.wait(remaining)
+            if self._closed:
+                raise ValueError('Write-behind queue is closed')
+            if store.pop(key, None) is not None:
+                self.coalesced += 1
+            store[key] = value
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._pending() >= self.batch_size:
+                self._condition.notify_all()
+
+    def scrobble(self, id_: str, time_: int = None, submission: bool = True, timeout: float = None) -> None:
+        # the play time is taken now, a scrobble sent later without one would be dated when it reaches the server
+        played = int(time.time() * 1000) if time_ is None else time_
+        key = (id_, played, True) if submission else (id_, None, False)
+        self._put(self._scrobbles, key, played, timeout)
+
+    def star(self, id_: str, kind: str = 'id', timeout: float = None) -> None:
+        self._put(self._stars, (kind, id_), True, timeout)
+
+    def unstar(self, id_: str, kind: str = 'id', timeout: float = None) -> None:
+        self._put(self._stars, (kind, id_), False, timeout)
+
+    def set_rating(self, id_: str, rating: int, timeout: float = None) -> None:
+        BaseSubsonicClient._rating_params(id_, rating)
+        self._put(self._ratings, (id_,), rating, timeout)
+
+    def _take(self) -> typing.List[list]:
+        events = [['star', kind, id_, starred] for (kind, id_), starred in self._stars.items()]
+        events.extend(['rating', id_, rating] for (id_,), rating in self._ratings.items())
+        events.extend(['scrobble', key[0], played, key[2]] for key, played in self._scrobbles.items())
+        self._stars.clear()
+        self._ratings.clear()
+        self._scrobbles.clear()
+        self._oldest = None
+        self._condition.notify_all()
+        return events
+
+    def _restore(self, events: typing.List[list]) -> None:
+        # events that failed to send are older than anything queued since, so they never override a newer write
+        for event in events:
+            if event[0] == 'star':
+                self._stars.setdefault((event[1], event[2]), event[3])
+            elif event[0] == 'rating':
+                self._ratings.setdefault((event[1],), event[2])
+            else:
+                key = (event[1], event[2], True) if event[3] else (event[1], None, False)
+                self._scrobbles.setdefault(key, event[2])
+        if events and self._oldest is None:
+            self._oldest = time.monotonic()
+
+    def _coalesce(self, events: typing.List[list]) -> typing.List[list]:
+        # events come oldest first, so the last write to an item wins
+        latest = collections.OrderedDict()
+        for event in events:
+            key = _event_key(event)
+            if latest.pop(key, None) is not None:
+                self.coalesced += 1
+            latest[key] = event
+        return list(latest.values())
+
+    def _read_spool(self) -> typing.List[list]:
+        with open(self.spool_path) as file:
+            events = [json.loads(line) for line in file if line.strip()]
+        os.remove(self.spool_path)
+        return events
+
+    def _write_spool(self, events: typing.List[list]) -> None:
+        with open(self.spool_path, 'a') as file:
+            file.write(''.join(json.dumps(event) + '\n' for event in events))
+
+    def _batches(self, events: typing.List[list]) -> typing.List[typing.Tuple[str, typing.List[list]]]:
+        groups = collections.OrderedDict()
+        for event in events:
+            if event[0] == 'star':
+                group = 'star' if event[3] else 'unstar'
+            elif event[0] == 'rating':
+                group = 'rating'
+            else:
+                group = 'scrobble' if event[3] else 'now_playing'
+            groups.setdefault(group, []).append(event)
+        batches = []
+        for group, grouped in groups.items():
+            size = 1 if group == 'rating' else self.batch_size
+            batches.extend((group, grouped[i:i + size]) for i in range(0, len(grouped), size))
+        return batches
+
+    def _call(self, group: str, batch: typing.List[list]) -> None:
+        if group in ('star', 'unstar'):
+            kwargs = {argument: [event[2] for event in batch if event[1] == kind] for kind, argument in STAR_KEYS}
+            getattr(self.client, group)(**kwargs)
+        elif group == 'rating':
+            self.client.set_rating(batch[0][1], batch[0][2])
+        else:
+            self.client.scrobble([event[1] for event in batch], [event[2] for event in batch],
+                                 submission=group == 'scrobble')
+        self.requests += 1
+
+    def _send(self, events: typing.List[list]) -> typing.List[list]:
+        # returns what couldn't be delivered; a batch the server rejects is retried item by item so one bad id
+        # doesn't take the rest of the batch down with it
+        batches = self._batches(events)
+        for position, (group, batch) in enumerate(batches):
+            try:
+                self._call(group, batch)
+            except ValueError as e:
+                if len(batch) > 1:
+                    batches[position + 1:position + 1] = [(group, [event]) for event in batch]
+                    continue
+                self.dropped += 1
+                logger.warning("Server rejected {0} {1}: {2}".format(group, batch[0][1:], e))
+            except IOError as e:
+                logger.warning("Write-behind flush failed ({0}), {1} writes held back".format(
+                    e, sum(len(batch) for _, batch in batches[position:])))
+                return [event for _, batch in batches[position:] for event in batch]
+        return []
+
+    def _due(self, now: float) -> bool:
+        pending = self._pending()
+        if not pending and not self._spooled:
+            return False
+        if self._closed:
+            return True
+        if now < self._retry_at:
+            return False
+        return (self._spooled or self._flush_requested or pending >= self.batch_size
+                or (self._oldest is not None and now - self._oldest >= self.flush_interval))
+
+    def _wait_timeout(self, now: float) -> typing.Optional[float]:
+        if (self._pending() or self._spooled) and now < self._retry_at:
+            return self._retry_at - now
+        if self._oldest is not None:
+            return max(0.0, self._oldest + self.flush_interval - now)
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._due(time.monotonic()):
+                    if self._closed:
+                        return
+                    self._condition.wait(self._wait_timeout(time.monotonic()))
+                events = self._take()
+                spooled = self._spooled
+                closing = self._closed
+                self._sending = True
+
+            if spooled:
+                events = self._coalesce(self._read_spool() + events)
+            remaining = self._send(events)
+            if remaining and self.spool_path is not None:
+                self._write_spool(remaining)
+
+            with self._condition:
+                self._sending = False
+                self._spooled = bool(remaining) and self.spool_path is not None
+                if remaining:
+                    if self.spool_path is None:
+                        self._restore(remaining)
+                    self._retry_at = time.monotonic() + self._backoff
+                    self._backoff = min(self._backoff * 2, self.max_retry_interval)
+                else:
+                    self._retry_at = 0.0
+                    self._backoff = self.retry_interval
+                if not self._pending() and not self._spooled:
+                    self._flush_requested = False
+                self._condition.notify_all()
+                if closing and remaining:
+                    if self.spool_path is None:
+                        logger.warning("Closed with {0} undelivered writes".format(len(remaining)))
+                    return
+
+    def flush(self, timeout: float = None) -> bool:
+        # True once everything queued so far has reached the server; with the server down this waits for it
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._pending() and not self._sending and not self._spooled,
+                                            timeout)
+
+    def close(self, timeout: float = None) -> None:
+        # one last attempt to deliver; whatever still fails stays in the spool for the next queue to pick up
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._worker.join(timeout)